@@ -0,0 +1,255 @@
+###############################################################
+
+# Contains analytic queueing approximations for screening
+#   staffing levels before simulating them: ErlangC (M/M/c
+#   probability of waiting), AllenCunneen (M/G/c and G/G/c
+#   waits), ServiceMoments for a mix of Erlang service times,
+#   SplitSystem and PooledSystem for the two SMP
+#   configurations, Screen, and CompareToSimulation.
+
+# Times are in minutes and rates in calls per minute. The SMP
+#   scripts generate arrivals at fixed intervals, which is
+#   ArrivalSCV = 0; the Poisson arrivals described in the
+#   README are ArrivalSCV = 1.
+
+# Results of SplitSystem and PooledSystem use the output column
+#   names of current_system_output.csv and
+#   cross_trained_output.csv, so they can be compared with
+#   simulation output directly.
+
+###############################################################
+
+import math
+
+def ErlangC(c, Load):
+    '''
+    Returns the M/M/c probability that an arriving call waits
+
+    Input:
+        c: integer, positive, number of servers
+        Load: float, nonnegative, offered load (arrival rate
+            times mean service time)
+
+    Output:
+        float in [0, 1]; 1.0 if Load >= c
+    '''
+
+    if Load >= c:
+        return 1.0
+    # Erlang-B by the stable recursion, then convert to Erlang-C
+    B = 1.0
+    for k in range(1, c + 1):
+        B = Load * B / (k + Load * B)
+    return c * B / (c - Load * (1 - B))
+
+def ServiceMoments(Mix):
+    '''
+    Returns the mean and squared coefficient of variation of a
+        service time that is Erlang with the given phases and mean
+        for each call type
+
+    Input:
+        Mix: list of (probability, phases, mean) tuples
+
+    Output:
+        mean: float
+        scv: float
+    '''
+
+    mean = sum(p * m for p, k, m in Mix)
+    second = sum(p * (1 + 1 / k) * m * m for p, k, m in Mix)
+    return mean, second / (mean * mean) - 1
+
+def AllenCunneen(ArrivalRate, Mix, c, ArrivalSCV=1.0):
+    '''
+    Returns the Allen-Cunneen approximation of a c-server FIFO
+        queue: the M/M/c waiting time scaled by
+        (ArrivalSCV + service SCV) / 2; exact for M/M/c
+
+    Input:
+        ArrivalRate: float, positive, calls per minute
+        Mix: list of (probability, phases, mean) tuples
+        c: integer, positive
+        ArrivalSCV: float, nonnegative
+
+    Output:
+        dict of Utilization, ProbWait, Wq (mean wait of all calls),
+            WqGivenWait (mean wait of calls that wait), TIS, Lq and
+            Busy; waits are infinite if Utilization >= 1
+    '''
+
+    mean, scv = ServiceMoments(Mix)
+    load = ArrivalRate * mean
+    rho = load / c
+    if rho >= 1:
+        return {"Utilization": rho, "ProbWait": 1.0, "Wq": math.inf,
+            "WqGivenWait": math.inf, "TIS": math.inf, "Lq": math.inf, "Busy": float(c)}
+    pwait = ErlangC(c, load)
+    factor = (ArrivalSCV + scv) / 2
+    wqgiven = factor * mean / (c - load)
+    wq = pwait * wqgiven
+    return {
+        "Utilization": rho,
+        "ProbWait": pwait,
+        "Wq": wq,
+        "WqGivenWait": wqgiven,
+        "TIS": wq + mean,
+        "Lq": ArrivalRate * wq,
+        "Busy": load,
+    }
+
+def SplitSystem(NumFinanceOperators=4, NumContactOperators=3, ArrivalRate=1.0,
+                FinanceShare=0.59, FinMean=5, ContactMean=5, ArrivalSCV=1.0):
+    '''
+    Returns approximate KPIs of the existing system with separate
+        financial (Erlang-2) and contact management (Erlang-3) pools
+
+    Input:
+        NumFinanceOperators, NumContactOperators: integers, positive
+        ArrivalRate: float, total calls per minute
+        FinanceShare: float, fraction of financial calls
+        FinMean, ContactMean: floats, mean service times
+        ArrivalSCV: float, nonnegative
+
+    Output:
+        dict keyed by current_system_output.csv column names, plus
+            TISavg and Wq, the call-weighted mean time in system
+            and mean wait of all calls
+    '''
+
+    fin = AllenCunneen(ArrivalRate * FinanceShare, [(1.0, 2, FinMean)],
+        NumFinanceOperators, ArrivalSCV)
+    con = AllenCunneen(ArrivalRate * (1 - FinanceShare), [(1.0, 3, ContactMean)],
+        NumContactOperators, ArrivalSCV)
+    return {
+        "FinanceTISavg": fin["TIS"],
+        "FinanceOperatorQueueAvg": fin["Lq"],
+        "FinanceOperatorBusyAvg": fin["Busy"],
+        "ContactTISavg": con["TIS"],
+        "ContactOperatorQueueAvg": con["Lq"],
+        "ContactOperatorBusyAvg": con["Busy"],
+        "FinanceQueueTimeAvg": fin["WqGivenWait"],
+        "ContactQueueTimeAvg": con["WqGivenWait"],
+        "TISavg": FinanceShare * fin["TIS"] + (1 - FinanceShare) * con["TIS"],
+        "Wq": FinanceShare * fin["Wq"] + (1 - FinanceShare) * con["Wq"],
+    }
+
+def PooledSystem(NumCrossTrained=7, ArrivalRate=1.0, FinanceShare=0.59,
+                 FinMean=5, ContactMean=5, Inflation=1.1, ArrivalSCV=1.0):
+    '''
+    Returns approximate KPIs of a single pool of cross-trained
+        operators whose service times are inflated by Inflation
+
+    Input:
+        NumCrossTrained: integer, positive
+        ArrivalRate: float, total calls per minute
+        FinanceShare: float, fraction of financial calls
+        FinMean, ContactMean: floats, mean service times of
+            specialist operators
+        Inflation: float, service-time multiplier for cross-training
+        ArrivalSCV: float, nonnegative
+
+    Output:
+        dict keyed by cross_trained_output.csv column names, plus
+            TISavg and Wq, the mean time in system and mean wait
+            of all calls
+    '''
+
+    mix = [(FinanceShare, 2, FinMean * Inflation),
+        (1 - FinanceShare, 3, ContactMean * Inflation)]
+    pool = AllenCunneen(ArrivalRate, mix, NumCrossTrained, ArrivalSCV)
+    return {
+        "CrossTrainedTISavg": pool["TIS"],
+        "CrossTrainedOperatorQueueAvg": pool["Lq"],
+        "CrossTrainedOperatorBusyAvg": pool["Busy"],
+        "CrossTrainedQueueTimeAvg": pool["WqGivenWait"],
+        "TISavg": pool["TIS"],
+        "Wq": pool["Wq"],
+    }
+
+def Screen(Candidates, Evaluate, Target, Band=0.2):
+    '''
+    Classifies increasing staffing levels against a target for a
+        KPI where smaller is better and that goes to 0 as staffing
+        grows (e.g. mean wait Wq or ProbWait, not time in system,
+        whose service part no staffing removes): "infeasible" if
+        the approximation is unstable or worse than
+        Target * (1 + Band); "overkill" if the next smaller
+        candidate already beats Target * (1 - Band); otherwise
+        "simulate", i.e. close enough to the boundary that the
+        approximation cannot decide
+
+    Input:
+        Candidates: increasing list of staffing levels
+        Evaluate: function of a staffing level returning the
+            approximate KPI
+        Target: float, positive
+        Band: float, nonnegative, relative margin of the approximation
+
+    Output:
+        list of (candidate, approximate KPI, class) tuples
+    '''
+
+    results = []
+    previous = math.inf
+    for candidate in Candidates:
+        value = Evaluate(candidate)
+        if math.isinf(value) or value > Target * (1 + Band):
+            verdict = "infeasible"
+        elif previous < Target * (1 - Band):
+            verdict = "overkill"
+        else:
+            verdict = "simulate"
+        results.append((candidate, value, verdict))
+        previous = value
+    return results
+
+def CompareToSimulation(Approximation, Means, HalfWidths=None):
+    '''
+    Returns report lines comparing approximate KPIs with simulated
+        means, for every KPI present in both
+
+    Input:
+        Approximation: dict of KPI name to approximate value
+        Means: dict of KPI name to simulated mean, e.g. from
+            SimOutput.ResultReader.Means
+        HalfWidths: dict of KPI name to CI half-width, optional
+
+    Output:
+        list of strings
+    '''
+
+    lines = ["%-30s %12s %12s %12s %9s" % ("KPI", "approx", "simulated", "half-width", "rel.err")]
+    for name, approx in Approximation.items():
+        if name not in Means:
+            continue
+        sim = Means[name]
+        hw = HalfWidths[name] if HalfWidths is not None else math.nan
+        rel = (approx - sim) / sim if sim != 0 else math.nan
+        lines.append("%-30s %12.4f %12.4f %12.4f %8.1f%%" % (name, approx, sim, hw, 100 * rel))
+    return lines
+
+if __name__ == "__main__":
+    import os
+    import timeit
+
+    # The scripts use fixed interarrival times
+    scv = 0.0
+    split = SplitSystem(ArrivalSCV=scv)
+    target = split["Wq"]
+    print("Split 4+3 system, approximate mean wait: %.4f" % target)
+    for c, value, verdict in Screen(range(5, 13),
+            lambda c: PooledSystem(c, ArrivalSCV=scv)["Wq"], target):
+        print("  %2d cross-trained: wait %8.4f  %s" % (c, value, verdict))
+    seconds = timeit.timeit(lambda: PooledSystem(7, ArrivalSCV=scv), number=10000) / 10000
+    print("PooledSystem evaluation: %.1f microseconds" % (1e6 * seconds))
+
+    import SimOutput
+    for directory, approx in [("current_system_output", split),
+                              ("cross_trained_output", PooledSystem(7, ArrivalSCV=scv))]:
+        if os.path.exists(os.path.join(directory, "columns.json")):
+            reader = SimOutput.ResultReader(directory)
+            print()
+            print(directory)
+            for line in CompareToSimulation(approx, reader.Means(), reader.HalfWidths()):
+                print(line)
@@ -0,0 +1,292 @@
+###############################################################
+
+# Contains the NSPPArrivals class, which generates arrival times
+#   of a non-stationary Poisson process whose rate is constant
+#   within each of NPeriods periods of length PeriodLength.
+
+# Arrivals are generated in batches of candidate times from a
+#   SimRNG stream, either by inversion of the cumulative rate
+#   (exponential gaps at the rate of the current period) or by
+#   thinning a Poisson process at the maximum rate.
+
+# Each period draws from its own substream, which starts
+#   PeriodSpacing draws after the previous one, so the arrivals
+#   of a period depend only on the stream seed and the rate of
+#   that period: changing the rate of one hour leaves every
+#   other hour's arrivals unchanged. Every Reset moves Stream on
+#   by NPeriods * PeriodSpacing draws, so R replications use
+#   R * NPeriods * PeriodSpacing draws of it. SimRNG streams
+#   start STREAM_DRAWS = 100,000 draws apart, so when the next
+#   stream is in use that product must stay below 100,000, or
+#   the arrivals of later replications reuse its numbers: with 8
+#   periods and the default PeriodSpacing of 4096, 32,768 draws
+#   a day, only 3 replications fit. SimCallCenter.CallCenterModel
+#   spaces the streams of its lines for a given number of
+#   replications, and raises an error rather than run into the
+#   next stream.
+
+# Also contains FixedSchedule, the arrival times of a fixed
+#   interarrival time, and ArrivalCursor, which hands out one
+#   replication's arrival times and call types in time order.
+#   MergeArrivals builds a cursor from the arrival times of each
+#   line, breaking ties between lines as SimClasses.EventCalendar
+#   would for self-scheduling arrival events.
+
+###############################################################
+
+import heapq
+import math
+
+import numpy as np
+
+import SimRNG
+
+# Draws between the starts of consecutive SimRNG streams
+STREAM_DRAWS = 100000
+
+class NSPPArrivals:
+    '''
+    Class of objects for streaming non-stationary Poisson arrivals
+
+    Instance attributes:
+        Rates: list of arrival rates per unit time, one per period
+        PeriodLength: float, positive
+        Stream: integer, SimRNG stream reserved for these arrivals
+        Method: string, "inversion" or "thinning"
+        BatchSize: integer, candidate times generated per batch
+        PeriodSpacing: integer, draws reserved for each period
+
+    Instance methods:
+        Reset
+        Next
+        Generate
+    '''
+
+    def __init__(self, Rates, PeriodLength, Stream, Method="inversion",
+                 BatchSize=64, PeriodSpacing=4096):
+        '''
+        Initializes the arrival process; call Reset to start each day
+
+        Input:
+            Rates: list of nonnegative floats, arrivals per unit time
+            PeriodLength: float, positive
+            Stream: integer, SimRNG stream used by nothing else
+            Method: string, "inversion" or "thinning"
+            BatchSize: integer, positive
+            PeriodSpacing: integer, positive
+        '''
+
+        if Method not in ("inversion", "thinning"):
+            raise ValueError("Method must be 'inversion' or 'thinning'")
+        self.Rates = [float(r) for r in Rates]
+        self.PeriodLength = PeriodLength
+        self.Stream = Stream
+        self.Method = Method
+        self.BatchSize = BatchSize
+        self.PeriodSpacing = PeriodSpacing
+        self._MaxRate = max(self.Rates) if len(self.Rates) > 0 else 0.0
+        self._Period = len(self.Rates)
+        self._Buffer = []
+        self._Index = 0
+
+    def Reset(self):
+        '''
+        Starts a new day at time 0 from the current seed of Stream,
+            and advances Stream past the substreams of every period
+            so the next call of Reset starts a different day
+        '''
+
+        self._Base = SimRNG.lcgrandgt(self.Stream)
+        SimRNG.lcgrandskip(len(self.Rates) * self.PeriodSpacing, self.Stream)
+        self._Period = -1
+        self._NextPeriod()
+
+    def _NextPeriod(self):
+        self._Period += 1
+        self._T = self._Period * self.PeriodLength
+        self._Seed = self._Base * pow(SimRNG.MULT, self._Period * self.PeriodSpacing,
+            SimRNG.MODLUS) % SimRNG.MODLUS
+        self._Used = 0
+        self._Buffer = []
+        self._Index = 0
+
+    def _Refill(self):
+        '''
+        Generates the next batch of arrivals, moving on to later
+            periods as needed; returns False once the day is over
+        '''
+
+        while self._Period < len(self.Rates):
+            rate = self.Rates[self._Period]
+            end = (self._Period + 1) * self.PeriodLength
+            if rate <= 0.0:
+                self._NextPeriod()
+                continue
+
+            B = self.BatchSize
+            draws = B if self.Method == "inversion" else 2 * B
+            self._Used += draws
+            if self._Used > self.PeriodSpacing:
+                raise RuntimeError("period needs more than PeriodSpacing draws")
+            U, self._Seed = SimRNG.lcgrandseq(self._Seed, draws)
+            if self.Method == "inversion":
+                times = self._T + np.cumsum(-np.log(1 - U) / rate)
+                accept = np.ones(B, dtype=bool)
+            else:
+                times = self._T + np.cumsum(-np.log(1 - U[:B]) / self._MaxRate)
+                accept = U[B:] < rate / self._MaxRate
+
+            inside = times < end
+            arrivals = times[inside & accept].tolist()
+            if inside.all():
+                self._T = times[-1]
+            else:
+                # Memoryless: the next period starts afresh at its boundary
+                self._NextPeriod()
+            self._Buffer = arrivals
+            self._Index = 0
+            if len(arrivals) > 0:
+                return True
+        return False
+
+    def Next(self):
+        '''
+        Returns the next arrival time, or infinity after the last period
+
+        Output:
+            float
+        '''
+
+        if self._Index == len(self._Buffer) and not self._Refill():
+            return math.inf
+        t = self._Buffer[self._Index]
+        self._Index += 1
+        return t
+
+    def Generate(self):
+        '''
+        Returns every remaining arrival time of the current day
+
+        Output:
+            NumPy array of floats
+        '''
+
+        times = self._Buffer[self._Index:]
+        self._Index = len(self._Buffer)
+        while self._Refill():
+            times += self._Buffer
+            self._Index = len(self._Buffer)
+        return np.array(times)
+
+def FixedSchedule(InterarrivalTime, RunLength):
+    '''
+    Returns the arrival times produced by an arrival handler that
+        schedules the next arrival every InterarrivalTime and creates
+        no call once the next arrival would fall after RunLength, as
+        in the SMP scripts
+
+    Input:
+        InterarrivalTime: float, positive
+        RunLength: float, positive
+
+    Output:
+        calls: NumPy array of times at which a call arrives
+        last: float, time of the final arrival event, which creates
+            no call
+    '''
+
+    calls = []
+    t = InterarrivalTime
+    while t < RunLength and t + InterarrivalTime <= RunLength:
+        calls.append(t)
+        t = t + InterarrivalTime
+    return np.array(calls), t
+
+class ArrivalCursor:
+    '''
+    Class of objects for consuming one replication's pre-generated
+        arrivals in time order, in place of self-scheduling arrival
+        events on the event calendar
+
+    Instance attributes:
+        Times: list of arrival times, increasing
+        Types: list of integer call types
+        Index: integer, position of the next arrival
+        NextTime: float, time of the next arrival, infinity when
+            every arrival has been consumed
+
+    Instance methods:
+        Advance
+    '''
+
+    def __init__(self, Times, Types):
+        '''
+        Initializes the cursor at the first arrival
+
+        Input:
+            Times: NumPy array of arrival times, increasing
+            Types: NumPy array of integer call types
+        '''
+
+        self.Times = np.asarray(Times, dtype=float).tolist()
+        self.Types = np.asarray(Types, dtype=int).tolist()
+        self.Index = 0
+        self.NextTime = self.Times[0] if len(self.Times) > 0 else math.inf
+
+    def Advance(self):
+        '''
+        Returns the type of the next arrival and moves the cursor
+            past it
+
+        Output:
+            integer, call type
+        '''
+
+        i = self.Index
+        self.Index = i + 1
+        self.NextTime = self.Times[i + 1] if i + 1 < len(self.Times) else math.inf
+        return self.Types[i]
+
+def MergeArrivals(Lines, Ends=None):
+    '''
+    Returns a cursor over the arrivals of several call types merged
+        in the order an event calendar would take them; calls of
+        Lines[k] get call type k
+
+    Each line is taken to schedule its arrival events one at a
+        time, the first at time 0 in line order and each later one
+        when the previous arrival of the line is taken. Arrivals at
+        the same time then come in the order they were scheduled,
+        as SimClasses.EventCalendar keeps them: the one scheduled at
+        the earlier time first, and of two scheduled at the same
+        time, the one whose scheduling arrival came first.
+
+    Input:
+        Lines: list of NumPy arrays of arrival times, increasing
+        Ends: list of floats or None, one per line, optional; the
+            time of a final arrival event of the line that creates
+            no call, which gets call type len(Lines)
+
+    Output:
+        ArrivalCursor object
+    '''
+
+    NoCall = len(Lines)
+    if Ends is None:
+        Ends = [None] * NoCall
+    lines = [np.asarray(t, dtype=float).tolist() + ([] if e is None else [e])
+        for t, e in zip(Lines, Ends)]
+    # (time, time scheduled, position of the arrival that scheduled
+    #   it, line, index in line); lines are scheduled at time 0 in
+    #   order, before any arrival is taken
+    heap = [(t[0], 0.0, k - NoCall, k, 0) for k, t in enumerate(lines) if len(t) > 0]
+    heapq.heapify(heap)
+    times = []
+    types = []
+    while heap:
+        t, scheduled, by, k, i = heapq.heappop(heap)
+        times.append(t)
+        types.append(NoCall if Ends[k] is not None and i == len(lines[k]) - 1 else k)
+        if i + 1 < len(lines[k]):
+            heapq.heappush(heap, (lines[k][i + 1], t, len(times) - 1, k, i + 1))
+    return ArrivalCursor(times, types)
@@ -0,0 +1,322 @@
+###############################################################
+
+# Benchmark suite for the PythonSim library and the SMP models.
+#   Run from the repository directory:
+
+#       python SimBenchmark.py                   run everything
+#       python SimBenchmark.py --only calendar   cases matching a word
+#       python SimBenchmark.py --save-baseline   store this run as baseline
+#       python SimBenchmark.py --update-golden   accept new golden outputs
+
+# Micro-benchmarks time the library on its own: the hold model
+#   on an EventCalendar with 10 to 100,000 pending events,
+#   lcgrand and Erlang draws, and CTStat.Record. Macro-benchmarks
+#   run the existing and cross-trained systems (the models of
+#   existing_system_simcode.py and newsystem_simcode.py, built
+#   by SimCallCenter) at 1x, 10x and 100x arrival rate and
+#   operators, over five-day run lengths, and with only the KPI
+#   statistics kept.
+
+# Each case runs in a fresh process, so its peak resident set
+#   size is its own. Results (events/sec or draws/sec,
+#   replications/sec, peak RSS) are appended to a JSON history
+#   file and compared with a stored baseline, if there is one.
+
+# The golden check hashes outputs that must not change: the CSV
+#   written by existing_system_simcode.py, 20 replications of
+#   each SimCallCenter system and a run of SimRNG draws, all
+#   from the initial seeds. An optimization that alters a single
+#   bit of any of them fails the check, and the exit status is
+#   nonzero.
+
+###############################################################
+
+import argparse
+import concurrent.futures
+import datetime
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import SimCallCenter
+import SimClasses
+import SimRNG
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GOLDEN = os.path.join(HERE, "benchmark_golden.json")
+HISTORY = "benchmark_history.json"
+BASELINE = "benchmark_baseline.json"
+
+def CalendarHold(Pending, Holds):
+    '''
+    Hold model: with Pending events on the calendar, repeatedly
+        removes the next event and schedules one a random time
+        later
+
+    Output:
+        dict of Count (holds) and Unit
+    '''
+
+    rng = np.random.default_rng(1)
+    Calendar = SimClasses.EventCalendar()
+    # In time order, so filling the calendar is not itself quadratic
+    for t in np.sort(rng.exponential(Pending, Pending)).tolist():
+        E = SimClasses.EventNotice()
+        E.EventTime = t
+        Calendar.Schedule(E)
+    increments = rng.exponential(Pending, Holds).tolist()
+    start = time.perf_counter()
+    for increment in increments:
+        E = Calendar.Remove()
+        E.EventTime += increment
+        Calendar.Schedule(E)
+    return {"Count": Holds, "Unit": "holds", "Seconds": time.perf_counter() - start}
+
+def Lcgrand(Draws):
+    start = time.perf_counter()
+    for i in range(Draws):
+        SimRNG.lcgrand(1)
+    return {"Count": Draws, "Unit": "draws", "Seconds": time.perf_counter() - start}
+
+def Erlang(Draws):
+    start = time.perf_counter()
+    for i in range(Draws):
+        SimRNG.Erlang(3, 5, 1)
+    return {"Count": Draws, "Unit": "draws", "Seconds": time.perf_counter() - start}
+
+def CTStatRecord(Records):
+    stat = SimClasses.CTStat()
+    start = time.perf_counter()
+    for i in range(Records):
+        SimClasses.Clock = float(i)
+        stat.Record(float(i % 7))
+    stat.Mean()
+    return {"Count": Records, "Unit": "records", "Seconds": time.perf_counter() - start}
+
+def System(Name, Scale, NumReps, Days=1, Statistics="full"):
+    '''
+    Runs NumReps replications of an SMP system with arrival rate
+        and operators multiplied by Scale, counting events
+
+    Input:
+        Name: string, "existing" or "crosstrained"
+        Scale: integer, positive
+        NumReps: integer, positive
+        Days: integer, positive, days per replication
+        Statistics: string, statistics level of the model
+
+    Output:
+        dict of Count (events), Unit, Seconds and Replications
+    '''
+
+    if Name == "existing":
+        model = SimCallCenter.ExistingSystem(4 * Scale, 3 * Scale, RunLength=480 * Days,
+            Statistics=Statistics)
+    else:
+        model = SimCallCenter.CrossTrainedSystem(7 * Scale, RunLength=480 * Days,
+            Statistics=Statistics)
+    model.ArrivalRate *= Scale
+
+    # Count events as they leave the calendar
+    Calendar = model._Calendar
+    Remove = Calendar.Remove
+    events = [0]
+    def CountedRemove():
+        events[0] += 1
+        return Remove()
+    Calendar.Remove = CountedRemove
+
+    start = time.perf_counter()
+    model.Run(NumReps)
+    return {"Count": events[0], "Unit": "events", "Seconds": time.perf_counter() - start,
+            "Replications": NumReps}
+
+# Name: (function, arguments)
+CASES = {}
+for _Pending in [10, 100, 1000, 10000, 100000]:
+    CASES["calendar-hold-%d" % _Pending] = (CalendarHold, (_Pending, max(500, min(20000, 20000000 // _Pending))))
+CASES["lcgrand"] = (Lcgrand, (200000,))
+CASES["erlang"] = (Erlang, (100000,))
+CASES["ctstat-record"] = (CTStatRecord, (200000,))
+for _Name in ["existing", "crosstrained"]:
+    for _Scale, _Reps in [(1, 100), (10, 5), (100, 1)]:
+        CASES["%s-%dx" % (_Name, _Scale)] = (System, (_Name, _Scale, _Reps))
+    CASES["%s-5day" % _Name] = (System, (_Name, 1, 4, 5))
+    CASES["%s-1x-kpi-only" % _Name] = (System, (_Name, 1, 100, 1, "kpi-only"))
+
+def _RunCase(Name):
+    '''
+    Runs one case in the current (fresh) process
+    '''
+
+    function, args = CASES[Name]
+    result = function(*args)
+    result["Rate"] = result["Count"] / result["Seconds"]
+    if "Replications" in result:
+        result["ReplicationsPerSecond"] = result["Replications"] / result["Seconds"]
+    # Kilobytes on Linux, bytes on macOS
+    result["PeakRSS"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+def RunCase(Name):
+    '''
+    Runs one case in a fresh process
+
+    Input:
+        Name: string, key of CASES
+
+    Output:
+        dict of results
+    '''
+
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_RunCase, Name).result()
+
+def _Hash(arrays):
+    h = hashlib.sha256()
+    for a in arrays:
+        h.update(np.ascontiguousarray(a, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+def _GoldenModels():
+    out = {}
+    for name, build in [("ExistingSystem", SimCallCenter.ExistingSystem),
+                        ("CrossTrainedSystem", SimCallCenter.CrossTrainedSystem),
+                        ("PartialCrossTrainedSystem", SimCallCenter.PartialCrossTrainedSystem)]:
+        SimRNG.ZRNG[:] = SimRNG.InitializeRNSeed()
+        model = build()
+        results = model.Run(20)
+        out[name] = _Hash([results[column] for column in model.Columns])
+    SimRNG.ZRNG[:] = SimRNG.InitializeRNSeed()
+    out["SimRNG"] = _Hash([[SimRNG.lcgrand(s) for s in range(1, 101) for i in range(50)],
+        [SimRNG.Erlang(m, 5, 7) for m in (1, 2, 3) for i in range(1000)],
+        SimRNG.ErlangBatch(2, 5, 1000, 8)])
+    return out
+
+def GoldenOutputs():
+    '''
+    Returns a hash of each output covered by the golden check,
+        computed in fresh processes from the initial seeds
+
+    Output:
+        dict of output name to hex digest
+    '''
+
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        out = pool.submit(_GoldenModels).result()
+    with tempfile.TemporaryDirectory() as directory:
+        subprocess.run([sys.executable, os.path.join(HERE, "existing_system_simcode.py")],
+            cwd=directory, check=True, stdout=subprocess.DEVNULL)
+        with open(os.path.join(directory, "current_system_output.csv"), "rb") as f:
+            out["existing_system_simcode.py"] = hashlib.sha256(f.read()).hexdigest()
+    return out
+
+def CheckGolden(Update=False):
+    '''
+    Compares the golden outputs with benchmark_golden.json
+
+    Input:
+        Update: boolean, store the current outputs instead
+
+    Output:
+        list of names of outputs that changed
+    '''
+
+    current = GoldenOutputs()
+    if Update or not os.path.exists(GOLDEN):
+        with open(GOLDEN, "w") as f:
+            json.dump(current, f, indent=1, sort_keys=True)
+            f.write("\n")
+        return []
+    with open(GOLDEN) as f:
+        golden = json.load(f)
+    return [name for name in sorted(set(golden) | set(current)) if golden.get(name) != current.get(name)]
+
+def Compare(Results, Baseline, Tolerance):
+    '''
+    Returns the cases whose rate is more than Tolerance (a
+        fraction) below the baseline
+
+    Output:
+        list of (name, ratio to baseline) tuples
+    '''
+
+    slower = []
+    for name, result in Results.items():
+        if name in Baseline:
+            ratio = result["Rate"] / Baseline[name]["Rate"]
+            if ratio < 1 - Tolerance:
+                slower.append((name, ratio))
+    return slower
+
+def _Commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark PythonSim and the SMP models")
+    parser.add_argument("--only", nargs="*", default=[], help="run cases whose name contains a word")
+    parser.add_argument("--history", default=HISTORY, help="JSON file the run is appended to")
+    parser.add_argument("--baseline", default=BASELINE, help="JSON file of a stored run")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="slowdown reported as a regression")
+    parser.add_argument("--update-golden", action="store_true", help="accept the current golden outputs")
+    parser.add_argument("--no-golden", action="store_true", help="skip the golden check")
+    args = parser.parse_args()
+
+    status = 0
+    changed = []
+    if not args.no_golden:
+        changed = CheckGolden(args.update_golden)
+        if len(changed) > 0:
+            print("GOLDEN CHECK FAILED: %s changed" % ", ".join(changed))
+            status = 1
+        else:
+            print("Golden check passed")
+
+    names = [name for name in CASES if len(args.only) == 0 or any(word in name for word in args.only)]
+    results = {}
+    for name in names:
+        results[name] = RunCase(name)
+        result = results[name]
+        print("%-22s %12.0f %s/sec %10.3f s %8d KB peak" % (name, result["Rate"], result["Unit"][:-1],
+            result["Seconds"], result["PeakRSS"]) + ("  %.2f reps/sec" % result["ReplicationsPerSecond"]
+            if "ReplicationsPerSecond" in result else ""))
+
+    run = {"Time": datetime.datetime.now().isoformat(timespec="seconds"), "Commit": _Commit(),
+           "Python": platform.python_version(), "Machine": platform.machine(),
+           "Golden": None if args.no_golden else len(changed) == 0, "Results": results}
+    history = []
+    if os.path.exists(args.history):
+        with open(args.history) as f:
+            history = json.load(f)
+    history.append(run)
+    with open(args.history, "w") as f:
+        json.dump(history, f, indent=1)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(run, f, indent=1)
+        print("Saved baseline to %s" % args.baseline)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for name, ratio in Compare(results, baseline["Results"], args.tolerance):
+            print("REGRESSION %s: %.0f%% of baseline rate (%s)" % (name, 100 * ratio, baseline["Commit"]))
+        for name in results:
+            if name in baseline["Results"]:
+                print("%-22s %6.2fx baseline" % (name, results[name]["Rate"] / baseline["Results"][name]["Rate"]))
+
+    sys.exit(status)
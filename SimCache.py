@@ -0,0 +1,285 @@
+###############################################################
+
+# Contains the ReplicationCache class and the RunCached function,
+#   which keep per-replication output rows on disk so that
+#   a model whose code and parameters have not changed is
+#   not re-simulated.
+
+# A cache entry is addressed by a hash of the model source
+#   code, the model parameters and the starting seeds of the
+#   SimRNG streams the model draws from. Each entry stores the
+#   output row of every replication together with the stream
+#   seeds at the end of that replication, so that asking for
+#   more replications resumes the random number streams exactly
+#   where the cached replications stopped.
+
+# Entries are evicted least-recently-used first once the total
+#   size of the cache directory exceeds MaxBytes.
+
+###############################################################
+
+import hashlib
+import inspect
+import json
+import os
+import time
+
+import SimRNG
+
+class ReplicationCache:
+    '''
+    Class of objects for an on-disk cache of replication results
+
+    Instance attributes:
+        CacheDir: string, directory holding one file per entry
+        MaxBytes: integer or None, size cap for the directory
+
+    Instance methods:
+        Key
+        Load
+        Store
+        Entries
+        Size
+        Evict
+        Remove
+        Clear
+    '''
+
+    def __init__(self, CacheDir=".simcache", MaxBytes=None):
+        '''
+        Initializes the cache, creating CacheDir if needed
+
+        Input:
+            CacheDir: string, path of the cache directory
+            MaxBytes: integer, optional cap on total entry size
+        '''
+
+        self.CacheDir = CacheDir
+        self.MaxBytes = MaxBytes
+        os.makedirs(self.CacheDir, exist_ok=True)
+
+    def Key(self, Code, Parameters, Streams):
+        '''
+        Returns the content address of a model configuration
+
+        Input:
+            Code: list of modules and functions making up the model,
+                hashed by their source code
+            Parameters: dict of JSON-serializable model parameters
+            Streams: list of SimRNG stream numbers used by the model
+
+        Output:
+            string, hex digest
+        '''
+
+        digest = hashlib.sha256()
+        for obj in Code:
+            digest.update(inspect.getsource(obj).encode())
+        digest.update(json.dumps(Parameters, sort_keys=True).encode())
+        seeds = [[s, SimRNG.lcgrandgt(s)] for s in Streams]
+        digest.update(json.dumps(seeds).encode())
+        return digest.hexdigest()
+
+    def _Path(self, Key):
+        return os.path.join(self.CacheDir, Key + ".json")
+
+    def Load(self, Key):
+        '''
+        Returns the cached entry for Key and marks it as recently used
+
+        Input:
+            Key: string, from Key
+
+        Output:
+            dict with Columns, Rows, Seeds, Streams and Parameters,
+                or None if Key is not cached
+        '''
+
+        path = self._Path(Key)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            entry = json.load(f)
+        os.utime(path)
+        return entry
+
+    def Store(self, Key, Columns, Rows, Seeds, Streams, Parameters):
+        '''
+        Writes an entry atomically, replacing any previous entry for Key,
+            and evicts old entries if the cache is over MaxBytes
+
+        Input:
+            Key: string, from Key
+            Columns: list of output column names
+            Rows: list of per-replication output rows
+            Seeds: list of stream seeds at the end of each replication
+            Streams: list of SimRNG stream numbers
+            Parameters: dict of model parameters, kept for inspection
+        '''
+
+        entry = {
+            "Columns": Columns,
+            "Rows": Rows,
+            "Seeds": Seeds,
+            "Streams": Streams,
+            "Parameters": Parameters,
+        }
+        path = self._Path(Key)
+        temp = path + ".tmp"
+        with open(temp, "w") as f:
+            json.dump(entry, f)
+        os.replace(temp, path)
+        if self.MaxBytes is not None:
+            self.Evict(self.MaxBytes, Keep=Key)
+
+    def Entries(self):
+        '''
+        Returns a description of every entry, most recently used first
+
+        Output:
+            list of dicts with Key, NumReps, Bytes, LastUsed and Parameters
+        '''
+
+        entries = []
+        for name in os.listdir(self.CacheDir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.CacheDir, name)
+            with open(path) as f:
+                entry = json.load(f)
+            entries.append({
+                "Key": name[:-len(".json")],
+                "NumReps": len(entry["Rows"]),
+                "Bytes": os.path.getsize(path),
+                "LastUsed": os.path.getmtime(path),
+                "Parameters": entry["Parameters"],
+            })
+        entries.sort(key=lambda e: e["LastUsed"], reverse=True)
+        return entries
+
+    def Size(self):
+        '''
+        Returns the total size of all entries in bytes
+
+        Output:
+            integer, nonnegative
+        '''
+
+        return sum(os.path.getsize(os.path.join(self.CacheDir, name))
+            for name in os.listdir(self.CacheDir) if name.endswith(".json"))
+
+    def Evict(self, MaxBytes, Keep=None):
+        '''
+        Removes least-recently-used entries until the cache holds
+            at most MaxBytes
+
+        Input:
+            MaxBytes: integer, nonnegative
+            Keep: string, optional key that is never evicted
+
+        Output:
+            list of evicted keys
+        '''
+
+        paths = [os.path.join(self.CacheDir, name)
+            for name in os.listdir(self.CacheDir) if name.endswith(".json")]
+        paths.sort(key=os.path.getmtime)
+        total = sum(os.path.getsize(p) for p in paths)
+        evicted = []
+        for path in paths:
+            if total <= MaxBytes:
+                break
+            key = os.path.basename(path)[:-len(".json")]
+            if key == Keep:
+                continue
+            total -= os.path.getsize(path)
+            os.remove(path)
+            evicted.append(key)
+        return evicted
+
+    def Remove(self, Key):
+        '''
+        Removes the entry for Key if it exists
+
+        Input:
+            Key: string, from Key
+        '''
+
+        path = self._Path(Key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def Clear(self):
+        '''
+        Removes every entry from the cache
+        '''
+
+        for name in os.listdir(self.CacheDir):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.CacheDir, name))
+
+def RunCached(cache, Key, NumReps, Columns, Streams, Parameters, RunReplication):
+    '''
+    Returns NumReps per-replication output rows, simulating only the
+        replications that are not already in the cache
+    Leaves the SimRNG streams where they would be after NumReps
+        uncached replications
+
+    Input:
+        cache: ReplicationCache object
+        Key: string, from ReplicationCache.Key
+        NumReps: integer, nonnegative
+        Columns: list of output column names
+        Streams: list of SimRNG stream numbers used by the model
+        Parameters: dict of model parameters
+        RunReplication: function with no input that runs one
+            replication and returns its row as a list of floats
+
+    Output:
+        list of NumReps rows
+    '''
+
+    entry = cache.Load(Key)
+    if entry is None or entry["Columns"] != Columns:
+        rows = []
+        seeds = []
+    else:
+        rows = entry["Rows"]
+        seeds = entry["Seeds"]
+
+    if len(rows) >= NumReps:
+        if NumReps > 0:
+            for s, z in zip(Streams, seeds[NumReps - 1]):
+                SimRNG.lcgrandst(z, s)
+        return rows[:NumReps]
+
+    # Resume the streams at the end of the last cached replication
+    if len(seeds) > 0:
+        for s, z in zip(Streams, seeds[-1]):
+            SimRNG.lcgrandst(z, s)
+    for reps in range(len(rows), NumReps):
+        rows.append(RunReplication())
+        seeds.append([SimRNG.lcgrandgt(s) for s in Streams])
+    cache.Store(Key, Columns, rows, seeds, Streams, Parameters)
+    return rows
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or evict the replication cache")
+    parser.add_argument("--dir", default=".simcache")
+    parser.add_argument("--evict", type=int, metavar="MAXBYTES")
+    parser.add_argument("--clear", action="store_true")
+    args = parser.parse_args()
+
+    cache = ReplicationCache(args.dir)
+    if args.clear:
+        cache.Clear()
+    if args.evict is not None:
+        for key in cache.Evict(args.evict):
+            print("evicted", key)
+    for e in cache.Entries():
+        print(e["Key"][:16], e["NumReps"], e["Bytes"],
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(e["LastUsed"])),
+            json.dumps(e["Parameters"], sort_keys=True))
+    print("total bytes:", cache.Size())
@@ -0,0 +1,983 @@
+###############################################################
+
+# Contains the ProductLine, OperatorPool and CallCenterModel
+#   classes, which describe and simulate a call center with any
+#   number of product lines and operator pools, and the
+#   ExistingSystem and CrossTrainedSystem functions, which build
+#   the two SMP configurations.
+
+# A model owns its event calendar, queues, resources and
+#   statistics, and resets them itself at the start of each
+#   replication rather than through SimFunctions.SimFunctionsInit:
+#   they are taken out of the SimClasses InstanceLists once
+#   built, so constructing or running one has no effect on other
+#   models or on module globals other than SimClasses.Clock and
+#   the SimRNG streams it draws from, and a model no longer in
+#   use is freed with everything it holds. It is built once and
+#   can then be run again with new staffing without rebuilding.
+
+# Every product line has its own FIFO hold queue, and calls are
+#   routed by a SimRouting.SkillRouter: a call goes to the first
+#   pool, in the order given, that is skilled for its line and
+#   has an idle operator; otherwise it waits. A pool with an
+#   overflow Delay only takes calls that have waited that long.
+#   An operator who finishes a call takes the longest-waiting
+#   eligible call among the lines of its pool's skills.
+#   Service times are Erlang with the line's phases and mean,
+#   scaled by the serving pool's Inflation, and are drawn from
+#   the line's SimRNG stream when service starts.
+
+# With NPeriods, arrival rates (ArrivalRates) and the size of a
+#   pool (a list for NumOperators) may change from one period to
+#   the next. Staffing changes are events at the period
+#   boundaries: extra operators take waiting calls at once, and
+#   operators leaving finish the call they are on. A replication
+#   can hand out a snapshot of the whole model at each boundary,
+#   an uncompressed SimCheckpoint.CheckpointModel, and
+#   ResumeReplication continues from one with new staffing
+#   for the rest of the day, so staffing variants that share
+#   their first periods need not simulate them again.
+
+# Poisson arrivals (SimArrivals.NSPPArrivals) use NPeriods *
+#   PeriodSpacing draws of their stream a day. With ArrivalReps,
+#   the streams of the lines are spaced so that that many days
+#   fit before one runs into the next stream in use; in any case
+#   a replication that would run into it raises RuntimeError.
+#   The days are counted from the last time the stream was set
+#   from outside the model, e.g. to the initial seeds.
+
+# Statistics chooses, when the model is built, which statistics
+#   exist: "full" keeps every output column; "kpi-only" keeps
+#   time in system and the proportion within the service level,
+#   with queues and resources that record nothing; "none" keeps
+#   only EndingTime, e.g. to time the event loop itself. The
+#   handlers call recording methods bound at construction, so no
+#   event checks the level.
+
+# With IPA, every replication also reports infinitesimal
+#   perturbation analysis estimates of the derivative of each
+#   pool's mean time in system and mean wait with respect to the
+#   mean service time of each line, from the same sample path.
+#   The wait (WaitAvg) is averaged over every call the pool
+#   served, those that did not wait counting 0: QueueTimeAvg
+#   averages over the calls that waited, and jumps when a call
+#   starts or stops waiting, so it has no such derivative. A
+#   service time scales with its line's mean, so its derivative
+#   is ServiceTime / Mean; a call that starts service when an
+#   operator finishes another call inherits the derivative of
+#   that departure time, and one that starts on arrival,
+#   overflow or a staffing change has derivative 0. A departure
+#   time's derivative is its start's plus its own service
+#   time's. Each line must be served by one pool, since moving
+#   a call between pools of different speeds is not a small
+#   change; the estimates then agree with finite differences
+#   under common random numbers.
+
+# A model whose Instrument attribute is set runs its main loop
+#   through SimInstrument.Instrument.Loop, which reports event
+#   counts, handler times and queue peaks per replication.
+
+# With ArrivalSource "trace", each replication's arrival times
+#   are generated up front, by the same rule as the arrival
+#   events (the last arrival event of each source creates no
+#   call), and taken from a SimArrivals.ArrivalCursor, so only
+#   the other events go on the calendar. Simultaneous arrivals of
+#   different lines are taken in the order the calendar would
+#   take them, i.e. the order in which they were scheduled, so
+#   results are those of the calendar, except that an arrival at
+#   exactly the time of another calendar event is taken first.
+#   With a SimTrace.TraceRecorder as Trace, every call served is
+#   logged with the pool and the operator, numbered within that
+#   pool, who answered it.
+
+###############################################################
+
+import math
+
+import numpy as np
+
+import SimCheckpoint
+import SimClasses
+import SimFunctions
+import SimRNG
+from SimArrivals import STREAM_DRAWS, FixedSchedule, MergeArrivals, NSPPArrivals
+from SimRouting import SkillRouter
+from SimStats import (PeriodCTStat, PeriodDTStat, QuantileSketch,
+    UntrackedFIFOQueue, UntrackedResource)
+
+class ProductLine:
+    '''
+    Class of objects describing one product line
+
+    Instance attributes:
+        Name: string
+        Share: float, fraction of calls for this line
+        Phases: integer, Erlang phases of the service time
+        Mean: float, mean service time of a specialist
+        Stream: integer, SimRNG stream for service times
+    '''
+
+    def __init__(self, Name, Share, Phases, Mean, Stream):
+        self.Name = Name
+        self.Share = Share
+        self.Phases = Phases
+        self.Mean = Mean
+        self.Stream = Stream
+
+class OperatorPool:
+    '''
+    Class of objects describing one pool of identical operators
+
+    Instance attributes:
+        Name: string, prefix of the pool's output columns
+        NumOperators: integer, nonnegative, or list of integers,
+            one per period of a model with NPeriods
+        Skills: list of names of the product lines the pool serves
+        Inflation: float, service-time multiplier, e.g. 1.1 for
+            cross-trained operators
+        Delay: float, the pool only takes calls that have waited
+            at least this long, e.g. to overflow to cross-trained
+            operators after specialists
+    '''
+
+    def __init__(self, Name, NumOperators, Skills, Inflation=1.0, Delay=0.0):
+        self.Name = Name
+        self.NumOperators = NumOperators
+        self.Skills = list(Skills)
+        self.Inflation = Inflation
+        self.Delay = Delay
+
+class CallCenterModel:
+    '''
+    Class of objects for simulating a multi-line call center
+
+    Instance attributes:
+        Lines: list of ProductLine objects
+        Pools: list of OperatorPool objects
+        ArrivalRate: float, total calls per minute
+        ArrivalRates: list of floats, total calls per minute in each
+            period for Poisson arrivals, or None for fixed-interval
+            arrivals at ArrivalRate
+        ArrivalStream: integer, first SimRNG stream for Poisson
+            arrivals; "per-line" arrivals use one stream per line
+        PeriodSpacing: integer, SimRNG draws reserved for each
+            period of Poisson arrivals
+        ArrivalReps: integer, replications the Poisson arrival
+            streams are spaced for, or None for consecutive streams
+        Streams: list of the SimRNG streams the model draws from
+        RunLength: float, length of the day in minutes
+        Arrivals: string, "per-line" for a fixed-interval arrival
+            stream per line at ArrivalRate * Share, or "mixed" for
+            one fixed-interval stream at ArrivalRate whose call
+            type is drawn from the line shares
+        TypeStream: integer, SimRNG stream for call types
+        ServiceLevel: float, time in system counted as good service
+        NPeriods: integer, number of periods for per-period
+            statistics, or None for whole-day statistics only
+        PeriodLength: float, length of each period
+        Quantiles: list of quantiles of time in system and queue
+            time reported per pool, e.g. [0.90, 0.95]
+        PooledSketches: dict of quantile column base name (e.g.
+            FinanceTIS) to QuantileSketch over every replication run
+        Statistics: string, "full", "kpi-only" or "none"
+        IPA: boolean, each pool's mean wait over every call it
+            served (WaitAvg) and the derivatives of it and of mean
+            time in system with respect to each line's Mean are
+            reported, in columns named e.g. FinanceWaitAvg and
+            FinanceTISavg_dContactMean
+        Columns: list of output column names
+        Instrument: SimInstrument.Instrument object, or None to run
+            without instrumentation
+        ArrivalSource: string, "calendar" to schedule each arrival
+            as an event, or "trace" to generate the day's arrival
+            times up front
+        Trace: SimTrace.TraceRecorder object, or None to run
+            without a per-call trace
+
+    Instance methods:
+        SetStaffing
+        RunReplication
+        PeriodRow
+        PooledQuantiles
+        Run
+        Sweep
+    '''
+
+    def __init__(self, Lines, Pools, ArrivalRate=1.0, RunLength=480,
+                 Arrivals="per-line", TypeStream=1, ServiceLevel=5.0,
+                 NPeriods=None, PeriodLength=60, Quantiles=(), ArrivalRates=None,
+                 ArrivalStream=4, Instrument=None, Statistics="full", IPA=False,
+                 ArrivalSource="calendar", Trace=None, PeriodSpacing=4096, ArrivalReps=None):
+        '''
+        Builds the model's calendar, queues, resources and statistics
+
+        Input:
+            Lines: list of ProductLine objects
+            Pools: list of OperatorPool objects
+            ArrivalRate: float, positive
+            RunLength: float, positive
+            Arrivals: string, "per-line" or "mixed"
+            TypeStream: integer
+            ServiceLevel: float, positive
+            NPeriods: integer, positive, optional
+            PeriodLength: float, positive
+            Quantiles: list of floats in [0, 1]
+            ArrivalRates: list of NPeriods nonnegative floats, optional
+            ArrivalStream: integer
+            Instrument: SimInstrument.Instrument object, optional
+            Statistics: string, "full", "kpi-only" or "none"
+            IPA: boolean
+            ArrivalSource: string, "calendar" or "trace"
+            Trace: SimTrace.TraceRecorder object, optional
+            PeriodSpacing: integer, positive
+            ArrivalReps: integer, positive, optional
+        '''
+
+        if Arrivals not in ("per-line", "mixed"):
+            raise ValueError("Arrivals must be 'per-line' or 'mixed'")
+        if ArrivalRates is not None and (NPeriods is None or len(ArrivalRates) != NPeriods):
+            raise ValueError("ArrivalRates needs NPeriods and one rate per period")
+        if Statistics not in ("full", "kpi-only", "none"):
+            raise ValueError("Statistics must be 'full', 'kpi-only' or 'none'")
+        if Statistics == "none" and len(Quantiles) > 0:
+            raise ValueError("Quantiles need Statistics 'full' or 'kpi-only'")
+        if Statistics == "none" and IPA:
+            raise ValueError("IPA needs Statistics 'full' or 'kpi-only'")
+        if ArrivalSource not in ("calendar", "trace"):
+            raise ValueError("ArrivalSource must be 'calendar' or 'trace'")
+        if ArrivalSource == "trace" and Instrument is not None:
+            raise ValueError("an Instrument needs ArrivalSource 'calendar'")
+        if IPA and len(set(skill for pool in Pools for skill in pool.Skills)) < sum(len(pool.Skills) for pool in Pools):
+            raise ValueError("IPA needs each line to be served by one pool")
+        self.Lines = Lines
+        self.Pools = Pools
+        self.ArrivalRate = ArrivalRate
+        self.RunLength = RunLength
+        self.Arrivals = Arrivals
+        self.TypeStream = TypeStream
+        self.ServiceLevel = ServiceLevel
+        self.NPeriods = NPeriods
+        self.PeriodLength = PeriodLength
+        self.Quantiles = list(Quantiles)
+        self.ArrivalRates = None if ArrivalRates is None else list(ArrivalRates)
+        self.ArrivalStream = ArrivalStream
+        self.Instrument = Instrument
+        self.Statistics = Statistics
+        self.IPA = IPA
+        self.ArrivalSource = ArrivalSource
+        self.Trace = Trace
+        self.PeriodSpacing = PeriodSpacing
+        self.ArrivalReps = ArrivalReps
+
+        index = {line.Name: k for k, line in enumerate(Lines)}
+        for pool in Pools:
+            for skill in pool.Skills:
+                if skill not in index:
+                    raise ValueError("pool %s has unknown skill %s" % (pool.Name, skill))
+        self._Skills = [[index[skill] for skill in pool.Skills] for pool in Pools]
+        # Pools that can serve each line, in routing order
+        self._Servers = [[p for p, skills in enumerate(self._Skills) if k in skills]
+            for k in range(len(Lines))]
+
+        # Everything registered from here on is the model's own
+        registries = [SimClasses.FIFOQueue.InstanceList, SimClasses.Resource.InstanceList,
+            SimClasses.CTStat.InstanceList, SimClasses.DTStat.InstanceList]
+        marks = [len(registry) for registry in registries]
+        self._Calendar = SimClasses.EventCalendar()
+        full = Statistics == "full"
+        Queue = SimClasses.FIFOQueue if full else UntrackedFIFOQueue
+        Resource = SimClasses.Resource if full else UntrackedResource
+        self._Queues = [Queue() for line in Lines]
+        self._Operators = [Resource() for pool in Pools]
+        if NPeriods is None:
+            CTStat = SimClasses.CTStat
+            DTStat = SimClasses.DTStat
+        else:
+            # Call statistics are kept by the period in which the call arrived
+            CTStat = lambda: PeriodCTStat(NPeriods, PeriodLength)
+            DTStat = lambda: PeriodDTStat(NPeriods, PeriodLength)
+            if full:
+                for Operators in self._Operators:
+                    Operators.NumBusyStat = CTStat()
+        self._PoolQueue = [CTStat() for pool in Pools] if full else []
+        self._TIS = [DTStat() for pool in Pools] if Statistics != "none" else []
+        self._Within = [DTStat() for pool in Pools] if Statistics != "none" else []
+        self._QueueTime = [DTStat() for pool in Pools] if full else []
+        # The statistics in use, which _Init resets, including those
+        #   of the queues and resources
+        self._CTStats = list(self._PoolQueue)
+        if full:
+            self._CTStats += [Q.WIP for Q in self._Queues] + [Re.NumBusyStat for Re in self._Operators]
+        self._DTStats = self._TIS + self._Within + self._QueueTime
+        for registry, mark in zip(registries, marks):
+            del registry[mark:]
+        if not full:
+            self._RecordQueues = self._RecordQueueTime = self._Skip
+        if Statistics == "none":
+            self._RecordDeparture = self._Skip
+        if IPA:
+            self._dZero = [0.0] * len(Lines)
+            self._dNow = self._dZero
+            self._dTIS = [[0.0] * len(Lines) for pool in Pools]
+            self._dWait = [[0.0] * len(Lines) for pool in Pools]
+            self._NumTIS = [0] * len(Pools)
+            self._Wait = [0.0] * len(Pools)
+            self._NumWait = [0] * len(Pools)
+            self._StartService = self._IPAStartService
+            self._EndOfService = self._IPAEndOfService
+            self._RecordDeparture = self._IPARecordDeparture
+        self._Entity = SimClasses.Entity
+        if Trace is not None:
+            self._Entity = Trace.NewCall
+            self._UntracedStartService = self._StartService
+            self._UntracedEndOfService = self._EndOfService
+            self._StartService = self._TraceStartService
+            self._EndOfService = self._TraceEndOfService
+        self._Router = SkillRouter(self._Queues, self._Operators, self._Skills,
+            [pool.Delay for pool in Pools])
+        if ArrivalRates is None:
+            self._Poisson = None
+        elif Arrivals == "mixed":
+            self._Poisson = [NSPPArrivals(ArrivalRates, PeriodLength, ArrivalStream,
+                PeriodSpacing=PeriodSpacing)]
+        else:
+            # Streams far enough apart for ArrivalReps days each
+            Gap = 1
+            if ArrivalReps is not None:
+                Gap = max(1, math.ceil(ArrivalReps * NPeriods * PeriodSpacing / STREAM_DRAWS))
+            self._Poisson = [NSPPArrivals([rate * line.Share for rate in ArrivalRates],
+                PeriodLength, ArrivalStream + k * Gap, PeriodSpacing=PeriodSpacing)
+                for k, line in enumerate(Lines)]
+        # Arrival sources: one per line, or one for mixed arrivals
+        self._Sources = [None] if Arrivals == "mixed" else list(range(len(Lines)))
+        self.Streams = sorted(set([line.Stream for line in Lines]
+            + ([TypeStream] if Arrivals == "mixed" else [])
+            + [source.Stream for source in (self._Poisson or [])]))
+        if self.Streams[-1] > len(SimRNG.ZRNG):
+            raise ValueError("the model needs SimRNG stream %d" % self.Streams[-1])
+        # Days of Poisson arrivals each stream has room for before
+        #   the next stream in use, None when no later one is
+        self._DayLimit = []
+        for source in (self._Poisson or []):
+            later = [s for s in self.Streams if s > source.Stream]
+            self._DayLimit.append(None if len(later) == 0 else
+                (later[0] - source.Stream) * STREAM_DRAWS // (NPeriods * PeriodSpacing))
+            if ArrivalReps is not None and self._DayLimit[-1] is not None \
+                    and self._DayLimit[-1] < ArrivalReps:
+                raise ValueError("stream %d has room for %d days of arrivals before stream %d is used"
+                    % (source.Stream, self._DayLimit[-1], later[0]))
+        self._Days = [0] * len(self._DayLimit)
+        self._NextDay = [None] * len(self._DayLimit)
+
+        self.Columns = []
+        for pool in Pools:
+            if full:
+                self.Columns += [pool.Name + "TISavg", pool.Name + "OperatorQueueAvg",
+                    pool.Name + "OperatorBusyAvg"]
+            elif Statistics == "kpi-only":
+                self.Columns += [pool.Name + "TISavg"]
+        if Statistics != "none":
+            self.Columns += [pool.Name + "PropWithin5" for pool in Pools]
+        if full:
+            self.Columns += [pool.Name + "QueueTimeAvg" for pool in Pools]
+        self.Columns += ["EndingTime"]
+        self._Sketches = {}
+        for pool in Pools:
+            for name in [pool.Name + "TIS", pool.Name + "QueueTime"][:2 if full else 1]:
+                self._Sketches[name] = QuantileSketch()
+        self.PooledSketches = {name: QuantileSketch() for name in self._Sketches}
+        for q in self.Quantiles:
+            self.Columns += [name + "p%g" % (100 * q) for name in self._Sketches]
+        if IPA:
+            self.Columns += [pool.Name + "WaitAvg" for pool in Pools]
+            for base in ["TISavg", "WaitAvg"]:
+                self.Columns += [pool.Name + base + "_d" + line.Name + "Mean" for pool in Pools for line in Lines]
+
+    def SetStaffing(self, Staffing):
+        '''
+        Sets the number of operators of every pool
+
+        Input:
+            Staffing: list of integers, one per pool in Pools order
+        '''
+
+        if len(Staffing) != len(self.Pools):
+            raise ValueError("Staffing needs one entry per pool")
+        for pool, n in zip(self.Pools, Staffing):
+            pool.NumOperators = n
+
+    def _Interarrival(self, k):
+        if self._Poisson is not None:
+            return self._Poisson[0 if k is None else k].Next() - SimClasses.Clock
+        if k is None:
+            return 1 / self.ArrivalRate
+        return 1 / (self.ArrivalRate * self.Lines[k].Share)
+
+    def _Units(self, pool, Period):
+        if isinstance(pool.NumOperators, (list, tuple)):
+            return pool.NumOperators[Period]
+        return pool.NumOperators
+
+    def _Arrival(self, k):
+        InterarrivalTime = self._Interarrival(k)
+        if SimClasses.Clock + InterarrivalTime > self.RunLength:
+            return
+        SimFunctions.SchedulePlus(self._Calendar, "Arrival", InterarrivalTime, k)
+        self._Call(k)
+
+    def _Call(self, k):
+        # A call of line k arrives now; None draws the line
+        if k is None:
+            # Draw the call type from the line shares
+            u = SimRNG.lcgrand(self.TypeStream)
+            k = len(self.Lines) - 1
+            cumulative = 0.0
+            for j, line in enumerate(self.Lines):
+                cumulative += line.Share
+                if u < cumulative:
+                    k = j
+                    break
+
+        Call = self._Entity()
+        Call.Line = k
+        p = self._Router.Arrive(Call, k)
+        if p is not None:
+            self._StartService(Call, p)
+        else:
+            self._RecordQueues(k)
+            for Delay in self._Router.OverflowDelays(k):
+                SimFunctions.SchedulePlus(self._Calendar, "Overflow", Delay, k)
+
+    def _Overflow(self, k):
+        routed = self._Router.Overflow(k)
+        if routed is not None:
+            NextCall, p = routed
+            self._RecordQueues(k)
+            self._RecordQueueTime(NextCall, p)
+            self._StartService(NextCall, p)
+
+    def _StartService(self, Call, p):
+        line = self.Lines[Call.Line]
+        Call.Pool = p
+        ServiceTime = SimRNG.Erlang(line.Phases, line.Mean * self.Pools[p].Inflation, line.Stream)
+        SimFunctions.SchedulePlus(self._Calendar, "EndOfService", ServiceTime, Call)
+        return ServiceTime
+
+    def _IPAStartService(self, Call, p):
+        # Service starts at a time whose derivative is _dNow
+        ServiceTime = CallCenterModel._StartService(self, Call, p)
+        Call.dDeparture = list(self._dNow)
+        Call.dDeparture[Call.Line] += ServiceTime / self.Lines[Call.Line].Mean
+        self._Wait[p] += SimClasses.Clock - Call.CreateTime
+        self._NumWait[p] += 1
+        dWait = self._dWait[p]
+        for k, d in enumerate(self._dNow):
+            dWait[k] += d
+
+    def _TraceStartService(self, Call, p):
+        ServiceTime = self._UntracedStartService(Call, p)
+        Call.ServiceStart = SimClasses.Clock
+        idle = self._IdleOperators[p]
+        if len(idle) > 0:
+            Call.Operator = idle.pop()
+        else:
+            # An operator added by a staffing change
+            Call.Operator = self._NumOperatorIds[p]
+            self._NumOperatorIds[p] += 1
+        return ServiceTime
+
+    def _TraceEndOfService(self, DepartingCall):
+        # The operator is free for the next call, if there is one
+        self._IdleOperators[DepartingCall.Pool].append(DepartingCall.Operator)
+        self._UntracedEndOfService(DepartingCall)
+        self.Trace.Record(DepartingCall.CallId, DepartingCall.Line, DepartingCall.CreateTime,
+            DepartingCall.ServiceStart, SimClasses.Clock, DepartingCall.Pool, DepartingCall.Operator)
+
+    def _Staffing(self, Period, Snapshots=None):
+        if Snapshots is not None:
+            # State at the boundary, before the new staffing applies
+            Snapshots.append(SimCheckpoint.CheckpointModel(self, Period, Compress=False))
+        for p, pool in enumerate(self.Pools):
+            if isinstance(pool.NumOperators, (list, tuple)):
+                for NextCall, k in self._Router.Resize(p, self._Units(pool, Period)):
+                    self._RecordQueues(k)
+                    self._RecordQueueTime(NextCall, p)
+                    self._StartService(NextCall, p)
+
+    def _RecordQueueTime(self, Call, p):
+        if self.Quantiles:
+            self._Sketches[self.Pools[p].Name + "QueueTime"].Add(SimClasses.Clock - Call.EntryTime)
+        if self.NPeriods is None:
+            self._QueueTime[p].Record(SimClasses.Clock - Call.EntryTime)
+        else:
+            self._QueueTime[p].Record(SimClasses.Clock - Call.EntryTime, Call.CreateTime)
+
+    def _RecordQueues(self, k):
+        # Number of waiting calls each pool could serve
+        for p in self._Servers[k]:
+            self._PoolQueue[p].Record(float(sum(self._Queues[j].NumQueue() for j in self._Skills[p])))
+
+    def _Skip(self, *args):
+        pass
+
+    def _EndOfService(self, DepartingCall):
+        p = DepartingCall.Pool
+        self._RecordDeparture(DepartingCall, p)
+
+        routed = self._Router.Release(p)
+        if routed is not None:
+            NextCall, k = routed
+            self._RecordQueues(k)
+            self._RecordQueueTime(NextCall, p)
+            self._StartService(NextCall, p)
+
+    def _IPAEndOfService(self, DepartingCall):
+        # A call started now starts at this departure time
+        self._dNow = DepartingCall.dDeparture
+        CallCenterModel._EndOfService(self, DepartingCall)
+        self._dNow = self._dZero
+
+    def _IPARecordDeparture(self, DepartingCall, p):
+        CallCenterModel._RecordDeparture(self, DepartingCall, p)
+        dTIS = self._dTIS[p]
+        for k, d in enumerate(DepartingCall.dDeparture):
+            dTIS[k] += d
+        self._NumTIS[p] += 1
+
+    def _RecordDeparture(self, DepartingCall, p):
+        TIS = SimClasses.Clock - DepartingCall.CreateTime
+        if self.Quantiles:
+            self._Sketches[self.Pools[p].Name + "TIS"].Add(TIS)
+        if self.NPeriods is None:
+            self._TIS[p].Record(TIS)
+            self._Within[p].Record((TIS < self.ServiceLevel))
+        else:
+            self._TIS[p].Record(TIS, DepartingCall.CreateTime)
+            self._Within[p].Record((TIS < self.ServiceLevel), DepartingCall.CreateTime)
+
+    def RunReplication(self, Snapshots=None):
+        '''
+        Runs one replication with the current staffing
+
+        Input:
+            Snapshots: list, optional; if given, a snapshot of the
+                model (for ResumeReplication) is appended at each
+                period boundary where staffing may change
+
+        Output:
+            list of floats in Columns order
+        '''
+
+        if Snapshots is not None and (self.ArrivalSource != "calendar" or self.Trace is not None):
+            raise ValueError("snapshots need ArrivalSource 'calendar' and no Trace")
+        Varying = [pool.Name for pool in self.Pools if isinstance(pool.NumOperators, (list, tuple))]
+        if len(Varying) > 0 and self.NPeriods is None:
+            raise ValueError("per-period staffing needs NPeriods")
+        for pool in self.Pools:
+            if pool.Name in Varying and len(pool.NumOperators) != self.NPeriods:
+                raise ValueError("pool %s needs one staffing level per period" % pool.Name)
+
+        self._Init()
+        for pool, Operators in zip(self.Pools, self._Operators):
+            Operators.SetUnits(self._Units(pool, 0))
+        self._Router.Reset()
+        for sketch in self._Sketches.values():
+            sketch.Clear()
+        for i, source in enumerate(self._Poisson or []):
+            self._ResetArrivals(i, source)
+        if self.IPA:
+            for sums in self._dTIS + self._dWait:
+                sums[:] = self._dZero
+            self._NumTIS = [0] * len(self.Pools)
+            self._Wait = [0.0] * len(self.Pools)
+            self._NumWait = [0] * len(self.Pools)
+        if self.Trace is not None:
+            self.Trace.NewReplication()
+            units = [int(self._Units(pool, 0)) for pool in self.Pools]
+            self._IdleOperators = [list(range(n - 1, -1, -1)) for n in units]
+            self._NumOperatorIds = units
+        if len(Varying) > 0:
+            for Period in range(1, self.NPeriods):
+                SimFunctions.SchedulePlus(self._Calendar, "Staffing", Period * self.PeriodLength, Period)
+        if self.ArrivalSource == "trace":
+            self._CursorLoop(self._ArrivalCursor())
+            return self._Row()
+        for k in self._Sources:
+            self._ScheduleFirst(k)
+
+        if self.Instrument is None:
+            self._Loop(Snapshots)
+        else:
+            self._InstrumentedLoop(Snapshots)
+        return self._Row()
+
+    def _ResetArrivals(self, i, source):
+        # Starts a day of Poisson arrivals; days run on from the
+        #   model's last one, or start again from a stream set
+        #   elsewhere
+        if SimRNG.lcgrandgt(source.Stream) != self._NextDay[i]:
+            self._Days[i] = 0
+        if self._DayLimit[i] is not None and self._Days[i] == self._DayLimit[i]:
+            raise RuntimeError("Poisson arrivals on stream %d would reuse the draws of a later stream after "
+                "%d replications; set ArrivalReps or a smaller PeriodSpacing" % (source.Stream, self._Days[i]))
+        source.Reset()
+        self._Days[i] += 1
+        self._NextDay[i] = SimRNG.lcgrandgt(source.Stream)
+
+    def _Init(self):
+        # SimFunctions.SimFunctionsInit over the model's own objects
+        SimClasses.Clock = 0.0
+        self._Calendar.ThisCalendar = []
+        for Q in self._Queues:
+            Q.ThisQueue = []
+        for Re in self._Operators:
+            Re.CurrentNumBusy = 0.0
+        for CT in self._CTStats:
+            CT.Clear()
+            CT.Xlast = 0.0
+        for DT in self._DTStats:
+            DT.Clear()
+
+    def _ScheduleFirst(self, k):
+        InterarrivalTime = self._Interarrival(k)
+        if self._Poisson is None or InterarrivalTime <= self.RunLength:
+            SimFunctions.SchedulePlus(self._Calendar, "Arrival", InterarrivalTime, k)
+
+    def _ArrivalCursor(self):
+        '''
+        Returns a cursor over the times at which _Arrival would run
+            for each source; events of type len(_Sources), the last
+            of each source, create no call
+        '''
+
+        Lines = []
+        Ends = []
+        for k in self._Sources:
+            if self._Poisson is None:
+                times, end = FixedSchedule(self._Interarrival(k), self.RunLength)
+            else:
+                source = self._Poisson[0 if k is None else k]
+                times = []
+                end = None
+                t = source.Next()
+                while t <= self.RunLength:
+                    # The time of the next arrival event, computed as
+                    #   SchedulePlus does
+                    NextTime = t + (source.Next() - t)
+                    if NextTime > self.RunLength:
+                        end = t
+                        break
+                    times.append(t)
+                    t = NextTime
+            Lines.append(times)
+            Ends.append(end)
+        return MergeArrivals(Lines, Ends)
+
+    def _CursorLoop(self, Arrivals):
+        # Main simulation loop: the earlier of the next calendar
+        #   event and the next arrival on the cursor
+        NoCall = len(self._Sources)
+        while True:
+            NextEventTime = self._Calendar.ThisCalendar[0].EventTime if self._Calendar.N() > 0 else math.inf
+            if Arrivals.NextTime <= NextEventTime:
+                if math.isinf(Arrivals.NextTime):
+                    break
+                SimClasses.Clock = Arrivals.NextTime
+                if SimClasses.Clock >= self.RunLength:
+                    break
+                j = Arrivals.Advance()
+                if j < NoCall:
+                    self._Call(self._Sources[j])
+                continue
+
+            NextEvent = self._Calendar.Remove()
+            SimClasses.Clock = NextEvent.EventTime
+            if SimClasses.Clock >= self.RunLength:
+                break
+            if NextEvent.EventType == "EndOfService":
+                self._EndOfService(NextEvent.WhichObject)
+            elif NextEvent.EventType == "Overflow":
+                self._Overflow(NextEvent.WhichObject)
+            elif NextEvent.EventType == "Staffing":
+                self._Staffing(NextEvent.WhichObject)
+
+    def _Loop(self, Snapshots):
+        # Main simulation loop
+        while self._Calendar.N() > 0:
+            NextEvent = self._Calendar.Remove()
+            SimClasses.Clock = NextEvent.EventTime
+
+            if SimClasses.Clock >= self.RunLength:
+                break
+
+            if NextEvent.EventType == "Arrival":
+                self._Arrival(NextEvent.WhichObject)
+            elif NextEvent.EventType == "EndOfService":
+                self._EndOfService(NextEvent.WhichObject)
+            elif NextEvent.EventType == "Overflow":
+                self._Overflow(NextEvent.WhichObject)
+            elif NextEvent.EventType == "Staffing":
+                self._Staffing(NextEvent.WhichObject, Snapshots)
+
+    def _InstrumentedLoop(self, Snapshots):
+        Handlers = {"Arrival": self._Arrival, "EndOfService": self._EndOfService,
+            "Overflow": self._Overflow,
+            "Staffing": lambda Period: self._Staffing(Period, Snapshots)}
+        self.Instrument.Loop(self._Calendar, Handlers, self.RunLength,
+            {line.Name: Q for line, Q in zip(self.Lines, self._Queues)},
+            {pool.Name: Re for pool, Re in zip(self.Pools, self._Operators)})
+
+    def _Row(self):
+        row = []
+        for p in range(len(self._TIS)):
+            if self.Statistics == "full":
+                row += [self._TIS[p].Mean(), self._PoolQueue[p].Mean(), self._Operators[p].Mean()]
+            else:
+                row += [self._TIS[p].Mean()]
+        row += [stat.Mean() for stat in self._Within]
+        row += [stat.Mean() for stat in self._QueueTime]
+        row += [SimClasses.Clock]
+        if self.Quantiles:
+            estimates = {}
+            for name, sketch in self._Sketches.items():
+                self.PooledSketches[name].Merge(sketch)
+                # 0.0 without observations, as for Mean
+                estimates[name] = (sketch.Quantiles(self.Quantiles) if sketch.Count > 0
+                    else [0.0] * len(self.Quantiles))
+            for j in range(len(self.Quantiles)):
+                row += [estimates[name][j] for name in self._Sketches]
+        if self.IPA:
+            # 0.0 without observations, as for Mean
+            row += [w / n if n > 0 else 0.0 for w, n in zip(self._Wait, self._NumWait)]
+            for sums, counts in [(self._dTIS, self._NumTIS), (self._dWait, self._NumWait)]:
+                for p in range(len(self.Pools)):
+                    row += [d / counts[p] if counts[p] > 0 else 0.0 for d in sums[p]]
+        return row
+
+    def PooledQuantiles(self):
+        '''
+        Returns the quantiles of time in system and queue time over
+            every call of every replication run so far
+
+        Output:
+            dict of quantile column name (e.g. FinanceTISp95) to float
+        '''
+
+        out = {}
+        for q in self.Quantiles:
+            for name, sketch in self.PooledSketches.items():
+                out[name + "p%g" % (100 * q)] = sketch.Quantile(q)
+        return out
+
+    def PeriodRow(self):
+        '''
+        Returns the per-period statistics of the replication just
+            run; requires NPeriods
+
+        Output:
+            dict of KPI name (as in Columns) to NumPy array of
+                NPeriods floats
+        '''
+
+        if self.NPeriods is None:
+            raise ValueError("the model was built without NPeriods")
+        row = {}
+        for p, pool in enumerate(self.Pools):
+            if self.Statistics == "none":
+                break
+            row[pool.Name + "TISavg"] = self._TIS[p].Means()
+            if self.Statistics == "full":
+                row[pool.Name + "OperatorQueueAvg"] = self._PoolQueue[p].Means()
+                row[pool.Name + "OperatorBusyAvg"] = self._Operators[p].NumBusyStat.Means()
+            row[pool.Name + "PropWithin5"] = self._Within[p].Means()
+            if self.Statistics == "full":
+                row[pool.Name + "QueueTimeAvg"] = self._QueueTime[p].Means()
+        return row
+
+    def Run(self, NumReps, Staffing=None):
+        '''
+        Runs NumReps replications, continuing the SimRNG streams
+
+        Input:
+            NumReps: integer, positive
+            Staffing: list of integers, optional, see SetStaffing
+
+        Output:
+            dict of output column to NumPy array over replications;
+                with NPeriods, also name + "ByPeriod" to an array of
+                shape (NumReps, NPeriods) for every KPI of PeriodRow
+        '''
+
+        if Staffing is not None:
+            self.SetStaffing(Staffing)
+        rows = []
+        periods = []
+        for rep in range(NumReps):
+            rows.append(self.RunReplication())
+            if self.NPeriods is not None:
+                periods.append(self.PeriodRow())
+        rows = np.array(rows).reshape(NumReps, len(self.Columns))
+        results = {name: rows[:, j] for j, name in enumerate(self.Columns)}
+        for name in (periods[0] if len(periods) > 0 else []):
+            results[name + "ByPeriod"] = np.array([row[name] for row in periods])
+        return results
+
+    def Sweep(self, Staffings, NumReps):
+        '''
+        Runs NumReps replications of every staffing with common
+            random numbers: each staffing starts from the same
+            SimRNG seeds, and the streams are left where the
+            last staffing ended
+
+        Input:
+            Staffings: list of staffings, see SetStaffing
+            NumReps: integer, positive
+
+        Output:
+            list of (staffing, results) tuples, results as from Run
+        '''
+
+        seeds = [SimRNG.lcgrandgt(s) for s in self.Streams]
+        results = []
+        for Staffing in Staffings:
+            for s, seed in zip(self.Streams, seeds):
+                SimRNG.lcgrandst(seed, s)
+            results.append((list(Staffing), self.Run(NumReps, Staffing)))
+        return results
+
+def ResumeReplication(Snapshot, Staffing=None, Snapshots=None):
+    '''
+    Continues a replication from a snapshot taken by
+        CallCenterModel.RunReplication at a period boundary, with
+        new staffing from that period on
+
+    The snapshot holds its own copy of the model, so the model
+        that took it is unchanged; the SimRNG streams are left
+        where the resumed replication ended, as after
+        RunReplication
+
+    Input:
+        Snapshot: bytes, from the Snapshots list of RunReplication
+        Staffing: list, optional, see SetStaffing; entries for
+            periods before the snapshot are ignored
+        Snapshots: list, optional, receives the snapshots of the
+            later period boundaries
+
+    Output:
+        row: list of floats in Columns order
+        periods: dict, as from PeriodRow
+    '''
+
+    model, Period = SimCheckpoint.RestoreModel(Snapshot)
+    if Staffing is not None:
+        model.SetStaffing(Staffing)
+    model._Staffing(Period)
+    if model.Instrument is None:
+        model._Loop(Snapshots)
+    else:
+        model._InstrumentedLoop(Snapshots)
+    return model._Row(), model.PeriodRow()
+
+def ExistingSystem(NumFinanceOperators=4, NumContactOperators=3, FinMean=5,
+                   ContactMean=5, RunLength=480, Statistics="full", IPA=False, **Options):
+    '''
+    Returns the existing SMP configuration: financial and contact
+        management lines, each with its own specialist pool, as in
+        existing_system_simcode.py; Options are passed on to
+        CallCenterModel
+
+    Output:
+        CallCenterModel object
+    '''
+
+    return CallCenterModel(
+        [ProductLine("Finance", 0.59, 2, FinMean, 2),
+         ProductLine("Contact", 0.41, 3, ContactMean, 3)],
+        [OperatorPool("Finance", NumFinanceOperators, ["Finance"]),
+         OperatorPool("Contact", NumContactOperators, ["Contact"])],
+        RunLength=RunLength, Statistics=Statistics, IPA=IPA, **Options)
+
+def CrossTrainedSystem(NumCrossTrained=7, Inflation=1.1, FinMean=5, ContactMean=5,
+                       RunLength=480, Statistics="full", IPA=False, **Options):
+    '''
+    Returns the proposed SMP configuration: one pool of
+        cross-trained operators serving both lines from a single
+        arrival stream, as in newsystem_simcode.py; Options are
+        passed on to CallCenterModel
+
+    Output:
+        CallCenterModel object
+    '''
+
+    return CallCenterModel(
+        [ProductLine("Finance", 0.59, 2, FinMean, 2),
+         ProductLine("Contact", 0.41, 3, ContactMean, 2)],
+        [OperatorPool("CrossTrained", NumCrossTrained, ["Finance", "Contact"], Inflation)],
+        RunLength=RunLength, Arrivals="mixed", ServiceLevel=5 * Inflation,
+        Statistics=Statistics, IPA=IPA, **Options)
+
+def PartialCrossTrainedSystem(NumFinanceOperators=3, NumContactOperators=2, NumCrossTrained=2,
+                              OverflowDelay=0.5, Inflation=1.1, FinMean=5, ContactMean=5,
+                              RunLength=480, Statistics="full", IPA=False, **Options):
+    '''
+    Returns a mixed configuration: specialist pools for each line,
+        and a cross-trained pool that takes calls of either line
+        once they have waited OverflowDelay minutes; Options are
+        passed on to CallCenterModel
+
+    Output:
+        CallCenterModel object
+    '''
+
+    return CallCenterModel(
+        [ProductLine("Finance", 0.59, 2, FinMean, 2),
+         ProductLine("Contact", 0.41, 3, ContactMean, 3)],
+        [OperatorPool("Finance", NumFinanceOperators, ["Finance"]),
+         OperatorPool("Contact", NumContactOperators, ["Contact"]),
+         OperatorPool("CrossTrained", NumCrossTrained, ["Finance", "Contact"], Inflation,
+             OverflowDelay)],
+        RunLength=RunLength, Statistics=Statistics, IPA=IPA, **Options)
+
+if __name__ == "__main__":
+    import time
+
+    # Sweep cross-trained staffing in one warm process
+    existing = ExistingSystem().Run(100)
+    print("Existing 4+3: mean TIS finance %.4f, contact %.4f"
+        % (existing["FinanceTISavg"].mean(), existing["ContactTISavg"].mean()))
+    model = CrossTrainedSystem()
+    start = time.perf_counter()
+    for Staffing, results in model.Sweep([[c] for c in range(6, 11)], 100):
+        print("Cross-trained %2d: mean TIS %.4f" % (Staffing[0], results["CrossTrainedTISavg"].mean()))
+    print("Sweep: %.2f seconds" % (time.perf_counter() - start))
+
+    # The same sweep keeping only the statistics it reports
+    model = CrossTrainedSystem(Statistics="kpi-only")
+    start = time.perf_counter()
+    model.Sweep([[c] for c in range(6, 11)], 100)
+    print("Sweep with kpi-only statistics: %.2f seconds" % (time.perf_counter() - start))
+
+    # Specialists first, overflow to cross-trained operators after 30 seconds
+    partial = PartialCrossTrainedSystem().Run(100)
+    print("Partial 3+2+2: mean TIS finance %.4f, contact %.4f, cross-trained %.4f"
+        % (partial["FinanceTISavg"].mean(), partial["ContactTISavg"].mean(),
+           partial["CrossTrainedTISavg"].mean()))
+
+    # IPA derivatives against central finite differences under
+    #   common random numbers, which need two more runs per mean;
+    #   replication by replication the two differ, but their
+    #   means must agree within 4 standard errors
+    SimRNG.ZRNG[:] = SimRNG.InitializeRNSeed()
+    ipa = ExistingSystem(IPA=True).Run(100)
+    h = 0.05
+    for line, name in [("Finance", "FinMean"), ("Contact", "ContactMean")]:
+        runs = []
+        for sign in (1, -1):
+            SimRNG.ZRNG[:] = SimRNG.InitializeRNSeed()
+            runs.append(ExistingSystem(IPA=True, **{name: 5 + sign * h}).Run(100))
+        for base in ["TISavg", "WaitAvg"]:
+            fd = (runs[0][line + base] - runs[1][line + base]) / (2 * h)
+            d = ipa[line + base + "_d" + line + "Mean"]
+            print("d %s%s / d %s: IPA %.4f, finite difference %.4f"
+                % (line, base, name, d.mean(), fd.mean()))
+            assert abs((d - fd).mean()) <= 4 * (d - fd).std(ddof=1) / np.sqrt(len(d)), line + base
@@ -0,0 +1,240 @@
+###############################################################
+
+# Contains Checkpoint, Restore, Fork, SaveCheckpoint and
+#   LoadCheckpoint functions, which snapshot and restore the
+#   full state of a simulation built from SimClasses objects,
+#   and CheckpointModel and RestoreModel, which do the same for
+#   a model object that owns its state, such as a
+#   SimCallCenter.CallCenterModel.
+
+# The state covers SimClasses.Clock, the contents of an
+#   EventCalendar, every FIFOQueue, Resource, CTStat and DTStat
+#   instance (matched by position in their InstanceList) and
+#   the SimRNG.ZRNG seeds. Entities shared between the calendar
+#   and queues keep their identity through a restore. A
+#   statistic with state beyond its SimClasses base class (e.g.
+#   the per-period sums of SimStats.PeriodDTStat) provides State
+#   and SetState, and that state is saved and restored with it.
+
+# A CallCenterModel keeps its queues, resources and statistics
+#   out of the SimClasses InstanceLists, so Checkpoint cannot see
+#   them. CheckpointModel instead pickles the model object whole,
+#   with SimClasses.Clock and the SimRNG.ZRNG seeds, and
+#   RestoreModel returns a new copy of it each time it is called.
+
+# Checkpoints of either kind are zlib-compressed pickles behind a
+#   short header. A fork is the same snapshot kept uncompressed
+#   in memory;
+#   it can be restored any number of times, e.g. to run the
+#   afternoon with several staffing variants without
+#   re-simulating the morning:
+
+#       morning = SimCheckpoint.Fork(Calendar)
+#       for units in [4, 5, 6]:
+#           SimCheckpoint.Restore(Calendar, morning)
+#           FinanceOperator.SetUnits(units)
+#           ... continue the main simulation loop ...
+
+###############################################################
+
+import pickle
+import zlib
+
+import SimClasses
+import SimRNG
+
+MAGIC = b"SMPCKPT2"
+COMPRESSED = b"z"
+RAW = b"r"
+
+def _Extra(stat):
+    # State beyond the SimClasses fields, or None
+    return stat.State() if hasattr(stat, "State") else None
+
+def _Capture(calendar):
+    '''
+    Collects the simulation state into plain Python containers
+
+    Input:
+        calendar: EventCalendar object
+
+    Output:
+        dict
+    '''
+
+    return {
+        "Clock": SimClasses.Clock,
+        "Calendar": [(E.EventTime, E.EventType, E.WhichObject)
+            for E in calendar.ThisCalendar],
+        "Queues": [list(Q.ThisQueue) for Q in SimClasses.FIFOQueue.InstanceList],
+        "Resources": [(Re.CurrentNumBusy, Re.NumberOfUnits)
+            for Re in SimClasses.Resource.InstanceList],
+        "CTStats": [(CT.Area, CT.Tlast, CT.TClear, CT.Xlast, CT.Max, CT.Min, _Extra(CT))
+            for CT in SimClasses.CTStat.InstanceList],
+        "DTStats": [(DT.Sum, DT.SumOfSquares, DT.NumberOfObservations, DT.Max, DT.Min, _Extra(DT))
+            for DT in SimClasses.DTStat.InstanceList],
+        "ZRNG": list(SimRNG.ZRNG),
+    }
+
+def Checkpoint(calendar, Compress=True):
+    '''
+    Returns the current simulation state as bytes
+
+    Input:
+        calendar: EventCalendar object
+        Compress: Boolean, zlib-compress the snapshot
+
+    Output:
+        bytes
+    '''
+
+    return _Pack(_Capture(calendar), Compress)
+
+def _Pack(state, Compress):
+    # The header, then the pickled state, compressed or not
+    data = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+    if Compress:
+        return MAGIC + COMPRESSED + zlib.compress(data)
+    return MAGIC + RAW + data
+
+def _Unpack(snapshot):
+    if snapshot[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a simulation checkpoint")
+    flag = snapshot[len(MAGIC):len(MAGIC) + 1]
+    data = snapshot[len(MAGIC) + 1:]
+    if flag == COMPRESSED:
+        data = zlib.decompress(data)
+    return pickle.loads(data)
+
+def Fork(calendar):
+    '''
+    Returns an uncompressed in-memory snapshot of the current state
+        that can be passed to Restore any number of times
+
+    Input:
+        calendar: EventCalendar object
+
+    Output:
+        bytes
+    '''
+
+    return Checkpoint(calendar, Compress=False)
+
+def Restore(calendar, snapshot):
+    '''
+    Restores the state saved by Checkpoint or Fork
+    Entities are rebuilt on every call, so branches restored
+        from the same snapshot do not share objects
+    The model must have created the same FIFOQueue, Resource,
+        CTStat and DTStat objects in the same order as when
+        the snapshot was taken
+
+    Input:
+        calendar: EventCalendar object
+        snapshot: bytes, from Checkpoint or Fork
+    '''
+
+    state = _Unpack(snapshot)
+    if "Model" in state:
+        raise ValueError("a model checkpoint; use RestoreModel")
+
+    for name, instances in [("Queues", SimClasses.FIFOQueue.InstanceList),
+                            ("Resources", SimClasses.Resource.InstanceList),
+                            ("CTStats", SimClasses.CTStat.InstanceList),
+                            ("DTStats", SimClasses.DTStat.InstanceList)]:
+        if len(state[name]) != len(instances):
+            raise ValueError("checkpoint has %d %s, model has %d"
+                % (len(state[name]), name, len(instances)))
+
+    SimClasses.Clock = state["Clock"]
+
+    calendar.ThisCalendar = []
+    for EventTime, EventType, WhichObject in state["Calendar"]:
+        E = SimClasses.EventNotice()
+        E.EventTime = EventTime
+        E.EventType = EventType
+        E.WhichObject = WhichObject
+        calendar.ThisCalendar.append(E)
+
+    for Q, contents in zip(SimClasses.FIFOQueue.InstanceList, state["Queues"]):
+        Q.ThisQueue = contents
+
+    for Re, (busy, units) in zip(SimClasses.Resource.InstanceList, state["Resources"]):
+        Re.CurrentNumBusy = busy
+        Re.NumberOfUnits = units
+
+    for CT, values in zip(SimClasses.CTStat.InstanceList, state["CTStats"]):
+        CT.Area, CT.Tlast, CT.TClear, CT.Xlast, CT.Max, CT.Min, extra = values
+        if extra is not None:
+            CT.SetState(extra)
+
+    for DT, values in zip(SimClasses.DTStat.InstanceList, state["DTStats"]):
+        DT.Sum, DT.SumOfSquares, DT.NumberOfObservations, DT.Max, DT.Min, extra = values
+        if extra is not None:
+            DT.SetState(extra)
+
+    SimRNG.ZRNG[:] = state["ZRNG"]
+
+def SaveCheckpoint(calendar, path):
+    '''
+    Writes a compressed checkpoint of the current state to a file
+
+    Input:
+        calendar: EventCalendar object
+        path: string, file name
+    '''
+
+    with open(path, "wb") as f:
+        f.write(Checkpoint(calendar))
+
+def LoadCheckpoint(calendar, path):
+    '''
+    Restores the state written by SaveCheckpoint
+
+    Input:
+        calendar: EventCalendar object
+        path: string, file name
+    '''
+
+    with open(path, "rb") as f:
+        Restore(calendar, f.read())
+
+def CheckpointModel(model, Tag=None, Compress=True):
+    '''
+    Returns the state of a model that owns its calendar, queues
+        and statistics, with SimClasses.Clock and the SimRNG
+        seeds, as bytes
+
+    Input:
+        model: picklable model object
+        Tag: picklable object kept with the snapshot, e.g. where
+            in the run it was taken
+        Compress: Boolean, zlib-compress the snapshot
+
+    Output:
+        bytes
+    '''
+
+    return _Pack({"Model": model, "Tag": Tag, "Clock": SimClasses.Clock,
+        "ZRNG": list(SimRNG.ZRNG)}, Compress)
+
+def RestoreModel(snapshot):
+    '''
+    Restores SimClasses.Clock and the SimRNG seeds saved by
+        CheckpointModel and returns a new copy of the model
+    The model that took the snapshot is unchanged
+
+    Input:
+        snapshot: bytes, from CheckpointModel
+
+    Output:
+        model object
+        Tag, as given to CheckpointModel
+    '''
+
+    state = _Unpack(snapshot)
+    if "Model" not in state:
+        raise ValueError("not a model checkpoint; use Restore")
+    SimClasses.Clock = state["Clock"]
+    SimRNG.ZRNG[:] = state["ZRNG"]
+    return state["Model"], state["Tag"]
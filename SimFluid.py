@@ -0,0 +1,304 @@
+###############################################################
+
+# Contains the FluidApproximation class, which approximates the
+#   time-varying queues of a SimCallCenter.CallCenterModel by
+#   ordinary differential equations instead of simulating them,
+#   for planning call centers too large to simulate over and
+#   over (thousands of operators, 10^5 calls per hour).
+
+# The arrival rates (per period with ArrivalRates), line shares,
+#   Erlang service phases and means, pool inflation and staffing
+#   (per period for a list of NumOperators) are read from the
+#   model itself, so the approximation and the simulation always
+#   describe the same system.
+
+# Each pool is one queue with the mix of service times of the
+#   lines it serves, and x(t), the mean number of its calls in
+#   the system, follows the pointwise stationary fluid flow
+#   approximation
+#       dx/dt = arrival rate(t) - operators(t) * utilization(x) / mean service
+#   where utilization(x) inverts the stationary relation between
+#   utilization and the number in system of an M/M/c queue, its
+#   queue scaled by (arrival SCV + service SCV) / 2 as in
+#   SimAnalytic.AllenCunneen and by the Kraemer and
+#   Langenbach-Belz factor for arrivals more or less regular
+#   than Poisson. That scaling is the diffusion correction: it
+#   accounts for the variability of arrivals and services that
+#   a plain fluid model, empty until overloaded, ignores. The
+#   relation is tabulated once per pool and staffing level with
+#   NumPy, so a solution takes milliseconds even for thousands
+#   of operators. Queue lengths come from the solution and
+#   waits from Little's law. Times in system, queue lengths and
+#   operators busy are the accurate outputs; QueueTimeAvg, the
+#   wait of the calls that waited, also needs the probability
+#   of waiting, taken from Erlang-C, and is rougher.
+
+# Fixed-interval arrivals have arrival SCV 0; the lines of mixed
+#   fixed-interval arrivals that go to different pools are
+#   Bernoulli splits, with SCV 1 - share; Poisson arrivals
+#   (ArrivalRates) have SCV 1. Every line must be served by one
+#   pool: overflow between pools is not approximated.
+
+###############################################################
+
+import math
+import time
+
+import numpy as np
+
+from SimAnalytic import ServiceMoments
+
+class FluidApproximation:
+    '''
+    Class of objects approximating a CallCenterModel by a fluid
+        (ODE) model with a diffusion correction
+
+    Instance attributes:
+        Model: CallCenterModel object
+        Step: float, time step of the ODE solver in minutes
+        Grid: integer, points of each utilization table
+        NPeriods: integer, the model's, or 1 without NPeriods
+        PeriodLength: float, the model's, or its RunLength
+        Rates: NumPy array of shape (pools, NPeriods), arrival
+            rate of each pool's calls
+        Operators: NumPy array of integers, same shape, staffing
+        Means: list of mean service times, one per pool
+        ArrivalSCVs: list of squared coefficients of variation of
+            interarrival times, one per pool
+        ServiceSCVs: list of squared coefficients of variation of
+            service times, one per pool
+
+    Instance methods:
+        Solve
+        Calibrate
+    '''
+
+    def __init__(self, Model, Step=0.25, Grid=400):
+        '''
+        Input:
+            Model: CallCenterModel object; every line served by
+                one pool
+            Step: float, positive
+            Grid: integer, at least 10
+        '''
+
+        self.Model = Model
+        self.Step = Step
+        self.Grid = Grid
+        if any(len(servers) != 1 for servers in Model._Servers):
+            raise ValueError("the fluid approximation needs each line to be served by one pool")
+        self.NPeriods = Model.NPeriods or 1
+        self.PeriodLength = Model.PeriodLength if Model.NPeriods is not None else Model.RunLength
+        total = (np.array(Model.ArrivalRates, dtype=float) if Model.ArrivalRates is not None
+            else np.full(self.NPeriods, float(Model.ArrivalRate)))
+
+        self.Rates = np.zeros((len(Model.Pools), self.NPeriods))
+        self.Operators = np.zeros((len(Model.Pools), self.NPeriods), dtype=int)
+        self.Means = []
+        self.ArrivalSCVs = []
+        self.ServiceSCVs = []
+        for p, pool in enumerate(Model.Pools):
+            lines = [Model.Lines[k] for k in Model._Skills[p]]
+            share = sum(line.Share for line in lines)
+            self.Rates[p] = total * share
+            for Period in range(self.NPeriods):
+                self.Operators[p, Period] = Model._Units(pool, Period)
+            mean, scv = ServiceMoments([(line.Share / share, line.Phases, line.Mean * pool.Inflation)
+                for line in lines])
+            if Model.ArrivalRates is not None:
+                arrivals = 1.0
+            elif Model.Arrivals == "mixed":
+                arrivals = 1.0 - share
+            else:
+                # Superposed fixed-interval streams, taken as regular
+                arrivals = 0.0
+            self.Means.append(mean)
+            self.ArrivalSCVs.append(arrivals)
+            self.ServiceSCVs.append(scv)
+        self._Tables = {}
+
+    def _Table(self, p, c):
+        '''
+        Returns, for pool p with c operators, increasing NumPy
+            arrays of number in system, utilization and probability
+            of waiting along a grid of utilizations
+        '''
+
+        key = (p, c)
+        if key not in self._Tables:
+            rho = 1 - np.geomspace(1, 1e-7, self.Grid)
+            load = c * rho
+            # Erlang-B by the stable recursion at every grid point, then
+            #   Erlang-C. With many operators the recursion starts from
+            #   the fluid value 1 - k / load at k well below every load
+            #   whose Erlang-C is not negligible: the recursion shrinks
+            #   an error by about k / load at each step, so the start
+            #   is forgotten
+            start = max(0, int(c - 25 * math.sqrt(c)))
+            with np.errstate(divide="ignore"):
+                B = np.maximum(1 - start / load, 0.0) if start > 0 else np.ones(self.Grid)
+            for k in range(start + 1, c + 1):
+                B = load * B / (k + load * B)
+            C = c * B / (c - load * (1 - B))
+            if start > 0:
+                C[load < c - 10 * math.sqrt(c)] = 0.0
+            ca, cs = self.ArrivalSCVs[p], self.ServiceSCVs[p]
+            if ca < 1:
+                g = np.exp(-2 * (1 - rho) * (1 - ca) ** 2 / (3 * np.maximum(rho, 1e-300) * (ca + cs)))
+            else:
+                g = np.exp(-(1 - rho) * (ca - 1) / (ca + 4 * cs))
+            L = load + (ca + cs) / 2 * g * C * rho / (1 - rho)
+            self._Tables[key] = (L, rho, C)
+        return self._Tables[key]
+
+    def Solve(self):
+        '''
+        Solves the fluid model from an empty system at time 0
+
+        Output:
+            dict with Times (NumPy array of minutes, every Step),
+                for each pool name a dict of NumPy arrays over
+                Times: InSystem, QueueLength, Busy, ProbWait and
+                Wait (mean wait of all calls); Periods, a dict of
+                KPI name (as in CallCenterModel.PeriodRow, e.g.
+                FinanceTISavg) to NumPy array of NPeriods floats;
+                and Seconds, the time taken
+        '''
+
+        start = time.perf_counter()
+        pools = len(self.Model.Pools)
+        steps = int(round(self.PeriodLength / self.Step))
+        dt = self.PeriodLength / steps
+        n = self.NPeriods * steps + 1
+        Times = np.arange(n) * dt
+        x = np.zeros(pools)
+        InSystem = np.zeros((pools, n))
+        Busy = np.zeros((pools, n))
+        ProbWait = np.zeros((pools, n))
+
+        def Utilization(x, tables):
+            return np.array([np.interp(x[p], L, rho) if c > 0 else 0.0
+                for p, (c, (L, rho, C)) in enumerate(tables)])
+
+        for Period in range(self.NPeriods):
+            tables = [(int(self.Operators[p, Period]), self._Table(p, max(1, int(self.Operators[p, Period]))))
+                for p in range(pools)]
+            rates = self.Rates[:, Period]
+            capacity = np.array([c / mean for (c, table), mean in zip(tables, self.Means)])
+
+            def Flow(x):
+                return rates - capacity * Utilization(x, tables)
+
+            for i in range(steps):
+                j = Period * steps + i
+                rho = Utilization(x, tables)
+                InSystem[:, j] = x
+                Busy[:, j] = [c * r for (c, table), r in zip(tables, rho)]
+                ProbWait[:, j] = [np.interp(r, table[1], table[2]) if c > 0 else 1.0
+                    for (c, table), r in zip(tables, rho)]
+                # Classical Runge-Kutta
+                k1 = Flow(x)
+                k2 = Flow(np.maximum(x + dt / 2 * k1, 0))
+                k3 = Flow(np.maximum(x + dt / 2 * k2, 0))
+                k4 = Flow(np.maximum(x + dt * k3, 0))
+                x = np.maximum(x + dt / 6 * (k1 + 2 * k2 + 2 * k3 + k4), 0)
+        rho = Utilization(x, tables)
+        InSystem[:, -1] = x
+        Busy[:, -1] = [c * r for (c, table), r in zip(tables, rho)]
+        ProbWait[:, -1] = ProbWait[:, -2]
+
+        QueueLength = np.maximum(InSystem - Busy, 0)
+        rates = np.repeat(self.Rates, steps, axis=1)
+        rates = np.concatenate([rates, rates[:, -1:]], axis=1)
+        Wait = np.where(rates > 0, QueueLength / np.maximum(rates, 1e-300), 0.0)
+
+        out = {"Times": Times}
+        Periods = {}
+        for p, pool in enumerate(self.Model.Pools):
+            out[pool.Name] = {"InSystem": InSystem[p], "QueueLength": QueueLength[p], "Busy": Busy[p],
+                "ProbWait": ProbWait[p], "Wait": Wait[p]}
+            # Averages over the steps of each period; arrivals are
+            #   uniform within a period, so call averages are too
+            shape = (self.NPeriods, steps)
+            wait = Wait[p, :-1].reshape(shape).mean(axis=1)
+            pwait = ProbWait[p, :-1].reshape(shape).mean(axis=1)
+            Periods[pool.Name + "TISavg"] = wait + self.Means[p]
+            Periods[pool.Name + "OperatorQueueAvg"] = QueueLength[p, :-1].reshape(shape).mean(axis=1)
+            Periods[pool.Name + "OperatorBusyAvg"] = Busy[p, :-1].reshape(shape).mean(axis=1)
+            Periods[pool.Name + "QueueTimeAvg"] = np.where(pwait > 0, wait / np.maximum(pwait, 1e-300), 0.0)
+        out["Periods"] = Periods
+        out["Seconds"] = time.perf_counter() - start
+        return out
+
+    def Calibrate(self, NumReps=50):
+        '''
+        Compares the approximation with NumReps replications of
+            the model, per period with NPeriods or over the whole
+            day without; the model's SimRNG streams move on as in
+            Run
+
+        Input:
+            NumReps: integer, at least 2
+
+        Output:
+            list of strings, a report with the approximate and
+                simulated value, the simulation's 95% half-width
+                and the relative error of each KPI and period, the
+                mean absolute relative error of each KPI, and the
+                time each method took
+        '''
+
+        fluid = self.Solve()
+        start = time.perf_counter()
+        results = self.Model.Run(NumReps)
+        seconds = time.perf_counter() - start
+        lines = ["%-30s %6s %10s %10s %10s %9s" % ("KPI", "period", "fluid", "simulated", "half-width", "rel.err")]
+        summary = []
+        for name, approx in fluid["Periods"].items():
+            if name + "ByPeriod" in results:
+                sims = results[name + "ByPeriod"]
+            elif name in results:
+                sims = results[name].reshape(NumReps, 1)
+            else:
+                continue
+            means = sims.mean(axis=0)
+            hws = 1.96 * sims.std(axis=0, ddof=1) / math.sqrt(NumReps)
+            errors = []
+            for Period in range(self.NPeriods):
+                rel = (approx[Period] - means[Period]) / means[Period] if means[Period] != 0 else math.nan
+                errors.append(abs(rel))
+                lines.append("%-30s %6d %10.4f %10.4f %10.4f %8.1f%%" % (name, Period, approx[Period],
+                    means[Period], hws[Period], 100 * rel))
+            summary.append("%-30s mean |rel.err| %5.1f%%" % (name, 100 * np.nanmean(errors)))
+        lines += summary
+        lines.append("fluid %.1f ms, %d replications %.2f s" % (1000 * fluid["Seconds"], NumReps, seconds))
+        return lines
+
+if __name__ == "__main__":
+    import SimCallCenter
+
+    # The SMP-sized models against the simulation
+    for name, model in [("Existing 4+3", SimCallCenter.ExistingSystem()),
+                        ("Cross-trained 7", SimCallCenter.CrossTrainedSystem())]:
+        print(name)
+        for line in FluidApproximation(model).Calibrate(50):
+            print("  " + line)
+    base = SimCallCenter.CrossTrainedSystem()
+    rates = [0.6, 0.9, 1.3, 1.1, 0.7, 1.0, 1.2, 0.8]
+    hourly = SimCallCenter.CallCenterModel(base.Lines, base.Pools, RunLength=480, Arrivals="mixed",
+        ServiceLevel=base.ServiceLevel, NPeriods=8, PeriodLength=60, ArrivalRates=rates)
+    hourly.SetStaffing([[5, 7, 9, 8, 6, 7, 8, 6]])
+    print("Cross-trained, hourly Poisson arrivals and staffing")
+    for line in FluidApproximation(hourly).Calibrate(50):
+        print("  " + line)
+
+    # A network-sized pool: 10^5 calls per hour
+    large = SimCallCenter.CallCenterModel(base.Lines, base.Pools, RunLength=480, Arrivals="mixed",
+        NPeriods=8, PeriodLength=60, ArrivalRates=[1000 * rate / 0.6 for rate in rates])
+    large.SetStaffing([[int(1000 * rate / 0.6 * 5.5 * 1.02) + 20 for rate in rates]])
+    solution = FluidApproximation(large).Solve()
+    print("%d to %d operators, %.0f calls per hour at peak: solved in %.1f ms"
+        % (min(large.Pools[0].NumOperators), max(large.Pools[0].NumOperators),
+           60 * 1000 * max(rates) / 0.6, 1000 * solution["Seconds"]))
+    print("  mean wait by period: " + " ".join("%.3f" % w for w in solution["Periods"]["CrossTrainedTISavg"]
+        - FluidApproximation(large).Means[0]))
@@ -0,0 +1,452 @@
+###############################################################
+
+# Contains the Forecaster class, which forecasts the queue times
+#   of the next minutes of a call center from the current state
+#   of the live system, e.g. "what will waits look like in the
+#   next 60 minutes, given who is on hold and who is busy now?"
+
+# A state is a JSON object, in minutes from the start of the day
+#   (the model's time 0):
+
+#       {"Clock": 150.0,
+#        "Operators": {"Finance": 4, "Contact": 3},
+#        "Queue": [{"Line": "Finance", "EntryTime": 146.2}, ...],
+#        "InService": [{"Line": "Contact", "Pool": "Contact",
+#                       "Elapsed": 3.5}, ...]}
+
+# Operators gives the size of each pool now (pools left out keep
+#   the model's staffing for the period), Queue the calls on
+#   hold, and InService the calls being answered, with the time
+#   spent on them so far (Pool may be left out when only one pool
+#   serves the line). A JSON file of this form stands in for the
+#   feed of an automatic call distributor.
+
+# Each replication starts the model in that state: the calls on
+#   hold keep their entry times, and a call in service finishes
+#   after the rest of an Erlang service time that has already
+#   lasted Elapsed, drawn exactly (phases completed so far are
+#   Poisson, given fewer than all of them). Arrivals follow the
+#   model's own arrival process from Clock on, and per-period
+#   staffing changes at the next period boundaries. A
+#   replication ends Horizon minutes later; a call still waiting
+#   then counts the wait so far, and is reported as censored.
+#   Every arrival before the end creates its call: the model's
+#   rule that the last arrival event of the day creates none
+#   does not apply to the end of a forecast.
+
+# Replications run in chunks of ChunkSize on a persistent pool
+#   of worker processes, each of which builds its own model once.
+#   Chunk c starts from the current SimRNG seeds jumped ahead
+#   c * JUMP draws, so a forecast is the same whatever the
+#   number of workers.
+
+###############################################################
+
+import json
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import SimClasses
+import SimFunctions
+import SimRNG
+
+# Draws reserved on every stream for each chunk of replications
+JUMP = 2 ** 24
+
+# Model and call log of a pool worker process, built by _InitWorker
+_Worker = {}
+
+def _MarkStart(Call, p):
+    Call.StartTime = SimClasses.Clock
+
+def _InitWorker(Build, BuildArgs):
+    _Worker["Model"], _Worker["Calls"] = _Prepare(Build, BuildArgs)
+
+def _Prepare(Build, BuildArgs):
+    # Builds the model and the list its arriving calls are logged in
+    model = Build(*BuildArgs)
+    if hasattr(model, "_ForecastCalls"):
+        # A model Build keeps, already logging its calls
+        return model, model._ForecastCalls
+    calls = []
+    Arrive = model._Router.Arrive
+
+    def LoggedArrive(Call, k):
+        p = Arrive(Call, k)
+        if p is not None:
+            Call.StartTime = SimClasses.Clock
+        calls.append(Call)
+        return p
+
+    # Every arriving call is logged, and stamped when it starts service
+    model._Router.Arrive = LoggedArrive
+    model._RecordQueueTime = _MarkStart
+    model._ForecastCalls = calls
+    return model, calls
+
+def LoadState(Path):
+    '''
+    Reads the state of a live system
+
+    Input:
+        Path: string, JSON file name
+
+    Output:
+        dict, see the top of this module
+    '''
+
+    with open(Path) as f:
+        return json.load(f)
+
+def _Residual(line, Mean, Elapsed):
+    '''
+    Returns the rest of an Erlang service time with the phases of
+        line and mean Mean that has lasted Elapsed
+    '''
+
+    m = line.Phases
+    x = m * Elapsed / Mean
+    weights = [x ** j / math.factorial(j) for j in range(m)]
+    u = SimRNG.lcgrand(line.Stream) * sum(weights)
+    j = 0
+    while j < m - 1 and u >= weights[j]:
+        u -= weights[j]
+        j += 1
+    return SimRNG.Erlang(m - j, Mean * (m - j) / m, line.Stream)
+
+def _Restore(model, State):
+    '''
+    Puts model in State, with every event that follows from it
+        on the calendar
+
+    Output:
+        list of Entity objects, the calls on hold in State order
+    '''
+
+    lines = {line.Name: k for k, line in enumerate(model.Lines)}
+    pools = {pool.Name: p for p, pool in enumerate(model.Pools)}
+    Clock = float(State["Clock"])
+    Period = 0
+    if model.NPeriods is not None:
+        Period = min(int(Clock // model.PeriodLength), model.NPeriods - 1)
+    units = [model._Units(pool, Period) for pool in model.Pools]
+    for name, n in State.get("Operators", {}).items():
+        if name not in pools:
+            raise ValueError("state has unknown pool %s" % name)
+        units[pools[name]] = int(n)
+
+    model._Init()
+    SimClasses.Clock = Clock
+    for sketch in model._Sketches.values():
+        sketch.Clear()
+
+    # Calls in service may outnumber operators who are leaving
+    busy = [0] * len(model.Pools)
+    InService = []
+    for entry in State.get("InService", []):
+        if entry["Line"] not in lines:
+            raise ValueError("state has unknown line %s" % entry["Line"])
+        k = lines[entry["Line"]]
+        if "Pool" in entry:
+            if entry["Pool"] not in pools or k not in model._Skills[pools[entry["Pool"]]]:
+                raise ValueError("pool %s does not serve line %s" % (entry.get("Pool"), entry["Line"]))
+            p = pools[entry["Pool"]]
+        elif len(model._Servers[k]) == 1:
+            p = model._Servers[k][0]
+        else:
+            raise ValueError("a call in service on line %s needs its Pool" % entry["Line"])
+        busy[p] += 1
+        InService.append((k, p, float(entry.get("Elapsed", 0.0))))
+    for p, Operators in enumerate(model._Operators):
+        Operators.SetUnits(max(units[p], busy[p]))
+    model._Router.Reset()
+
+    for k, p, Elapsed in InService:
+        line = model.Lines[k]
+        Call = SimClasses.Entity()
+        Call.CreateTime = Clock - Elapsed
+        Call.Line = k
+        Call.Pool = p
+        model._Operators[p].Seize(1)
+        SimFunctions.SchedulePlus(model._Calendar, "EndOfService",
+            _Residual(line, line.Mean * model.Pools[p].Inflation, Elapsed), Call)
+
+    held = []
+    for entry in State.get("Queue", []):
+        if entry["Line"] not in lines:
+            raise ValueError("state has unknown line %s" % entry["Line"])
+        Call = SimClasses.Entity()
+        Call.CreateTime = Call.EntryTime = float(entry["EntryTime"])
+        Call.Line = lines[entry["Line"]]
+        held.append(Call)
+    for Call in sorted(held, key=lambda Call: Call.EntryTime):
+        model._Router.Enqueue(Call, Call.Line)
+        for Delay in model._Router.OverflowDelays(Call.Line):
+            if Call.EntryTime + Delay > Clock:
+                SimFunctions.SchedulePlus(model._Calendar, "Overflow", Call.EntryTime + Delay - Clock, Call.Line)
+
+    # Idle operators take the calls on hold they are eligible for
+    for p in range(len(model.Pools)):
+        for NextCall, k in model._Router.Resize(p, units[p]):
+            model._RecordQueues(k)
+            model._RecordQueueTime(NextCall, p)
+            model._StartService(NextCall, p)
+
+    if any(isinstance(pool.NumOperators, (list, tuple)) for pool in model.Pools):
+        for Next in range(Period + 1, model.NPeriods):
+            SimFunctions.SchedulePlus(model._Calendar, "Staffing", Next * model.PeriodLength - Clock, Next)
+
+    if model._Poisson is not None:
+        sources = enumerate(model._Poisson) if model.Arrivals == "per-line" else [(None, model._Poisson[0])]
+        for k, source in sources:
+            source.Reset()
+            t = source.Next()
+            while t < Clock:
+                t = source.Next()
+            if t < math.inf:
+                SimFunctions.SchedulePlus(model._Calendar, "Arrival", t - Clock, k)
+    else:
+        # Fixed-interval arrivals keep their schedule from time 0
+        for k in ([None] if model.Arrivals == "mixed" else range(len(model.Lines))):
+            interval = model._Interarrival(k)
+            SimFunctions.SchedulePlus(model._Calendar, "Arrival",
+                (math.floor(Clock / interval) + 1) * interval - Clock, k)
+    return held
+
+def _Advance(model, End):
+    '''
+    Runs the model's events before End; RunLength is infinite
+        meanwhile, so arrivals are scheduled past End and the
+        last one before End creates its call
+    '''
+
+    RunLength = model.RunLength
+    model.RunLength = math.inf
+    calendar = model._Calendar
+    try:
+        while calendar.N() > 0 and calendar.ThisCalendar[0].EventTime < End:
+            NextEvent = calendar.Remove()
+            SimClasses.Clock = NextEvent.EventTime
+            if NextEvent.EventType == "Arrival":
+                model._Arrival(NextEvent.WhichObject)
+            elif NextEvent.EventType == "EndOfService":
+                model._EndOfService(NextEvent.WhichObject)
+            elif NextEvent.EventType == "Overflow":
+                model._Overflow(NextEvent.WhichObject)
+            elif NextEvent.EventType == "Staffing":
+                model._Staffing(NextEvent.WhichObject)
+    finally:
+        model.RunLength = RunLength
+
+def _WorkerSimulate(State, Horizon, Seeds, NumReps, NumBuckets):
+    # _Simulate on the model of a pool worker
+    return _Simulate(_Worker["Model"], _Worker["Calls"], State, Horizon, Seeds, NumReps, NumBuckets)
+
+def _Simulate(model, calls, State, Horizon, Seeds, NumReps, NumBuckets):
+    '''
+    Runs NumReps forecast replications of model, whose arriving
+        calls are logged in calls, in the current process
+
+    Output:
+        dict of NumPy arrays: Rep, Line, Bucket, Wait and Censored
+            per arriving call, HoldWaits and HoldCensored of shape
+            (NumReps, calls on hold), QueueAtEnd of shape
+            (NumReps, lines)
+    '''
+
+    SimRNG.ZRNG[:] = Seeds
+    Start = float(State["Clock"])
+    End = Start + Horizon
+    width = Horizon / NumBuckets
+    out = {"Rep": [], "Line": [], "Bucket": [], "Wait": [], "Censored": []}
+    HoldWaits = np.zeros((NumReps, len(State.get("Queue", []))))
+    HoldCensored = np.zeros(HoldWaits.shape, dtype=bool)
+    QueueAtEnd = np.zeros((NumReps, len(model.Lines)))
+    for r in range(NumReps):
+        del calls[:]
+        held = _Restore(model, State)
+        _Advance(model, End)
+        for j, Call in enumerate(held):
+            HoldWaits[r, j] = getattr(Call, "StartTime", End) - Call.EntryTime
+            HoldCensored[r, j] = not hasattr(Call, "StartTime")
+        for Call in calls:
+            out["Rep"].append(r)
+            out["Line"].append(Call.Line)
+            out["Bucket"].append(min(int((Call.CreateTime - Start) / width), NumBuckets - 1))
+            if hasattr(Call, "StartTime"):
+                out["Wait"].append(Call.StartTime - getattr(Call, "EntryTime", Call.StartTime))
+                out["Censored"].append(False)
+            else:
+                out["Wait"].append(End - Call.EntryTime)
+                out["Censored"].append(True)
+        QueueAtEnd[r] = [Q.NumQueue() for Q in model._Queues]
+    out = {name: np.array(values) for name, values in out.items()}
+    out["Censored"] = out["Censored"].astype(bool)
+    out.update(HoldWaits=HoldWaits, HoldCensored=HoldCensored, QueueAtEnd=QueueAtEnd)
+    return out
+
+class Forecaster:
+    '''
+    Class of objects for forecasting queue times from the state
+        of a live call center
+
+    Instance attributes:
+        Build: function returning a CallCenterModel; must be
+            picklable (e.g. defined at module level) when Workers
+            is more than 1
+        BuildArgs: tuple, arguments of Build
+        Workers: integer, processes running replications
+        ChunkSize: integer, replications per task
+        Quantiles: list of quantiles of queue time reported
+        Lines: list of names of the model's product lines
+        Pool: ProcessPoolExecutor object, after the first forecast
+            with Workers more than 1
+
+    Instance methods:
+        Forecast
+        Close
+    '''
+
+    def __init__(self, Build, BuildArgs=(), Workers=1, ChunkSize=250, Quantiles=(0.5, 0.9, 0.95)):
+        '''
+        Builds the model in this process, which checks it and runs
+            the replications when Workers is 1; the workers build
+            their own
+
+        Input:
+            Build: function, see above
+            BuildArgs: tuple
+            Workers: integer, positive
+            ChunkSize: integer, positive
+            Quantiles: list of floats in [0, 1]
+        '''
+
+        self.Build = Build
+        self.BuildArgs = tuple(BuildArgs)
+        self.Workers = Workers
+        self.ChunkSize = ChunkSize
+        self.Quantiles = list(Quantiles)
+        self.Pool = None
+        self._Model, self._Calls = _Prepare(Build, self.BuildArgs)
+        self.Lines = [line.Name for line in self._Model.Lines]
+
+    def Close(self):
+        '''
+        Shuts the worker pool down
+        '''
+
+        if self.Pool is not None:
+            self.Pool.shutdown()
+            self.Pool = None
+
+    def Forecast(self, State, Horizon=60, NumReps=2000, NumBuckets=4):
+        '''
+        Forecasts queue times over the next Horizon minutes,
+            starting from the current SimRNG seeds, which it moves
+            on past the draws reserved for its replications
+
+        Input:
+            State: dict, see the top of this module, or the name
+                of a JSON file holding one
+            Horizon: float, positive, minutes
+            NumReps: integer, positive
+            NumBuckets: integer, positive; calls are grouped by
+                the part of the horizon they arrive in
+
+        Output:
+            dict with, for each line, per bucket: Start (minute of
+                the day), Calls (mean arrivals per replication),
+                MeanWait and HalfWidth (95% over replications),
+                ProbWait (probability of waiting at all), Censored
+                (fraction still waiting at the end) and a pNN
+                queue time per quantile; OnHold, the same for each
+                call on hold now, with Waited so far; QueueAtEnd,
+                the mean and quantiles of each line's queue length
+                at the end
+        '''
+
+        if isinstance(State, str):
+            State = LoadState(State)
+        start = time.perf_counter()
+        base = list(SimRNG.ZRNG)
+        chunks = []
+        for c, first in enumerate(range(0, NumReps, self.ChunkSize)):
+            jump = pow(SimRNG.MULT, c * JUMP, SimRNG.MODLUS)
+            chunks.append(([z * jump % SimRNG.MODLUS for z in base], min(self.ChunkSize, NumReps - first)))
+
+        if self.Workers > 1:
+            if self.Pool is None:
+                self.Pool = ProcessPoolExecutor(self.Workers, initializer=_InitWorker,
+                    initargs=(self.Build, self.BuildArgs))
+            futures = [self.Pool.submit(_WorkerSimulate, State, Horizon, seeds, n, NumBuckets)
+                for seeds, n in chunks]
+            parts = [future.result() for future in futures]
+        else:
+            parts = [_Simulate(self._Model, self._Calls, State, Horizon, seeds, n, NumBuckets)
+                for seeds, n in chunks]
+        jump = pow(SimRNG.MULT, len(chunks) * JUMP, SimRNG.MODLUS)
+        SimRNG.ZRNG[:] = [z * jump % SimRNG.MODLUS for z in base]
+
+        offsets = np.cumsum([0] + [n for seeds, n in chunks])
+        data = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+        data["Rep"] = np.concatenate([part["Rep"] + offset for part, offset in zip(parts, offsets)])
+
+        Clock = float(State["Clock"])
+        width = Horizon / NumBuckets
+        out = {"Clock": Clock, "Horizon": Horizon, "Replications": NumReps, "Lines": {}}
+        for k, name in enumerate(self.Lines):
+            out["Lines"][name] = []
+            for b in range(NumBuckets):
+                mask = (data["Line"] == k) & (data["Bucket"] == b)
+                summary = self._Summary(data["Wait"][mask], data["Censored"][mask], data["Rep"][mask], NumReps)
+                out["Lines"][name].append(dict(Start=Clock + b * width, **summary))
+        out["OnHold"] = []
+        for j, entry in enumerate(State.get("Queue", [])):
+            summary = self._Summary(data["HoldWaits"][:, j], data["HoldCensored"][:, j], np.arange(NumReps), NumReps)
+            del summary["Calls"]
+            out["OnHold"].append(dict(Line=entry["Line"], EntryTime=entry["EntryTime"],
+                Waited=Clock - entry["EntryTime"], **summary))
+        out["QueueAtEnd"] = {}
+        for k, name in enumerate(self.Lines):
+            lengths = data["QueueAtEnd"][:, k]
+            out["QueueAtEnd"][name] = dict(Mean=float(lengths.mean()),
+                **{"p%g" % (100 * q): float(np.quantile(lengths, q)) for q in self.Quantiles})
+        out["Seconds"] = time.perf_counter() - start
+        return out
+
+    def _Summary(self, Wait, Censored, Rep, NumReps):
+        if len(Wait) == 0:
+            return dict(Calls=0.0, MeanWait=None, HalfWidth=None, ProbWait=None, Censored=None,
+                **{"p%g" % (100 * q): None for q in self.Quantiles})
+        counts = np.bincount(Rep, minlength=NumReps)
+        sums = np.bincount(Rep, weights=Wait, minlength=NumReps)
+        means = sums[counts > 0] / counts[counts > 0]
+        HalfWidth = float(1.96 * means.std(ddof=1) / math.sqrt(len(means))) if len(means) > 1 else None
+        return dict(Calls=float(counts.mean()), MeanWait=float(Wait.mean()), HalfWidth=HalfWidth,
+            ProbWait=float((Wait > 0).mean()), Censored=float(Censored.mean()),
+            **{"p%g" % (100 * q): float(np.quantile(Wait, q)) for q in self.Quantiles})
+
+if __name__ == "__main__":
+    import SimCallCenter
+
+    # Mid-morning at the existing system: a backlog of finance calls
+    State = {"Clock": 150.0,
+             "Operators": {"Finance": 4, "Contact": 3},
+             "Queue": [{"Line": "Finance", "EntryTime": t} for t in (143.0, 145.5, 147.2, 148.9, 149.6)]
+                 + [{"Line": "Contact", "EntryTime": 149.1}],
+             "InService": [{"Line": "Finance", "Elapsed": e} for e in (0.5, 2.0, 4.1, 7.3)]
+                 + [{"Line": "Contact", "Elapsed": e} for e in (1.2, 3.3, 6.0)]}
+    forecaster = Forecaster(SimCallCenter.ExistingSystem, (4, 3, 5, 5, 480, "none"), Workers=2)
+    result = forecaster.Forecast(State, Horizon=60, NumReps=2000)
+    print("%d replications in %.2f s" % (result["Replications"], result["Seconds"]))
+    for name, buckets in result["Lines"].items():
+        for b in buckets:
+            print("%-8s from %5.1f: %5.1f calls, wait %.2f +/- %.2f, P(wait) %.2f, p90 %.2f"
+                % (name, b["Start"], b["Calls"], b["MeanWait"], b["HalfWidth"], b["ProbWait"], b["p90"]))
+    for call in result["OnHold"]:
+        print("on hold %-8s %4.1f min so far: total wait %.2f, p90 %.2f"
+            % (call["Line"], call["Waited"], call["MeanWait"], call["p90"]))
+    forecaster.Close()
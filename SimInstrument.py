@@ -0,0 +1,254 @@
+###############################################################
+
+# Contains the Instrument class, which runs a model's main
+#   simulation loop while measuring where the time goes, and
+#   writes one machine-readable report per replication.
+
+# A report counts the events of each EventType, estimates the
+#   wall time spent in each event handler from a sample of the
+#   events, records the high-water marks of the event calendar,
+#   every FIFOQueue and every Resource, the calendar length over
+#   time, the SimRNG draws made from each stream, and the draws
+#   generated from a seed rather than a stream (SimRNG.lcgrandseq,
+#   e.g. the per-period substreams of SimArrivals.NSPPArrivals).
+
+# A model that is not instrumented runs its own loop, which is
+#   untouched: the instrumented loop is chosen once per
+#   replication, so switching instrumentation off costs nothing
+#   per event. Draws are counted by swapping counting versions
+#   of SimRNG.lcgrand, lcgrandbatch, lcgrandskip and lcgrandseq
+#   in for the length of the instrumented loop; draws skipped
+#   with lcgrandskip count as draws of their stream.
+
+# With Profile="cprofile" every instrumented loop also runs
+#   under cProfile, and WriteProfile saves the statistics for
+#   pstats or snakeviz. With Profile="perf" (Python 3.12 or
+#   later) the interpreter's perf trampoline is switched on, so
+#   "perf record" sees each handler as its own Python frame.
+
+###############################################################
+
+import json
+import sys
+import time
+
+import SimClasses
+import SimRNG
+
+class Instrument:
+    '''
+    Class of objects for instrumenting a simulation's event loop
+
+    Instance attributes:
+        SampleEvery: integer, one event in SampleEvery of each type
+            is timed
+        Profile: string, None, "cprofile" or "perf"
+        Reports: list of dicts, one per instrumented loop
+        Profiler: cProfile.Profile object with Profile="cprofile"
+
+    Instance methods:
+        Loop
+        WriteReports
+        WriteProfile
+    '''
+
+    def __init__(self, SampleEvery=16, Profile=None):
+        '''
+        Input:
+            SampleEvery: integer, positive
+            Profile: string, optional, "cprofile" or "perf"
+        '''
+
+        if Profile not in (None, "cprofile", "perf"):
+            raise ValueError("Profile must be None, 'cprofile' or 'perf'")
+        if Profile == "perf" and not hasattr(sys, "activate_stack_trampoline"):
+            raise ValueError("Profile='perf' needs Python 3.12 or later")
+        self.SampleEvery = SampleEvery
+        self.Profile = Profile
+        self.Reports = []
+        self.Profiler = None
+        if Profile == "cprofile":
+            import cProfile
+            self.Profiler = cProfile.Profile()
+
+    def __getstate__(self):
+        # A model snapshot carries its Instrument; the profiler
+        #   cannot be pickled and stays with the original
+        state = dict(self.__dict__)
+        state["Profiler"] = None
+        return state
+
+    def Loop(self, Calendar, Handlers, RunLength, Queues=None, Resources=None):
+        '''
+        Runs a main simulation loop, dispatching each event to the
+            handler of its EventType, and appends its report
+
+        Input:
+            Calendar: EventCalendar object
+            Handlers: dict of EventType to function of WhichObject
+            RunLength: float, the loop stops at the first event at
+                or after RunLength
+            Queues: dict of name to FIFOQueue object, optional
+            Resources: dict of name to Resource object, optional
+
+        Output:
+            dict, the report also appended to Reports
+        '''
+
+        Queues = Queues or {}
+        Resources = Resources or {}
+        counts = {EventType: 0 for EventType in Handlers}
+        sampled = {EventType: 0 for EventType in Handlers}
+        seconds = {EventType: 0.0 for EventType in Handlers}
+        QueuePeaks = {name: Q.NumQueue() for name, Q in Queues.items()}
+        BusyPeaks = {name: Re.CurrentNumBusy for name, Re in Resources.items()}
+        CalendarPeak = Calendar.N()
+        CalendarLength = []
+        draws = {}
+        SeedDraws = 0
+        clock = time.perf_counter
+        every = self.SampleEvery
+
+        lcgrand = SimRNG.lcgrand
+        lcgrandbatch = SimRNG.lcgrandbatch
+        lcgrandskip = SimRNG.lcgrandskip
+        lcgrandseq = SimRNG.lcgrandseq
+
+        def CountedLcgrand(Stream):
+            draws[Stream] = draws.get(Stream, 0) + 1
+            return lcgrand(Stream)
+
+        def CountedLcgrandbatch(n, Stream):
+            draws[Stream] = draws.get(Stream, 0) + n
+            # As lcgrandbatch, through the uncounted lcgrandseq
+            U, SimRNG.ZRNG[Stream - 1] = lcgrandseq(SimRNG.ZRNG[Stream - 1], n)
+            return U
+
+        def CountedLcgrandskip(n, Stream):
+            draws[Stream] = draws.get(Stream, 0) + n
+            return lcgrandskip(n, Stream)
+
+        def CountedLcgrandseq(zset, n):
+            nonlocal SeedDraws
+            SeedDraws += n
+            return lcgrandseq(zset, n)
+
+        SimRNG.lcgrand = CountedLcgrand
+        SimRNG.lcgrandbatch = CountedLcgrandbatch
+        SimRNG.lcgrandskip = CountedLcgrandskip
+        SimRNG.lcgrandseq = CountedLcgrandseq
+        if self.Profile == "perf":
+            sys.activate_stack_trampoline("perf")
+        elif self.Profiler is not None:
+            self.Profiler.enable()
+        start = clock()
+        try:
+            n = 0
+            while Calendar.N() > 0:
+                CalendarPeak = max(CalendarPeak, Calendar.N())
+                NextEvent = Calendar.Remove()
+                SimClasses.Clock = NextEvent.EventTime
+
+                if SimClasses.Clock >= RunLength:
+                    break
+
+                EventType = NextEvent.EventType
+                counts[EventType] += 1
+                if counts[EventType] % every == 1 or every == 1:
+                    begin = clock()
+                    Handlers[EventType](NextEvent.WhichObject)
+                    seconds[EventType] += clock() - begin
+                    sampled[EventType] += 1
+                else:
+                    Handlers[EventType](NextEvent.WhichObject)
+
+                for name, Q in Queues.items():
+                    if Q.NumQueue() > QueuePeaks[name]:
+                        QueuePeaks[name] = Q.NumQueue()
+                for name, Re in Resources.items():
+                    if Re.CurrentNumBusy > BusyPeaks[name]:
+                        BusyPeaks[name] = Re.CurrentNumBusy
+                n += 1
+                if n % every == 0:
+                    CalendarLength.append([SimClasses.Clock, Calendar.N()])
+        finally:
+            wall = clock() - start
+            if self.Profile == "perf":
+                sys.deactivate_stack_trampoline()
+            elif self.Profiler is not None:
+                self.Profiler.disable()
+            SimRNG.lcgrand = lcgrand
+            SimRNG.lcgrandbatch = lcgrandbatch
+            SimRNG.lcgrandskip = lcgrandskip
+            SimRNG.lcgrandseq = lcgrandseq
+
+        report = {
+            "Replication": len(self.Reports),
+            "WallSeconds": wall,
+            "Events": counts,
+            "EventsPerSecond": n / wall if wall > 0 else 0.0,
+            # Estimated from the timed sample of each type
+            "HandlerSeconds": {EventType: seconds[EventType] * counts[EventType] / sampled[EventType]
+                if sampled[EventType] > 0 else 0.0 for EventType in Handlers},
+            "HandlerSamples": sampled,
+            "CalendarPeak": CalendarPeak,
+            "CalendarLength": CalendarLength,
+            "QueuePeaks": QueuePeaks,
+            "BusyPeaks": BusyPeaks,
+            "Draws": {str(Stream): draws[Stream] for Stream in sorted(draws)},
+            "SeedDraws": SeedDraws,
+            "EndingTime": SimClasses.Clock,
+        }
+        self.Reports.append(report)
+        return report
+
+    def WriteReports(self, Path):
+        '''
+        Writes the reports as JSON, one object per line
+
+        Input:
+            Path: string, file name
+        '''
+
+        with open(Path, "w") as f:
+            for report in self.Reports:
+                f.write(json.dumps(report) + "\n")
+
+    def WriteProfile(self, Path):
+        '''
+        Saves the cProfile statistics of every instrumented loop
+
+        Input:
+            Path: string, file name, e.g. "run.prof"
+        '''
+
+        if self.Profiler is None:
+            raise ValueError("the Instrument was created without Profile='cprofile'")
+        self.Profiler.dump_stats(Path)
+
+if __name__ == "__main__":
+    import SimCallCenter
+
+    # Instrument three days of the existing system
+    model = SimCallCenter.ExistingSystem()
+    model.Instrument = Instrument(Profile="cprofile")
+    model.Run(3)
+    report = model.Instrument.Reports[-1]
+    print(json.dumps({key: report[key] for key in report if key != "CalendarLength"}, indent=1))
+
+    import io
+    import pstats
+    out = io.StringIO()
+    pstats.Stats(model.Instrument.Profiler, stream=out).sort_stats("cumulative").print_stats(8)
+    print(out.getvalue())
+
+    # Switched off, the model's own loop runs
+    model.Instrument = None
+    start = time.perf_counter()
+    model.Run(20)
+    plain = time.perf_counter() - start
+    model.Instrument = Instrument()
+    start = time.perf_counter()
+    model.Run(20)
+    print("20 replications: %.3f s plain, %.3f s instrumented"
+        % (plain, time.perf_counter() - start))
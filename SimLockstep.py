@@ -0,0 +1,290 @@
+###############################################################
+
+# Contains RunLockstep, which advances many replications of a
+#   call-center model together, and the RunExisting and
+#   RunCrossTrained wrappers for the two SMP configurations.
+
+# The state of every replication is held in NumPy arrays over
+#   the replication axis: clock, next arrival index, the
+#   completion time and creation time of the call held by each
+#   operator, and a ring buffer of queued arrival times per
+#   pool. Each step finds the next event of every replication
+#   and applies it with masked vector updates, following the
+#   event logic of existing_system_simcode.py and
+#   newsystem_simcode.py: arrivals at fixed interarrival times,
+#   FIFO service by identical operators, and a replication that
+#   ends at its first event at or after RunLength.
+
+# Service times come from a numpy.random.Generator rather than
+#   SimRNG, so results agree with the scalar engine in
+#   distribution, not replication by replication; running this
+#   module checks that agreement.
+
+###############################################################
+
+import math
+
+import numpy as np
+
+from SimArrivals import FixedSchedule
+
+class Pool:
+    '''
+    Class of objects describing one operator pool for RunLockstep
+
+    Instance attributes:
+        ArrivalTimes: NumPy array of call arrival times
+        LastArrival: float, time of the final arrival event
+        NumServers: integer, positive
+        ServiceMix: list of (probability, phases, mean) tuples for
+            the Erlang service time of each call type
+    '''
+
+    def __init__(self, ArrivalTimes, LastArrival, NumServers, ServiceMix):
+        self.ArrivalTimes = ArrivalTimes
+        self.LastArrival = LastArrival
+        self.NumServers = NumServers
+        self.ServiceMix = ServiceMix
+
+def _Service(rng, mix, k):
+    '''
+    Returns k Erlang service times drawn from the service mix
+    '''
+
+    if len(mix) == 1:
+        p, m, mean = mix[0]
+        return rng.gamma(m, mean / m, size=k)
+    u = rng.random(k)
+    out = np.empty(k)
+    lower = 0.0
+    for p, m, mean in mix:
+        which = (u >= lower) & (u < lower + p)
+        out[which] = rng.gamma(m, mean / m, size=int(which.sum()))
+        lower += p
+    return out
+
+def RunLockstep(NumReps, Pools, RunLength, Seed=None, ServiceLevel=5.0):
+    '''
+    Runs NumReps replications of a model made of independent
+        operator pools sharing one clock
+
+    Input:
+        NumReps: integer, positive
+        Pools: list of Pool objects
+        RunLength: float, positive
+        Seed: integer, optional seed of the service-time generator
+        ServiceLevel: float, time in system counted as good service
+
+    Output:
+        dict with, per pool index p, arrays over replications of
+            TISavg[p], QueueAvg[p], BusyAvg[p], QueueTimeAvg[p],
+            PropWithin5[p] (the proportion of calls within
+            ServiceLevel), and the array EndingTime
+    '''
+
+    R = NumReps
+    P = len(Pools)
+    rng = np.random.default_rng(Seed)
+    rows = np.arange(R)
+    clock = np.zeros(R)
+    active = np.ones(R, dtype=bool)
+
+    # Arrival event times per pool, with the final no-call event
+    #   and an infinite sentinel appended
+    times = [np.concatenate([p.ArrivalTimes, [p.LastArrival, math.inf]]) for p in Pools]
+    ncalls = [len(p.ArrivalTimes) for p in Pools]
+    ai = [np.zeros(R, dtype=np.int64) for p in Pools]
+
+    done = [np.full((R, p.NumServers), math.inf) for p in Pools]
+    created = [np.zeros((R, p.NumServers)) for p in Pools]
+    busy = [np.zeros(R) for p in Pools]
+    cap = [64] * P
+    queue = [np.zeros((R, 64)) for p in Pools]
+    qhead = [np.zeros(R, dtype=np.int64) for p in Pools]
+    qlen = [np.zeros(R, dtype=np.int64) for p in Pools]
+
+    areaq = [np.zeros(R) for p in Pools]
+    areab = [np.zeros(R) for p in Pools]
+    tis = [np.zeros(R) for p in Pools]
+    tisn = [np.zeros(R) for p in Pools]
+    within = [np.zeros(R) for p in Pools]
+    qtime = [np.zeros(R) for p in Pools]
+    qtimen = [np.zeros(R) for p in Pools]
+    ending = np.zeros(R)
+
+    candidates = np.empty((R, 2 * P))
+    while active.any():
+        for p in range(P):
+            candidates[:, 2 * p] = times[p][ai[p]]
+            candidates[:, 2 * p + 1] = done[p].min(axis=1)
+        which = candidates.argmin(axis=1)
+        t = candidates[rows, which]
+
+        # Replications whose next event is at or after RunLength stop at
+        #   that event; those with no events left stop at their clock
+        stop = active & (t >= RunLength)
+        ending[stop] = np.where(np.isinf(t[stop]), clock[stop], t[stop])
+        for p in range(P):
+            areaq[p][stop] += qlen[p][stop] * (ending[stop] - clock[stop])
+            areab[p][stop] += busy[p][stop] * (ending[stop] - clock[stop])
+        active &= ~stop
+
+        # Time-weighted areas up to the event time
+        dt = np.where(active, t - clock, 0.0)
+        for p in range(P):
+            areaq[p] += qlen[p] * dt
+            areab[p] += busy[p] * dt
+        clock = np.where(active, t, clock)
+
+        for p in range(P):
+            pool = Pools[p]
+
+            # Arrivals
+            idx = np.nonzero(active & (which == 2 * p))[0]
+            if len(idx) > 0:
+                real = ai[p][idx] < ncalls[p]
+                ai[p][idx] += 1
+                idx = idx[real]
+                free = busy[p][idx] < pool.NumServers
+                serve = idx[free]
+                if len(serve) > 0:
+                    slot = np.isinf(done[p][serve]).argmax(axis=1)
+                    done[p][serve, slot] = clock[serve] + _Service(rng, pool.ServiceMix, len(serve))
+                    created[p][serve, slot] = clock[serve]
+                    busy[p][serve] += 1
+                wait = idx[~free]
+                if len(wait) > 0:
+                    if (qlen[p][wait] == cap[p]).any():
+                        order = (qhead[p][:, None] + np.arange(cap[p])) % cap[p]
+                        unrolled = np.take_along_axis(queue[p], order, axis=1)
+                        queue[p] = np.concatenate([unrolled, np.zeros((R, cap[p]))], axis=1)
+                        qhead[p][:] = 0
+                        cap[p] *= 2
+                    queue[p][wait, (qhead[p][wait] + qlen[p][wait]) % cap[p]] = clock[wait]
+                    qlen[p][wait] += 1
+
+            # Ends of service
+            idx = np.nonzero(active & (which == 2 * p + 1))[0]
+            if len(idx) > 0:
+                slot = done[p][idx].argmin(axis=1)
+                x = clock[idx] - created[p][idx, slot]
+                tis[p][idx] += x
+                tisn[p][idx] += 1
+                within[p][idx] += x < ServiceLevel
+                more = qlen[p][idx] > 0
+                nxt, nslot = idx[more], slot[more]
+                if len(nxt) > 0:
+                    a = queue[p][nxt, qhead[p][nxt]]
+                    qhead[p][nxt] = (qhead[p][nxt] + 1) % cap[p]
+                    qlen[p][nxt] -= 1
+                    qtime[p][nxt] += clock[nxt] - a
+                    qtimen[p][nxt] += 1
+                    done[p][nxt, nslot] = clock[nxt] + _Service(rng, pool.ServiceMix, len(nxt))
+                    created[p][nxt, nslot] = a
+                idle, islot = idx[~more], slot[~more]
+                done[p][idle, islot] = math.inf
+                busy[p][idle] -= 1
+
+    def mean(total, n):
+        return np.where(n > 0, total / np.maximum(n, 1), 0.0)
+
+    span = np.where(ending > 0, ending, 1.0)
+    return {
+        "TISavg": [mean(tis[p], tisn[p]) for p in range(P)],
+        "QueueAvg": [areaq[p] / span for p in range(P)],
+        "BusyAvg": [areab[p] / span for p in range(P)],
+        "QueueTimeAvg": [mean(qtime[p], qtimen[p]) for p in range(P)],
+        "PropWithin5": [mean(within[p], tisn[p]) for p in range(P)],
+        "EndingTime": ending,
+    }
+
+def RunExisting(NumReps, NumFinanceOperators=4, NumContactOperators=3,
+                FinMean=5, ContactMean=5, RunLength=480, Seed=None, ServiceLevel=5.0):
+    '''
+    Runs the existing two-line system in lockstep
+
+    Input:
+        NumReps: integer, positive
+        NumFinanceOperators, NumContactOperators: integers, positive
+        FinMean, ContactMean: floats, mean service times
+        RunLength: float, positive
+        Seed: integer, optional
+        ServiceLevel: float, positive
+
+    Output:
+        dict of output column (as in current_system_output.csv)
+            to array over replications
+    '''
+
+    finance = Pool(*FixedSchedule(1 / (1 * 0.59), RunLength), NumFinanceOperators,
+        [(1.0, 2, FinMean)])
+    contact = Pool(*FixedSchedule(1 / (1 * 0.41), RunLength), NumContactOperators,
+        [(1.0, 3, ContactMean)])
+    out = RunLockstep(NumReps, [finance, contact], RunLength, Seed, ServiceLevel)
+    return {
+        "FinanceTISavg": out["TISavg"][0],
+        "FinanceOperatorQueueAvg": out["QueueAvg"][0],
+        "FinanceOperatorBusyAvg": out["BusyAvg"][0],
+        "ContactTISavg": out["TISavg"][1],
+        "ContactOperatorQueueAvg": out["QueueAvg"][1],
+        "ContactOperatorBusyAvg": out["BusyAvg"][1],
+        "FinanceQueueTimeAvg": out["QueueTimeAvg"][0],
+        "ContactQueueTimeAvg": out["QueueTimeAvg"][1],
+        "FinancePropWithin5": out["PropWithin5"][0],
+        "ContactPropWithin5": out["PropWithin5"][1],
+        "EndingTime": out["EndingTime"],
+    }
+
+def RunCrossTrained(NumReps, NumCrossTrained=7, FinMean=5 * 1.1, ContactMean=5 * 1.1,
+                    RunLength=480, Seed=None, ServiceLevel=5 * 1.1):
+    '''
+    Runs the single-pool cross-trained system in lockstep
+
+    Input:
+        NumReps: integer, positive
+        NumCrossTrained: integer, positive
+        FinMean, ContactMean: floats, mean service times
+        RunLength: float, positive
+        Seed: integer, optional
+        ServiceLevel: float, positive
+
+    Output:
+        dict of output column (as in cross_trained_output.csv)
+            to array over replications
+    '''
+
+    pool = Pool(*FixedSchedule(1 / 1, RunLength), NumCrossTrained,
+        [(0.59, 2, FinMean), (0.41, 3, ContactMean)])
+    out = RunLockstep(NumReps, [pool], RunLength, Seed, ServiceLevel)
+    return {
+        "CrossTrainedTISavg": out["TISavg"][0],
+        "CrossTrainedOperatorQueueAvg": out["QueueAvg"][0],
+        "CrossTrainedOperatorBusyAvg": out["BusyAvg"][0],
+        "CrossTrainedQueueTimeAvg": out["QueueTimeAvg"][0],
+        "CrossTrainedPropWithin5": out["PropWithin5"][0],
+        "EndingTime": out["EndingTime"],
+    }
+
+if __name__ == "__main__":
+    import time
+
+    import SimCallCenter
+
+    # Lockstep against the scalar engine, whose replications are
+    #   those of the SMP scripts: they agree in distribution, so
+    #   every column's mean must lie within 4 standard errors
+    NumReps = 400
+    for name, lockstep, model in [("Existing 4+3", RunExisting, SimCallCenter.ExistingSystem()),
+                                  ("Cross-trained 7", RunCrossTrained, SimCallCenter.CrossTrainedSystem())]:
+        start = time.perf_counter()
+        fast = lockstep(NumReps, Seed=1)
+        seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        scalar = model.Run(NumReps)
+        print("%s: lockstep %.2f s, scalar %.2f s" % (name, seconds, time.perf_counter() - start))
+        for column, values in fast.items():
+            diff = values.mean() - scalar[column].mean()
+            se = math.sqrt((values.var(ddof=1) + scalar[column].var(ddof=1)) / NumReps)
+            print("  %-28s %10.4f %10.4f" % (column, values.mean(), scalar[column].mean()))
+            assert abs(diff) <= 4 * se, column
+    print("Lockstep and scalar agree")
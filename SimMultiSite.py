@@ -0,0 +1,398 @@
+###############################################################
+
+# Contains the MultiSiteModel class, which simulates a network
+#   of call-center sites that overflow calls to each other,
+#   either in one process or as a conservative parallel
+#   discrete-event simulation with one OS process per site.
+
+# Each site has Poisson arrivals, a FIFO queue and identical
+#   operators with Erlang service times, like one pool of a
+#   SimCallCenter.CallCenterModel. A call arriving at a site
+#   whose operators are all busy and whose queue holds at least
+#   OverflowQueue calls is transferred to the next of the site's
+#   Targets in turn, and arrives there TransferDelay minutes
+#   later; a transferred call is not transferred again. Times in
+#   system run from the call's first arrival, so they include
+#   the transfer.
+
+# Every site is a logical process with its own EventCalendar,
+#   clock, queue, operators, statistics and SimRNG streams, and
+#   sites interact only through transfers. A site takes its
+#   events in time order, transfers before its own events at the
+#   same time and transfers of equal times by sending site, so
+#   what it does depends only on its own streams and on the
+#   transfers it receives.
+
+# Run simulates the sites in one process, always taking the
+#   earliest next event of any site. RunParallel runs each site
+#   in its own process, Chandy-Misra-Bryant style. A transfer
+#   sent at time t arrives at t + TransferDelay, so a site that
+#   has simulated up to time t can promise its targets no
+#   transfer before t + TransferDelay (the lookahead). In each
+#   round a site simulates its events before the least promise
+#   of the sites that send to it, then sends each target, over
+#   the target's inbound pipe (a multiprocessing.Queue), the
+#   transfers of the round and its new promise; a message with
+#   no transfers is a null message. The lookahead is positive,
+#   so promises rise around every cycle of sites and the network
+#   cannot deadlock. A site takes an event only once every
+#   transfer that could come before it has arrived, so each site
+#   takes the same events in the same order as in Run, and the
+#   two give the same results replication by replication. A round
+#   costs one message per link and covers at most TransferDelay
+#   minutes, so RunParallel pays off when each site has many
+#   events in that time, i.e. large sites or long transfers.
+
+###############################################################
+
+import heapq
+import math
+import multiprocessing
+import queue
+import time
+
+import numpy as np
+
+import SimClasses
+import SimFunctions
+import SimRNG
+
+class CallSite:
+    '''
+    Class of objects describing one site of a MultiSiteModel
+
+    Instance attributes:
+        Name: string, prefix of the site's output columns
+        ArrivalRate: float, Poisson calls per minute
+        NumOperators: integer, positive
+        Phases: integer, Erlang phases of the service time
+        Mean: float, mean service time
+        OverflowQueue: integer, calls on hold at which an arriving
+            call that finds every operator busy is transferred,
+            or None to transfer none
+        Targets: list of names of the sites taking the overflow,
+            in turn
+        ArrivalStream: integer, SimRNG stream for arrivals
+        ServiceStream: integer, SimRNG stream for service times
+    '''
+
+    def __init__(self, Name, ArrivalRate, NumOperators, Phases, Mean, ArrivalStream, ServiceStream,
+            OverflowQueue=None, Targets=()):
+        self.Name = Name
+        self.ArrivalRate = ArrivalRate
+        self.NumOperators = NumOperators
+        self.Phases = Phases
+        self.Mean = Mean
+        self.ArrivalStream = ArrivalStream
+        self.ServiceStream = ServiceStream
+        self.OverflowQueue = OverflowQueue
+        self.Targets = list(Targets)
+
+class _Site:
+    # One site as a logical process, for Run and for a worker of
+    #   RunParallel. Inbox is a heap of transfers received, as
+    #   (arrival time, sending site, number sent, CreateTime)
+    def __init__(self, Site, Index, Targets, TransferDelay):
+        self.Site = Site
+        self.Index = Index
+        self.Targets = Targets
+        self.TransferDelay = TransferDelay
+        self.Calendar = SimClasses.EventCalendar()
+        self.Queue = SimClasses.FIFOQueue()
+        self.Operators = SimClasses.Resource()
+        self.Operators.SetUnits(Site.NumOperators)
+        self.TIS = SimClasses.DTStat()
+        self.QueueTime = SimClasses.DTStat()
+        self.Inbox = []
+        self.Clock = 0.0
+
+    def Reset(self):
+        # Call for every site before any site takes an event
+        SimFunctions.SimFunctionsInit(self.Calendar)
+        self.Clock = 0.0
+        self.Inbox = []
+        self.Served = self.TransferredOut = self.TransferredIn = 0
+        self._Sent = 0
+        self._Turn = 0
+        self._Out = []
+        SimFunctions.SchedulePlus(self.Calendar, "Arrival",
+            SimRNG.Expon(1 / self.Site.ArrivalRate, self.Site.ArrivalStream), None)
+
+    def NextTime(self):
+        t = self.Calendar.ThisCalendar[0].EventTime if self.Calendar.N() > 0 else math.inf
+        return min(t, self.Inbox[0][0]) if len(self.Inbox) > 0 else t
+
+    def Step(self):
+        # Takes the next event; returns the transfers it sent, as
+        #   (target, message) tuples
+        self._Out = []
+        if len(self.Inbox) > 0 and (self.Calendar.N() == 0
+                or self.Inbox[0][0] <= self.Calendar.ThisCalendar[0].EventTime):
+            EventTime, Source, Number, CreateTime = heapq.heappop(self.Inbox)
+            SimClasses.Clock = self.Clock = EventTime
+            Call = SimClasses.Entity()
+            Call.CreateTime = CreateTime
+            self.TransferredIn += 1
+            self._Join(Call)
+        else:
+            NextEvent = self.Calendar.Remove()
+            SimClasses.Clock = self.Clock = NextEvent.EventTime
+            if NextEvent.EventType == "Arrival":
+                self._Arrival()
+            elif NextEvent.EventType == "EndOfService":
+                self._EndOfService(NextEvent.WhichObject)
+        return self._Out
+
+    def _Arrival(self):
+        SimFunctions.SchedulePlus(self.Calendar, "Arrival",
+            SimRNG.Expon(1 / self.Site.ArrivalRate, self.Site.ArrivalStream), None)
+        Call = SimClasses.Entity()
+        if (len(self.Targets) > 0 and self.Site.OverflowQueue is not None
+                and self.Operators.CurrentNumBusy >= self.Operators.NumberOfUnits
+                and self.Queue.NumQueue() >= self.Site.OverflowQueue):
+            target = self.Targets[self._Turn % len(self.Targets)]
+            self._Turn += 1
+            self.TransferredOut += 1
+            self._Out.append((target, (SimClasses.Clock + self.TransferDelay, self.Index, self._Sent,
+                Call.CreateTime)))
+            self._Sent += 1
+        else:
+            self._Join(Call)
+
+    def _Join(self, Call):
+        if self.Operators.Seize(1):
+            self._StartService(Call)
+        else:
+            Call.EntryTime = SimClasses.Clock  # Record the time call enters the queue
+            self.Queue.Add(Call)
+
+    def _StartService(self, Call):
+        SimFunctions.SchedulePlus(self.Calendar, "EndOfService",
+            SimRNG.Erlang(self.Site.Phases, self.Site.Mean, self.Site.ServiceStream), Call)
+
+    def _EndOfService(self, DepartingCall):
+        self.TIS.Record(SimClasses.Clock - DepartingCall.CreateTime)
+        self.Served += 1
+        if self.Queue.NumQueue() > 0:
+            NextCall = self.Queue.Remove()
+            self.QueueTime.Record(SimClasses.Clock - NextCall.EntryTime)
+            self._StartService(NextCall)
+        else:
+            self.Operators.Free(1)
+
+    def Row(self, RunLength):
+        SimClasses.Clock = RunLength
+        return [self.TIS.Mean(), self.QueueTime.Mean(), self.Operators.Mean(), self.Queue.Mean(),
+            self.Served, self.TransferredOut, self.TransferredIn]
+
+    def Streams(self):
+        return [self.Site.ArrivalStream, self.Site.ServiceStream]
+
+def _RunSite(Sites, Index, Targets, Sources, TransferDelay, RunLength, Seeds, Inboxes, Control):
+    '''
+    Runs in the process of site Index: one replication per
+        command received on Control, until None
+    '''
+
+    SimRNG.ZRNG[:] = Seeds
+    site = _Site(Sites[Index], Index, Targets, TransferDelay)
+    Inbox = Inboxes[Index]
+    while Control.recv() is not None:
+        start = time.perf_counter()
+        site.Reset()
+        # Promise of each sending site; nothing arrives before the
+        #   first lookahead
+        promises = {source: TransferDelay for source in Sources}
+        sent = math.nan
+        rounds = nulls = 0
+        while True:
+            bound = min(promises.values(), default=math.inf)
+            limit = min(bound, RunLength)
+            out = {target: [] for target in set(Targets)}
+            while site.NextTime() < limit:
+                for target, message in site.Step():
+                    out[target].append(message)
+            # Every later event of this site is at or after limit
+            promise = math.inf if bound >= RunLength else bound + TransferDelay
+            if promise != sent or any(out.values()):
+                rounds += 1
+                for target, messages in out.items():
+                    nulls += len(messages) == 0
+                    Inboxes[target].put((Index, messages, promise))
+                sent = promise
+            if promise == math.inf and all(p == math.inf for p in promises.values()):
+                break
+            # Wait for at least one message, then take all that came
+            message = Inbox.get()
+            while True:
+                source, messages, p = message
+                for transfer in messages:
+                    heapq.heappush(site.Inbox, transfer)
+                promises[source] = p
+                try:
+                    message = Inbox.get_nowait()
+                except queue.Empty:
+                    break
+        Control.send((site.Row(RunLength), [SimRNG.ZRNG[s - 1] for s in site.Streams()],
+            dict(Rounds=rounds, NullMessages=nulls, Seconds=time.perf_counter() - start)))
+
+class MultiSiteModel:
+    '''
+    Class of objects for simulating a network of call-center
+        sites that overflow calls to each other
+
+    Instance attributes:
+        Sites: list of CallSite objects
+        TransferDelay: float, positive, minutes a transfer takes
+        RunLength: float, length of the day in minutes
+        Columns: list of output column names
+        Protocol: dict of site name to dict of Rounds, NullMessages
+            and Seconds over the replications of the last
+            RunParallel
+
+    Instance methods:
+        Run
+        RunParallel
+    '''
+
+    def __init__(self, Sites, TransferDelay=0.5, RunLength=480):
+        '''
+        Input:
+            Sites: list of CallSite objects with distinct names and
+                SimRNG streams, Targets naming other sites
+            TransferDelay: float, positive
+            RunLength: float, positive
+        '''
+
+        self.Sites = Sites
+        self.TransferDelay = TransferDelay
+        self.RunLength = RunLength
+        names = [site.Name for site in Sites]
+        if TransferDelay <= 0:
+            raise ValueError("TransferDelay is the lookahead and must be positive")
+        if len(set(names)) < len(names):
+            raise ValueError("site names must be distinct")
+        streams = [s for site in Sites for s in (site.ArrivalStream, site.ServiceStream)]
+        if len(set(streams)) < len(streams):
+            raise ValueError("each site needs SimRNG streams of its own")
+        for site in Sites:
+            if any(name not in names or name == site.Name for name in site.Targets):
+                raise ValueError("site %s overflows to an unknown site or to itself" % site.Name)
+        self._Targets = [[names.index(name) for name in site.Targets] for site in Sites]
+        self._Sources = [sorted(set(i for i, targets in enumerate(self._Targets) if j in targets))
+            for j in range(len(Sites))]
+        self.Columns = [site.Name + column for site in Sites for column in ("TISavg", "QueueTimeAvg",
+            "OperatorBusyAvg", "OperatorQueueAvg", "Served", "TransferredOut", "TransferredIn")]
+        self.Protocol = {}
+        self._Processes = None
+
+    def _Results(self, rows, NumReps):
+        rows = np.array(rows, dtype=float).reshape(NumReps, len(self.Columns))
+        return {name: rows[:, j] for j, name in enumerate(self.Columns)}
+
+    def Run(self, NumReps):
+        '''
+        Runs NumReps replications in this process, continuing the
+            SimRNG streams
+
+        Input:
+            NumReps: integer, positive
+
+        Output:
+            dict of output column to NumPy array over replications
+        '''
+
+        if self._Processes is None:
+            self._Processes = [_Site(site, i, self._Targets[i], self.TransferDelay)
+                for i, site in enumerate(self.Sites)]
+        sites = self._Processes
+        rows = []
+        for rep in range(NumReps):
+            for site in sites:
+                site.Reset()
+            while True:
+                # Earliest next event of any site; ties between sites
+                #   may go either way, since a transfer takes time
+                i = min(range(len(sites)), key=lambda i: sites[i].NextTime())
+                if sites[i].NextTime() >= self.RunLength:
+                    break
+                for target, message in sites[i].Step():
+                    heapq.heappush(sites[target].Inbox, message)
+            rows.append([x for site in sites for x in site.Row(self.RunLength)])
+        return self._Results(rows, NumReps)
+
+    def RunParallel(self, NumReps):
+        '''
+        Runs NumReps replications with one process per site,
+            continuing the SimRNG streams; the results are those
+            of Run
+
+        Input:
+            NumReps: integer, positive
+
+        Output:
+            dict of output column to NumPy array over replications
+        '''
+
+        Inboxes = [multiprocessing.Queue() for site in self.Sites]
+        pipes = [multiprocessing.Pipe() for site in self.Sites]
+        workers = [multiprocessing.Process(target=_RunSite, args=(self.Sites, i, self._Targets[i],
+            self._Sources[i], self.TransferDelay, self.RunLength, list(SimRNG.ZRNG), Inboxes, pipes[i][1]))
+            for i in range(len(self.Sites))]
+        for worker in workers:
+            worker.start()
+        self.Protocol = {site.Name: dict(Rounds=0, NullMessages=0, Seconds=0.0) for site in self.Sites}
+        rows = []
+        try:
+            for rep in range(NumReps):
+                for parent, child in pipes:
+                    parent.send(rep)
+                row = []
+                for site, (parent, child) in zip(self.Sites, pipes):
+                    values, seeds, protocol = parent.recv()
+                    row += values
+                    SimRNG.ZRNG[site.ArrivalStream - 1], SimRNG.ZRNG[site.ServiceStream - 1] = seeds
+                    for name, value in protocol.items():
+                        self.Protocol[site.Name][name] += value
+                rows.append(row)
+        finally:
+            for parent, child in pipes:
+                parent.send(None)
+            for worker in workers:
+                worker.join()
+        return self._Results(rows, NumReps)
+
+if __name__ == "__main__":
+    # Four regional sites in a ring, each overflowing to both
+    #   neighbours once 5 calls are on hold; the busy sites shed
+    #   calls to the quiet ones
+    rates = [9.0, 11.0, 7.0, 10.5]
+    names = ["North", "East", "South", "West"]
+    Sites = [CallSite(name, rate, 50, 2, 5.0, 2 * i + 1, 2 * i + 2, OverflowQueue=5,
+            Targets=[names[(i + 1) % 4], names[(i - 1) % 4]])
+        for i, (name, rate) in enumerate(zip(names, rates))]
+    model = MultiSiteModel(Sites, TransferDelay=0.5, RunLength=480)
+
+    Seeds = list(SimRNG.ZRNG)
+    start = time.perf_counter()
+    sequential = model.Run(5)
+    print("Sequential: %.2f s" % (time.perf_counter() - start))
+    After = list(SimRNG.ZRNG)
+    SimRNG.ZRNG[:] = Seeds
+    start = time.perf_counter()
+    parallel = model.RunParallel(5)
+    print("Parallel, %d processes on %d CPUs: %.2f s" % (len(Sites), multiprocessing.cpu_count(),
+        time.perf_counter() - start))
+    for site in Sites:
+        protocol = model.Protocol[site.Name]
+        print("  %-6s %4d rounds, %4d null messages" % (site.Name, protocol["Rounds"],
+            protocol["NullMessages"]))
+    for name in model.Columns:
+        print("%-28s %10.4f %10.4f" % (name, sequential[name].mean(), parallel[name].mean()))
+
+    # The parallel run reproduces the sequential one replication by
+    #   replication, and leaves the SimRNG streams where it did
+    for name in model.Columns:
+        assert np.array_equal(sequential[name], parallel[name]), name
+    assert list(SimRNG.ZRNG) == After
+    print("Identical results: True")
@@ -0,0 +1,265 @@
+###############################################################
+
+# Contains the NpyAppender, ResultSink and ResultReader classes
+#   for streaming per-replication output to disk.
+
+# A ResultSink holds the rows of the current chunk in a
+#   preallocated NumPy buffer and appends each full chunk to
+#   one .npy file per column. The .npy header is rewritten
+#   after every flush, so the files on disk are always valid
+#   and hold every flushed replication even if the run dies.
+
+# A ResultReader memory-maps the column files to compute means
+#   and confidence-interval half-widths without loading the
+#   output into memory, and exports CSV on demand.
+
+###############################################################
+
+import csv
+import json
+import math
+import os
+
+import numpy as np
+
+# Fixed header length so the row count can be rewritten in place;
+#   must be a multiple of 64 as required by the .npy format
+HEADER_LENGTH = 512
+
+class NpyAppender:
+    '''
+    Class of objects for appending records to a 1-D .npy file
+
+    Instance attributes:
+        Path: string, file name
+        DType: NumPy dtype of the records
+        N: integer, number of records written
+
+    Instance methods:
+        Write
+        Close
+    '''
+
+    def __init__(self, Path, DType):
+        '''
+        Creates an empty .npy file for records of DType
+
+        Input:
+            Path: string, file name
+            DType: NumPy dtype, plain or structured
+        '''
+
+        self.Path = Path
+        self.DType = np.dtype(DType)
+        self.N = 0
+        self._File = open(Path, "wb+")
+        self._WriteHeader()
+
+    def _WriteHeader(self):
+        header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (
+            np.lib.format.dtype_to_descr(self.DType), self.N)
+        prefix = b"\x93NUMPY\x01\x00" + (HEADER_LENGTH - 10).to_bytes(2, "little")
+        header = header.ljust(HEADER_LENGTH - 11) + "\n"
+        if len(header) != HEADER_LENGTH - 10:
+            raise ValueError("dtype description too long for .npy header")
+        self._File.seek(0)
+        self._File.write(prefix + header.encode("latin1"))
+
+    def Write(self, Records):
+        '''
+        Appends Records to the end of the file and updates the header
+
+        Input:
+            Records: NumPy array of DType
+        '''
+
+        Records = np.ascontiguousarray(Records, dtype=self.DType)
+        self._File.seek(0, os.SEEK_END)
+        self._File.write(Records.tobytes())
+        self.N += len(Records)
+        self._WriteHeader()
+        self._File.flush()
+
+    def Close(self):
+        '''
+        Closes the file
+        '''
+
+        self._File.close()
+
+class ResultSink:
+    '''
+    Class of objects for streaming per-replication output rows
+        to a directory of column files
+
+    Instance attributes:
+        Directory: string, output directory
+        Columns: list of column names
+        ChunkSize: integer, number of rows buffered between flushes
+        N: integer, number of rows appended
+
+    Instance methods:
+        Append
+        Flush
+        Close
+    '''
+
+    def __init__(self, Directory, Columns, ChunkSize=4096):
+        '''
+        Creates Directory with one empty column file per column
+
+        Input:
+            Directory: string, output directory
+            Columns: list of column names
+            ChunkSize: integer, positive
+        '''
+
+        self.Directory = Directory
+        self.Columns = list(Columns)
+        self.ChunkSize = ChunkSize
+        self.N = 0
+        self._Buffer = np.empty((len(self.Columns), ChunkSize))
+        self._Fill = 0
+        os.makedirs(Directory, exist_ok=True)
+        with open(os.path.join(Directory, "columns.json"), "w") as f:
+            json.dump(self.Columns, f)
+        self._Files = [NpyAppender(os.path.join(Directory, name + ".npy"), np.float64)
+            for name in self.Columns]
+
+    def Append(self, Row):
+        '''
+        Adds one replication to the buffer, flushing it when full
+
+        Input:
+            Row: sequence of floats in Columns order
+        '''
+
+        self._Buffer[:, self._Fill] = Row
+        self._Fill += 1
+        self.N += 1
+        if self._Fill == self.ChunkSize:
+            self.Flush()
+
+    def Flush(self):
+        '''
+        Writes the buffered rows to the column files
+        '''
+
+        if self._Fill > 0:
+            for i, f in enumerate(self._Files):
+                f.Write(self._Buffer[i, :self._Fill])
+            self._Fill = 0
+
+    def Close(self):
+        '''
+        Flushes the buffer and closes the column files
+        '''
+
+        self.Flush()
+        for f in self._Files:
+            f.Close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.Close()
+
+class ResultReader:
+    '''
+    Class of objects for reading a directory written by ResultSink
+
+    Instance attributes:
+        Directory: string, output directory
+        Columns: list of column names
+
+    Instance methods:
+        Column
+        N
+        Means
+        HalfWidths
+        ToCSV
+    '''
+
+    def __init__(self, Directory):
+        '''
+        Opens the output written to Directory
+
+        Input:
+            Directory: string, output directory
+        '''
+
+        self.Directory = Directory
+        with open(os.path.join(Directory, "columns.json")) as f:
+            self.Columns = json.load(f)
+
+    def Column(self, Name):
+        '''
+        Returns one column as a read-only memory-mapped array
+
+        Input:
+            Name: string, column name
+
+        Output:
+            NumPy array
+        '''
+
+        return np.load(os.path.join(self.Directory, Name + ".npy"), mmap_mode="r")
+
+    def N(self):
+        '''
+        Returns the number of replications on disk
+
+        Output:
+            integer, nonnegative
+        '''
+
+        return len(self.Column(self.Columns[0]))
+
+    def Means(self):
+        '''
+        Returns the mean of every column
+
+        Output:
+            dict of column name to float
+        '''
+
+        return {name: float(np.mean(self.Column(name))) for name in self.Columns}
+
+    def HalfWidths(self, z=1.96, ddof=0):
+        '''
+        Returns the normal-theory confidence-interval half-width
+            of the mean of every column
+
+        Input:
+            z: float, standard normal quantile
+            ddof: integer, delta degrees of freedom of the variance
+
+        Output:
+            dict of column name to float
+        '''
+
+        halfwidths = {}
+        for name in self.Columns:
+            x = self.Column(name)
+            halfwidths[name] = z * math.sqrt(float(np.var(x, ddof=ddof)) / len(x))
+        return halfwidths
+
+    def ToCSV(self, Path, ChunkSize=65536):
+        '''
+        Writes the output as a CSV file with a leading replication
+            index column, in the same layout as pandas DataFrame.to_csv
+
+        Input:
+            Path: string, file name
+            ChunkSize: integer, rows converted per pass
+        '''
+
+        columns = [self.Column(name) for name in self.Columns]
+        with open(Path, "w", newline="") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow([""] + self.Columns)
+            for start in range(0, self.N(), ChunkSize):
+                block = [c[start:start + ChunkSize].tolist() for c in columns]
+                for i, row in enumerate(zip(*block)):
+                    writer.writerow([start + i] + list(row))
@@ -0,0 +1,225 @@
+###############################################################
+
+# Contains FIFOWaits, which computes the waiting times of a
+#   c-server FIFO queue without abandonment from arrival and
+#   service times by the Kiefer-Wolfowitz recursion, and
+#   PoolSummary, EndingTime, RunExisting and RunCrossTrained,
+#   which turn those waits into the per-replication outputs of
+#   existing_system_simcode.py and newsystem_simcode.py.
+
+# The Kiefer-Wolfowitz recursion keeps the sorted workload
+#   vector W of the c servers as seen by an arriving call:
+#       wait     = W[0]
+#       W[0]    += service time
+#       W        = sort(max(W - interarrival time, 0))
+#   so no event calendar is needed.
+
+# RunExisting draws service times from the same SimRNG streams
+#   as the scalar engine and only consumes the draws the scalar
+#   engine would, so its replications reproduce the scalar
+#   replications. RunCrossTrained is vectorized over
+#   replications with numpy.random.Generator draws.
+
+###############################################################
+
+import math
+
+import numpy as np
+
+import SimRNG
+from SimArrivals import FixedSchedule
+
+def FIFOWaits(ArrivalTimes, ServiceTimes, NumServers):
+    '''
+    Returns the waiting time in queue of every call
+
+    Input:
+        ArrivalTimes: NumPy array of shape (n,) or (R, n), each row
+            sorted in increasing order
+        ServiceTimes: NumPy array of the same shape
+        NumServers: integer, positive
+
+    Output:
+        NumPy array of waits, same shape as ArrivalTimes
+    '''
+
+    A = np.asarray(ArrivalTimes, dtype=float)
+    S = np.asarray(ServiceTimes, dtype=float)
+    if A.ndim == 1:
+        # One replication: a plain loop is faster than array calls
+        W = [0.0] * NumServers
+        waits = []
+        last = A[0] if len(A) > 0 else 0.0
+        for a, s in zip(A.tolist(), S.tolist()):
+            gap = a - last
+            last = a
+            W = sorted([w - gap if w > gap else 0.0 for w in W])
+            waits.append(W[0])
+            W[0] += s
+        return np.array(waits)
+
+    R, n = A.shape
+    W = np.zeros((R, NumServers))
+    waits = np.empty((R, n))
+    last = A[:, 0] if n > 0 else np.zeros(R)
+    for k in range(n):
+        gap = A[:, k] - last
+        last = A[:, k]
+        W = np.sort(np.maximum(W - gap[:, None], 0.0), axis=1)
+        waits[:, k] = W[:, 0]
+        W[:, 0] += S[:, k]
+    return waits
+
+def EndingTime(Events, RunLength):
+    '''
+    Returns the clock at which the scalar engine stops: the first
+        event time at or after RunLength, or the last event time if
+        every event falls before RunLength
+
+    Input:
+        Events: list of NumPy arrays of event times, each of shape
+            (n,) or (R, n)
+        RunLength: float, positive
+
+    Output:
+        float or NumPy array of shape (R,)
+    '''
+
+    after = [np.where(e >= RunLength, e, math.inf).min(axis=-1) for e in Events]
+    before = [np.where(e < RunLength, e, -math.inf).max(axis=-1) for e in Events]
+    first = np.minimum.reduce(after)
+    return np.where(np.isinf(first), np.maximum.reduce(before), first)
+
+def PoolSummary(ArrivalTimes, Waits, ServiceTimes, RunLength, End, ServiceLevel=5.0):
+    '''
+    Returns the statistics the scalar engine reports for one pool:
+        TIS of calls departing before RunLength, queue time of calls
+        that waited and started service before RunLength, and the
+        time-average number in queue and in service up to End
+
+    Input:
+        ArrivalTimes, Waits, ServiceTimes: NumPy arrays of shape
+            (n,) or (R, n)
+        RunLength: float, positive
+        End: float or NumPy array of shape (R,), from EndingTime
+        ServiceLevel: float, time in system counted as good service
+
+    Output:
+        dict of TISavg, QueueTimeAvg, QueueAvg, BusyAvg and
+            PropWithin5 (the proportion of calls within
+            ServiceLevel), floats or arrays of shape (R,)
+    '''
+
+    End = np.asarray(End)[..., None]
+    start = ArrivalTimes + Waits
+    depart = start + ServiceTimes
+    tis = depart - ArrivalTimes
+
+    def mean(x, keep):
+        n = keep.sum(axis=-1)
+        return np.where(n > 0, np.where(keep, x, 0.0).sum(axis=-1) / np.maximum(n, 1), 0.0)
+
+    departed = depart < RunLength
+    queued = (Waits > 0) & (start < RunLength)
+    span = np.where(End[..., 0] > 0, End[..., 0], 1.0)
+    inqueue = np.minimum(start, End) - np.minimum(ArrivalTimes, End)
+    inservice = np.maximum(np.minimum(depart, End) - np.minimum(start, End), 0.0)
+    return {
+        "TISavg": mean(tis, departed),
+        "QueueTimeAvg": mean(Waits, queued),
+        "QueueAvg": inqueue.sum(axis=-1) / span,
+        "BusyAvg": inservice.sum(axis=-1) / span,
+        "PropWithin5": mean(tis < ServiceLevel, departed),
+    }
+
+def RunExisting(NumReps, NumFinanceOperators=4, NumContactOperators=3,
+                FinMean=5, ContactMean=5, RunLength=480, ServiceLevel=5.0):
+    '''
+    Runs the existing two-line system without an event calendar,
+        drawing service times from SimRNG streams 2 and 3 in the
+        order the scalar engine does
+
+    Input:
+        NumReps: integer, positive
+        NumFinanceOperators, NumContactOperators: integers, positive
+        FinMean, ContactMean: floats, mean service times
+        RunLength: float, positive
+        ServiceLevel: float, positive
+
+    Output:
+        dict of output column (as in current_system_output.csv)
+            to array over replications
+    '''
+
+    lines = [
+        (FixedSchedule(1 / (1 * 0.59), RunLength), NumFinanceOperators, 2, FinMean, 2),
+        (FixedSchedule(1 / (1 * 0.41), RunLength), NumContactOperators, 3, ContactMean, 3),
+    ]
+    out = {name: np.empty(NumReps) for name in [
+        "FinanceTISavg", "FinanceOperatorQueueAvg", "FinanceOperatorBusyAvg",
+        "ContactTISavg", "ContactOperatorQueueAvg", "ContactOperatorBusyAvg",
+        "FinanceQueueTimeAvg", "ContactQueueTimeAvg", "FinancePropWithin5",
+        "ContactPropWithin5", "EndingTime"]}
+    for rep in range(NumReps):
+        results = []
+        events = []
+        for (A, last), c, m, mean, stream in lines:
+            seed = SimRNG.lcgrandgt(stream)
+            S = SimRNG.ErlangBatch(m, mean, len(A), stream)
+            W = FIFOWaits(A, S, c)
+            # Give back the draws of calls the scalar engine never starts
+            started = int((A + W < RunLength).sum())
+            SimRNG.lcgrandst(seed, stream)
+            SimRNG.lcgrandskip(started * m, stream)
+            results.append((A, W, S))
+            events += [A + W + S, np.array([last])]
+        End = EndingTime(events, RunLength)
+        (fin, con) = [PoolSummary(A, W, S, RunLength, End, ServiceLevel) for A, W, S in results]
+        out["FinanceTISavg"][rep] = fin["TISavg"]
+        out["FinanceOperatorQueueAvg"][rep] = fin["QueueAvg"]
+        out["FinanceOperatorBusyAvg"][rep] = fin["BusyAvg"]
+        out["ContactTISavg"][rep] = con["TISavg"]
+        out["ContactOperatorQueueAvg"][rep] = con["QueueAvg"]
+        out["ContactOperatorBusyAvg"][rep] = con["BusyAvg"]
+        out["FinanceQueueTimeAvg"][rep] = fin["QueueTimeAvg"]
+        out["ContactQueueTimeAvg"][rep] = con["QueueTimeAvg"]
+        out["FinancePropWithin5"][rep] = fin["PropWithin5"]
+        out["ContactPropWithin5"][rep] = con["PropWithin5"]
+        out["EndingTime"][rep] = End
+    return out
+
+def RunCrossTrained(NumReps, NumCrossTrained=7, FinMean=5 * 1.1, ContactMean=5 * 1.1,
+                    RunLength=480, Seed=None, ServiceLevel=5 * 1.1):
+    '''
+    Runs the single-pool cross-trained system without an event
+        calendar, vectorized over replications
+
+    Input:
+        NumReps: integer, positive
+        NumCrossTrained: integer, positive
+        FinMean, ContactMean: floats, mean service times
+        RunLength: float, positive
+        Seed: integer, optional seed of the service-time generator
+        ServiceLevel: float, positive
+
+    Output:
+        dict of output column (as in cross_trained_output.csv)
+            to array over replications
+    '''
+
+    rng = np.random.default_rng(Seed)
+    calls, last = FixedSchedule(1 / 1, RunLength)
+    A = np.broadcast_to(calls, (NumReps, len(calls)))
+    finance = rng.random(A.shape) < 0.59
+    S = np.where(finance, rng.gamma(2, FinMean / 2, A.shape), rng.gamma(3, ContactMean / 3, A.shape))
+    W = FIFOWaits(A, S, NumCrossTrained)
+    End = EndingTime([A + W + S, np.full((NumReps, 1), last)], RunLength)
+    pool = PoolSummary(A, W, S, RunLength, End, ServiceLevel)
+    return {
+        "CrossTrainedTISavg": pool["TISavg"],
+        "CrossTrainedOperatorQueueAvg": pool["QueueAvg"],
+        "CrossTrainedOperatorBusyAvg": pool["BusyAvg"],
+        "CrossTrainedQueueTimeAvg": pool["QueueTimeAvg"],
+        "CrossTrainedPropWithin5": pool["PropWithin5"],
+        "EndingTime": End,
+    }
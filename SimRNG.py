@@ -193,6 +193,75 @@ def lcgrandgt(Stream):
 
     return ZRNG[Stream-1]
 
+# Multiplier of one lcgrand step (MULT1 then MULT2) and cached
+#   powers MULT ** k % MODLUS, k = 1, 2, ..., for lcgrandseq
+MULT = MULT1 * MULT2 % MODLUS
+_Powers = None
+
+def lcgrandskip(n, Stream):
+    '''
+    Advances Stream by n draws without generating them.
+
+    Input:
+        n: integer, nonnegative, number of draws to skip
+        Stream: integer, random number stream
+    '''
+
+    ZRNG[Stream-1] = ZRNG[Stream-1] * pow(MULT, n, MODLUS) % MODLUS
+
+def lcgrandseq(zset, n):
+    '''
+    Obtains the n Uniform(0,1) random variates that follow seed
+    zset as a NumPy array, without using or changing any stream.
+    Uses the jump-ahead z * MULT ** k % MODLUS, which is exact
+    in 64-bit integers.
+
+    Input:
+        zset: integer, seed
+        n: integer, nonnegative
+
+    Output:
+        NumPy array of n floats
+        integer, seed after the n draws
+    '''
+
+    import numpy as np
+    global _Powers
+
+    if _Powers is None or len(_Powers) < n:
+        size = 1024 if _Powers is None else len(_Powers)
+        while size < n:
+            size *= 2
+        powers = np.empty(size, dtype=np.int64)
+        powers[0] = MULT
+        filled = 1
+        while filled < size:
+            step = min(filled, size - filled)
+            jump = pow(MULT, filled, MODLUS)
+            powers[filled:filled + step] = powers[:step] * jump % MODLUS
+            filled += step
+        _Powers = powers
+
+    zi = zset * _Powers[:n] % MODLUS
+    zlast = int(zi[-1]) if n > 0 else zset
+    return (zi // 128 | 1) / 16777216.0, zlast
+
+def lcgrandbatch(n, Stream):
+    '''
+    Obtains the next n Uniform(0,1) random variates from Stream
+    as a NumPy array, identical to n successive calls of lcgrand.
+
+    Input:
+        n: integer, nonnegative
+        Stream: integer, random number stream
+
+    Output:
+        NumPy array of n floats
+    '''
+
+    U, ZRNG[Stream-1] = lcgrandseq(ZRNG[Stream-1], n)
+    return U
+
 def Expon(Mean, Stream):
     '''
     Obtains an exponential random variate with given Mean
@@ -269,6 +338,36 @@ def Erlang(m, Mean, Stream):
     erlang = Sum
     return erlang
     
+def ErlangBatch(m, Mean, n, Stream):
+    '''
+    Obtains n Erlang random variates with m phases and given
+    Mean as a NumPy array, using the same Uniform(0,1) draws
+    from Stream, in the same order, as n calls of Erlang.
+
+    Input:
+        m: integer, positive, number of phases
+        Mean: float, positive
+        n: integer, nonnegative
+        Stream: integer, random number stream
+
+    Output:
+        NumPy array of n floats
+    '''
+
+    import numpy as np
+
+    Mean = float(Mean)
+    mean_exponential = Mean / m
+    # math.log rather than np.log so that every variate is
+    #   bit-identical to the one Erlang would return
+    U = lcgrandbatch(n * m, Stream)
+    logs = np.fromiter(map(math.log, (1 - U).tolist()), dtype=float, count=n * m)
+    phases = (-logs * mean_exponential).reshape(n, m)
+    erlang = np.zeros(n)
+    for i in range(0,m,1):
+        erlang = erlang + phases[:, i]
+    return erlang
+
 def Triangular(a, b, c, Stream):
     '''
     Obtains a Triangular random variate with lower
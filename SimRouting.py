@@ -0,0 +1,254 @@
+###############################################################
+
+# Contains the SkillRouter class, which routes calls of several
+#   types to operator pools with different skill sets, using a
+#   FIFOQueue per call type and a Resource per pool.
+
+# Pools are listed best first (e.g. specialists before
+#   cross-trained operators). A pool may have an overflow delay:
+#   it only takes calls that have waited at least that long, so
+#   "specialists first, overflow to cross-trained after T" is a
+#   specialist pool with delay 0 and a cross-trained pool with
+#   delay T.
+
+# Two kinds of heap index replace scans over waiting calls and
+#   pools:
+#   - per pool, a heap of (time the head-of-line call of a type
+#     becomes eligible for the pool, type), so a freed operator
+#     finds the next eligible call in O(log k)
+#   - per call type, a heap of (delay, pool) over pools with an
+#     idle operator, so an arriving or overflowing call finds
+#     the best idle operator in O(log k)
+#   Entries are invalidated lazily: a head-of-line entry carries
+#   the version of its queue head, and an idle entry is checked
+#   against the pool's Resource when it reaches the top.
+
+# A model using delays must call Overflow(k) for each call of
+#   type k that waits, at each delay in OverflowDelays(k) after
+#   it joined the queue; e.g. by scheduling an event. A model
+#   whose staffing changes during the day calls Resize: extra
+#   operators take waiting calls at once, and when a pool
+#   shrinks, operators leave as they finish their calls.
+
+###############################################################
+
+import heapq
+
+import SimClasses
+
+class SkillRouter:
+    '''
+    Class of objects for skill-based routing with delayed overflow
+
+    Instance attributes:
+        Queues: list of FIFOQueue objects, one per call type
+        Operators: list of Resource objects, one per pool, best first
+        Skills: list of lists of call types, one per pool
+        Delays: list of floats, overflow delay of each pool
+
+    Instance methods:
+        Reset
+        OverflowDelays
+        Arrive
+        Enqueue
+        Overflow
+        Release
+        Resize
+    '''
+
+    def __init__(self, Queues, Operators, Skills, Delays=None):
+        '''
+        Input:
+            Queues: list of FIFOQueue objects
+            Operators: list of Resource objects
+            Skills: list of lists of integers, indices into Queues
+            Delays: list of nonnegative floats, optional, default 0
+        '''
+
+        self.Queues = Queues
+        self.Operators = Operators
+        self.Skills = Skills
+        self.Delays = list(Delays) if Delays is not None else [0.0] * len(Operators)
+        # Pools skilled for each call type
+        self._Servers = [[p for p, skills in enumerate(Skills) if k in skills]
+            for k in range(len(Queues))]
+        self._OverflowDelays = [sorted(set(self.Delays[p] for p in servers if self.Delays[p] > 0))
+            for servers in self._Servers]
+        self.Reset()
+
+    def Reset(self):
+        '''
+        Rebuilds the indexes for empty queues and idle pools;
+            call after SimFunctionsInit and Resource.SetUnits
+        '''
+
+        self._Version = [0] * len(self.Queues)
+        self._Heads = [[] for p in self.Operators]
+        self._Idle = [[(self.Delays[p], p) for p in servers] for servers in self._Servers]
+        for heap in self._Idle:
+            heapq.heapify(heap)
+
+    def OverflowDelays(self, k):
+        '''
+        Returns the waits after which a queued call of type k may
+            become eligible for more pools
+
+        Output:
+            list of positive floats, increasing
+        '''
+
+        return self._OverflowDelays[k]
+
+    def _HeadChanged(self, k):
+        self._Version[k] += 1
+        Queue = self.Queues[k].ThisQueue
+        if len(Queue) > 0:
+            head = Queue[0].EntryTime
+            for p in self._Servers[k]:
+                heapq.heappush(self._Heads[p], (head + self.Delays[p], k, self._Version[k]))
+
+    def _IdlePool(self, k, Since):
+        '''
+        Returns the best pool skilled for type k with an idle
+            operator that takes a call waiting since time Since,
+            or None
+        '''
+
+        heap = self._Idle[k]
+        while len(heap) > 0:
+            delay, p = heap[0]
+            Operators = self.Operators[p]
+            if Operators.CurrentNumBusy >= Operators.NumberOfUnits:
+                heapq.heappop(heap)
+                continue
+            if Since + delay > SimClasses.Clock:
+                return None
+            return p
+        return None
+
+    def Arrive(self, Call, k):
+        '''
+        Routes an arriving call of type k: seizes an operator of the
+            best idle pool with no delay, or adds the call to queue k
+
+        Input:
+            Call: Entity object
+            k: integer, call type
+
+        Output:
+            integer, pool that took the call, or None if it waits
+        '''
+
+        p = self._IdlePool(k, SimClasses.Clock)
+        if p is not None:
+            self.Operators[p].Seize(1)
+            return p
+        Call.EntryTime = SimClasses.Clock  # Record the time call enters the queue
+        self.Queues[k].Add(Call)
+        if len(self.Queues[k].ThisQueue) == 1:
+            self._HeadChanged(k)
+        return None
+
+    def Enqueue(self, Call, k):
+        '''
+        Adds a call of type k to the back of queue k, keeping the
+            EntryTime it has, e.g. a call restored from the state
+            of a live system; calls must be added in EntryTime order
+
+        Input:
+            Call: Entity object with EntryTime
+            k: integer, call type
+        '''
+
+        self.Queues[k].Add(Call)
+        if len(self.Queues[k].ThisQueue) == 1:
+            self._HeadChanged(k)
+
+    def Overflow(self, k):
+        '''
+        Routes the head-of-line call of type k to the best idle pool
+            it has become eligible for, if there is one
+
+        Output:
+            (Entity, pool) tuple, or None
+        '''
+
+        Queue = self.Queues[k].ThisQueue
+        if len(Queue) == 0:
+            return None
+        p = self._IdlePool(k, Queue[0].EntryTime)
+        if p is None:
+            return None
+        self.Operators[p].Seize(1)
+        Call = self.Queues[k].Remove()
+        self._HeadChanged(k)
+        return Call, p
+
+    def _NextCall(self, p):
+        '''
+        Removes and returns the longest-eligible waiting call pool p
+            can take, as an (Entity, type) tuple, or None
+        '''
+
+        heap = self._Heads[p]
+        while len(heap) > 0:
+            eligible, k, version = heap[0]
+            if version != self._Version[k]:
+                heapq.heappop(heap)
+                continue
+            if eligible > SimClasses.Clock:
+                break
+            heapq.heappop(heap)
+            Call = self.Queues[k].Remove()
+            self._HeadChanged(k)
+            return Call, k
+        return None
+
+    def _MarkIdle(self, p):
+        for k in self.Skills[p]:
+            heapq.heappush(self._Idle[k], (self.Delays[p], p))
+
+    def Release(self, p):
+        '''
+        Hands an operator of pool p who finished a call the
+            longest-eligible waiting call, or frees the operator;
+            an operator above the pool's current size is freed
+
+        Output:
+            (Entity, type) tuple, or None if the operator is freed
+        '''
+
+        Operators = self.Operators[p]
+        if Operators.CurrentNumBusy <= Operators.NumberOfUnits:
+            routed = self._NextCall(p)
+            if routed is not None:
+                return routed
+        Operators.Free(1)
+        if Operators.CurrentNumBusy == Operators.NumberOfUnits - 1:
+            self._MarkIdle(p)
+        return None
+
+    def Resize(self, p, Units):
+        '''
+        Sets the number of operators of pool p, and gives waiting
+            calls to any operators that become idle
+
+        Input:
+            p: integer, pool
+            Units: integer, nonnegative
+
+        Output:
+            list of (Entity, type) tuples, calls that started service
+        '''
+
+        Operators = self.Operators[p]
+        Operators.SetUnits(Units)
+        started = []
+        while Operators.CurrentNumBusy < Operators.NumberOfUnits:
+            routed = self._NextCall(p)
+            if routed is None:
+                self._MarkIdle(p)
+                break
+            Operators.Seize(1)
+            started.append(routed)
+        return started
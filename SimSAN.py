@@ -0,0 +1,210 @@
+###############################################################
+
+# Contains CompileSAN and the CompiledSAN class, which evaluate
+#   a stochastic activity network (SAN) built from
+#   SimClasses.Node and SimClasses.Activity objects by Monte
+#   Carlo, many realisations at a time.
+
+# A Node lists the Activity objects entering it in Incoming and
+#   those leaving it in Outgoing; an Activity points to the Node
+#   it ends at in Destination. An activity's duration is drawn by
+#   its Distribution attribute, a function of a
+#   numpy.random.Generator and a sample size returning that many
+#   durations (e.g. lambda rng, n: rng.exponential(1.0, n)); an
+#   activity without one takes its CompletionTime every time.
+
+# CompileSAN sorts the network topologically once. Sampling then
+#   draws an (n, activities) array of durations and makes one
+#   vectorized max-plus pass forward (earliest completion of each
+#   node) and one backward (which activities lie on a longest
+#   path), so no Python code runs per realisation.
+
+###############################################################
+
+import numpy as np
+
+class CompiledSAN:
+    '''
+    Class of objects for evaluating a topologically sorted SAN
+
+    Instance attributes:
+        Nodes: list of Node objects in topological order, source first
+        Activities: list of Activity objects in topological order
+        Origins: NumPy array, node index where each activity starts
+        Destinations: NumPy array, node index where each activity ends
+
+    Instance methods:
+        SampleDurations
+        Evaluate
+        Sample
+    '''
+
+    def __init__(self, Nodes, Activities, Origins, Destinations):
+        self.Nodes = Nodes
+        self.Activities = Activities
+        self.Origins = np.asarray(Origins)
+        self.Destinations = np.asarray(Destinations)
+        # Activities entering each node, as column indices
+        self._Incoming = [np.nonzero(self.Destinations == j)[0] for j in range(len(Nodes))]
+
+    def SampleDurations(self, n, rng):
+        '''
+        Returns n realisations of every activity duration
+
+        Input:
+            n: integer, positive
+            rng: numpy.random.Generator
+
+        Output:
+            NumPy array of shape (n, number of activities)
+        '''
+
+        D = np.empty((n, len(self.Activities)))
+        for a, activity in enumerate(self.Activities):
+            Distribution = getattr(activity, "Distribution", None)
+            if Distribution is None:
+                D[:, a] = activity.CompletionTime
+            else:
+                D[:, a] = Distribution(rng, n)
+        return D
+
+    def Evaluate(self, D):
+        '''
+        Returns the completion time of the network and the critical
+            activities of each realisation
+
+        Input:
+            D: NumPy array of durations, shape (n, number of activities)
+
+        Output:
+            T: NumPy array of shape (n,), completion time of the sink
+            Critical: Boolean NumPy array of shape (n, number of
+                activities), activities on a longest path
+        '''
+
+        n = D.shape[0]
+        N = len(self.Nodes)
+        # Forward pass: earliest completion of every node
+        T = np.zeros((n, N))
+        F = np.empty_like(D)
+        for j in range(1, N):
+            incoming = self._Incoming[j]
+            F[:, incoming] = T[:, self.Origins[incoming]] + D[:, incoming]
+            T[:, j] = F[:, incoming].max(axis=1)
+
+        # Backward pass: an activity is critical if it ends at a
+        #   critical node and attains that node's completion time
+        OnPath = np.zeros((n, N), dtype=bool)
+        OnPath[:, N - 1] = True
+        Critical = np.zeros_like(D, dtype=bool)
+        for j in range(N - 1, 0, -1):
+            incoming = self._Incoming[j]
+            Critical[:, incoming] = OnPath[:, [j]] & (F[:, incoming] == T[:, [j]])
+            for a in incoming:
+                OnPath[:, self.Origins[a]] |= Critical[:, a]
+        return T[:, N - 1], Critical
+
+    def Sample(self, n, Seed=None, BatchSize=100000):
+        '''
+        Runs n realisations of the network in batches
+
+        Input:
+            n: integer, positive
+            Seed: integer, optional seed of the duration generator
+            BatchSize: integer, positive, realisations per pass
+
+        Output:
+            dict of CompletionTime (NumPy array of shape (n,)) and
+                Criticality (NumPy array, fraction of realisations in
+                which each activity is critical, in Activities order)
+        '''
+
+        rng = np.random.default_rng(Seed)
+        T = np.empty(n)
+        counts = np.zeros(len(self.Activities))
+        for start in range(0, n, BatchSize):
+            k = min(BatchSize, n - start)
+            T[start:start + k], Critical = self.Evaluate(self.SampleDurations(k, rng))
+            counts += Critical.sum(axis=0)
+        return {"CompletionTime": T, "Criticality": counts / n}
+
+def CompileSAN(Source, Sink):
+    '''
+    Sorts the network reachable from Source topologically
+
+    Input:
+        Source: Node object where the project starts
+        Sink: Node object where the project ends
+
+    Output:
+        CompiledSAN object
+    '''
+
+    # Collect nodes and activities reachable from Source
+    nodes = [Source]
+    seen = {id(Source)}
+    activities = []
+    origin = {}
+    for node in nodes:
+        for activity in node.Outgoing:
+            origin[id(activity)] = node
+            activities.append(activity)
+            if id(activity.Destination) not in seen:
+                seen.add(id(activity.Destination))
+                nodes.append(activity.Destination)
+    if id(Sink) not in seen:
+        raise ValueError("Sink is not reachable from Source")
+
+    # Kahn's algorithm
+    indegree = {id(node): 0 for node in nodes}
+    for activity in activities:
+        indegree[id(activity.Destination)] += 1
+    order = []
+    ready = [Source]
+    while len(ready) > 0:
+        node = ready.pop()
+        order.append(node)
+        for activity in node.Outgoing:
+            indegree[id(activity.Destination)] -= 1
+            if indegree[id(activity.Destination)] == 0:
+                ready.append(activity.Destination)
+    if len(order) != len(nodes):
+        raise ValueError("the network has a cycle")
+    if order[-1] is not Sink:
+        raise ValueError("every node must lead to Sink")
+
+    index = {id(node): j for j, node in enumerate(order)}
+    activities.sort(key=lambda activity: index[id(activity.Destination)])
+    return CompiledSAN(order, activities,
+        [index[id(origin[id(activity)])] for activity in activities],
+        [index[id(activity.Destination)] for activity in activities])
+
+if __name__ == "__main__":
+    import time
+
+    import SimClasses
+
+    # Five-activity SAN with exponential(1) durations: the project
+    #   time is max(X1 + X4, X1 + X3 + X5, X2 + X5)
+    a, b, c, d = [SimClasses.Node() for i in range(4)]
+    X = []
+    for start, end in [(a, b), (a, c), (b, c), (b, d), (c, d)]:
+        activity = SimClasses.Activity()
+        activity.Destination = end
+        activity.Distribution = lambda rng, n: rng.exponential(1.0, n)
+        start.Outgoing.append(activity)
+        end.Incoming.append(activity)
+        X.append(activity)
+
+    san = CompileSAN(a, d)
+    n = 1000000
+    begin = time.perf_counter()
+    result = san.Sample(n, Seed=1)
+    seconds = time.perf_counter() - begin
+    T = result["CompletionTime"]
+    p = (T > 5).mean()
+    print("%d realisations in %.2f seconds" % (n, seconds))
+    print("Mean completion time %.4f, P(T > 5) = %.4f +/- %.4f"
+        % (T.mean(), p, 1.96 * np.sqrt(p * (1 - p) / n)))
+    for k, activity in enumerate(X):
+        print("X%d criticality %.4f" % (k + 1, result["Criticality"][san.Activities.index(activity)]))
@@ -0,0 +1,352 @@
+###############################################################
+
+# Local HTTP service that runs SMP call-center scenarios on
+#   request and streams back confidence intervals as the
+#   replications finish:
+
+#       python -m smp serve --port 8765 --workers 4
+#       curl -N -d '{"system": "crosstrained", "staffing": [8], "reps": 50}' \
+#           http://127.0.0.1:8765/scenario
+
+# A request is POST /scenario with a JSON scenario, the keys of
+#   a [[scenario]] table of smp (name and reps are optional).
+#   The reply is JSON lines, one per batch of replications
+#   finished, each with the replications so far and the Mean
+#   and HalfWidth of every output column over them; the last
+#   line has Done true. GET /health reports the scenarios held.
+#   With Path the service listens on a Unix socket instead.
+
+# Every scenario is one job, keyed by what decides its output
+#   (structure, staffing and rate, not its name). Requests for
+#   a job that is running, or has run, share it: the job runs
+#   until the largest number of replications asked for, and
+#   each request reads the first reps replications, so a repeat
+#   or overlapping query reuses those already computed and
+#   waits only for the rest. A job runs its replications in
+#   batches on a persistent pool of worker processes, each
+#   batch starting from the SimRNG seeds the previous one ended
+#   with, so a job's replications are those of python -m smp
+#   run from the initial seeds, however they were requested.
+#   The batches of one job run in turn; different jobs run in
+#   parallel.
+
+###############################################################
+
+import asyncio
+import json
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import smp
+
+class _Job:
+    # One scenario's replications, shared by every request for it
+    def __init__(self, Spec, Seeds):
+        self.Spec = Spec
+        self.Seeds = Seeds
+        self.Columns = {}
+        self.Target = 0
+        self.Task = None
+        self.Error = None
+        self.Changed = asyncio.Condition()
+
+    def Count(self):
+        return len(next(iter(self.Columns.values()))) if self.Columns else 0
+
+def _Key(spec):
+    return json.dumps([smp._Structure(spec), spec.get("staffing"), spec["rate"]], sort_keys=True)
+
+def _Warm():
+    import SimCallCenter
+
+def _RunBatch(spec, Seeds, NumReps):
+    # Runs in a worker process, which keeps the models it builds
+    import SimRNG
+
+    model = smp.BuildModel(spec)
+    model.ArrivalRate = spec["rate"]
+    SimRNG.ZRNG[:] = Seeds
+    results = model.Run(NumReps)
+    columns = {name: values.tolist() for name, values in results.items() if values.ndim == 1}
+    return columns, list(SimRNG.ZRNG)
+
+def _Progress(job, spec, n, reused):
+    summary = smp.Summarize({name: values[:n] for name, values in job.Columns.items()})
+    return {"Name": spec["name"], "Replications": n, "Reps": spec["reps"], "Reused": reused,
+            "Done": n >= spec["reps"],
+            "Summary": {name: {"Mean": mean, "HalfWidth": hw if math.isfinite(hw) else None}
+                for name, (mean, hw) in summary.items()}}
+
+class ScenarioServer:
+    '''
+    Class of objects for serving scenario requests over local HTTP
+
+    Instance attributes:
+        Host: string, address to listen on
+        Port: integer, port to listen on, 0 for any free port
+        Path: string, Unix socket to listen on instead, or None
+        Workers: integer, worker processes
+        BatchSize: integer, replications per batch
+        MaxJobs: integer, finished jobs kept for reuse
+        Jobs: dict of key to job
+        Pool: ProcessPoolExecutor object, while started
+
+    Instance methods:
+        Start
+        Stop
+        Submit
+    '''
+
+    def __init__(self, Host="127.0.0.1", Port=0, Path=None, Workers=1, BatchSize=10, MaxJobs=256):
+        '''
+        Input:
+            Host: string
+            Port: integer, nonnegative
+            Path: string, optional, Unix socket file name
+            Workers: integer, positive
+            BatchSize: integer, positive
+            MaxJobs: integer, positive
+        '''
+
+        import SimRNG
+
+        self.Host = Host
+        self.Port = Port
+        self.Path = Path
+        self.Workers = Workers
+        self.BatchSize = BatchSize
+        self.MaxJobs = MaxJobs
+        self.Jobs = {}
+        self.Pool = None
+        self._Server = None
+        self._Seeds = SimRNG.InitializeRNSeed()
+
+    async def Start(self):
+        '''
+        Starts the worker pool and listens; with Port 0, Port is
+            set to the port chosen
+        '''
+
+        # Spawned, not forked, so no worker holds a client's socket
+        #   open; started before the first request
+        self.Pool = ProcessPoolExecutor(self.Workers, mp_context=multiprocessing.get_context("spawn"))
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.Pool, _Warm) for i in range(self.Workers)])
+        if self.Path is not None:
+            self._Server = await asyncio.start_unix_server(self._Handle, path=self.Path)
+        else:
+            self._Server = await asyncio.start_server(self._Handle, self.Host, self.Port)
+            self.Port = self._Server.sockets[0].getsockname()[1]
+
+    async def Stop(self):
+        '''
+        Stops listening and shuts the worker pool down
+        '''
+
+        self._Server.close()
+        await self._Server.wait_closed()
+        for job in self.Jobs.values():
+            if job.Task is not None:
+                job.Task.cancel()
+        self.Pool.shutdown(cancel_futures=True)
+
+    async def Submit(self, Table):
+        '''
+        Yields the progress of a scenario as its replications
+            finish
+
+        Input:
+            Table: dict of scenario keys
+
+        Output:
+            async iterator of dicts, the last with Done true, or
+                one with Error
+        '''
+
+        spec = smp.ScenarioSpec(Table)
+        if not isinstance(spec["reps"], int) or spec["reps"] < 1:
+            raise ValueError("reps must be a positive integer")
+        key = _Key(spec)
+        job = self.Jobs.pop(key, None)
+        if job is None:
+            job = _Job(dict(spec, reps=0), self._Seeds)
+            self._Evict()
+        # Most recently asked for last
+        self.Jobs[key] = job
+        reused = min(job.Count(), spec["reps"])
+        job.Target = max(job.Target, spec["reps"])
+        if job.Task is None and job.Count() < job.Target:
+            job.Task = asyncio.create_task(self._Drive(key, job))
+
+        sent = 0
+        while True:
+            async with job.Changed:
+                await job.Changed.wait_for(lambda: job.Error is not None
+                    or min(job.Count(), spec["reps"]) > sent or sent >= spec["reps"])
+            if job.Error is not None:
+                yield {"Name": spec["name"], "Error": job.Error}
+                return
+            sent = min(job.Count(), spec["reps"])
+            yield _Progress(job, spec, sent, reused)
+            if sent >= spec["reps"]:
+                return
+
+    def _Evict(self):
+        idle = [key for key, job in self.Jobs.items() if job.Task is None]
+        for key in idle[:max(0, len(self.Jobs) + 1 - self.MaxJobs)]:
+            del self.Jobs[key]
+
+    async def _Drive(self, key, job):
+        loop = asyncio.get_running_loop()
+        try:
+            while job.Count() < job.Target:
+                n = min(self.BatchSize, job.Target - job.Count())
+                columns, job.Seeds = await loop.run_in_executor(self.Pool, _RunBatch, job.Spec, job.Seeds, n)
+                for name, values in columns.items():
+                    job.Columns.setdefault(name, []).extend(values)
+                async with job.Changed:
+                    job.Changed.notify_all()
+        except Exception as e:
+            # A failed job is not kept, so asking again retries it
+            job.Error = "%s: %s" % (type(e).__name__, e)
+            if self.Jobs.get(key) is job:
+                del self.Jobs[key]
+            async with job.Changed:
+                job.Changed.notify_all()
+        finally:
+            job.Task = None
+
+    async def _Handle(self, reader, writer):
+        try:
+            method, path, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+            if method == "GET" and path == "/health":
+                await self._Reply(writer, 200, {"Jobs": len(self.Jobs),
+                    "Running": sum(job.Task is not None for job in self.Jobs.values()),
+                    "Workers": self.Workers})
+            elif method == "POST" and path == "/scenario":
+                try:
+                    Table = json.loads(body)
+                    progress = self.Submit(Table)
+                    first = await progress.__anext__()
+                except (ValueError, TypeError, AttributeError) as e:
+                    await self._Reply(writer, 400, {"Error": str(e)})
+                    return
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                    b"Connection: close\r\n\r\n")
+                writer.write(json.dumps(first).encode() + b"\n")
+                await writer.drain()
+                async for line in progress:
+                    writer.write(json.dumps(line).encode() + b"\n")
+                    await writer.drain()
+            else:
+                await self._Reply(writer, 404, {"Error": "not found: %s %s" % (method, path)})
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _Reply(self, writer, Status, Object):
+        body = json.dumps(Object).encode()
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found"}[Status]
+        writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n"
+            b"Connection: close\r\n\r\n" % (Status, reason.encode(), len(body)) + body)
+        await writer.drain()
+
+async def Query(Table, Host="127.0.0.1", Port=8765, Path=None):
+    '''
+    Client for a ScenarioServer: yields the progress lines of a
+        scenario request
+
+    Input:
+        Table: dict of scenario keys
+        Host: string
+        Port: integer
+        Path: string, optional, Unix socket of the server
+
+    Output:
+        async iterator of dicts
+    '''
+
+    if Path is not None:
+        reader, writer = await asyncio.open_unix_connection(Path)
+    else:
+        reader, writer = await asyncio.open_connection(Host, Port)
+    body = json.dumps(Table).encode()
+    writer.write(b"POST /scenario HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        b"Content-Length: %d\r\n\r\n" % len(body) + body)
+    await writer.drain()
+    status = (await reader.readline()).split()[1]
+    while (await reader.readline()) not in (b"\r\n", b""):
+        pass
+    try:
+        if status != b"200":
+            raise ValueError(json.loads(await reader.read())["Error"])
+        async for line in reader:
+            yield json.loads(line)
+    finally:
+        writer.close()
+
+async def Serve(Host="127.0.0.1", Port=8765, Path=None, Workers=1, BatchSize=10):
+    '''
+    Runs a ScenarioServer until interrupted
+    '''
+
+    server = ScenarioServer(Host, Port, Path, Workers, BatchSize)
+    await server.Start()
+    print("Serving scenarios on %s" % (Path or "http://%s:%d" % (server.Host, server.Port)), flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.Stop()
+
+if __name__ == "__main__":
+    import time
+
+    async def Demo():
+        server = ScenarioServer(Workers=2, BatchSize=10)
+        await server.Start()
+
+        async def Ask(label, Table):
+            async for line in Query(Table, Port=server.Port):
+                tis = next(value for name, value in line["Summary"].items() if name.endswith("TISavg"))
+                print("%-8s %3d/%d reps (%d reused)  TISavg %.4f +/- %.4f" % (label,
+                    line["Replications"], line["Reps"], line["Reused"], tis["Mean"], tis["HalfWidth"] or 0))
+            return line
+
+        crosstrained = {"system": "crosstrained", "staffing": [8]}
+        # The system's own staffing, run before any model is reused
+        fresh = smp.Summarize(smp.RunScenario(smp.ScenarioSpec({"system": "crosstrained", "reps": 20})))
+        start = time.perf_counter()
+        # Two identical requests and an overlapping one share a job,
+        #   while the existing system runs beside them
+        await asyncio.gather(Ask("A", dict(crosstrained, reps=30)), Ask("B", dict(crosstrained, reps=30)),
+            Ask("C", dict(crosstrained, reps=50)), Ask("D", {"system": "existing", "staffing": [4, 3], "reps": 30}))
+        print("%.2f s" % (time.perf_counter() - start))
+        # A repeat query is answered from the replications held
+        start = time.perf_counter()
+        again = await Ask("repeat", dict(crosstrained, reps=40))
+        print("%.2f s" % (time.perf_counter() - start))
+
+        direct = smp.Summarize({name: values for name, values in smp.RunScenario(smp.ScenarioSpec(
+            dict(crosstrained, reps=40))).items()})
+        print("Same as python -m smp run:", direct["CrossTrainedTISavg"][0]
+            == again["Summary"]["CrossTrainedTISavg"]["Mean"])
+
+        # A request without staffing, on workers whose models the
+        #   staffed requests have used, gets the system's own staffing
+        default = await Ask("default", {"system": "crosstrained", "reps": 20})
+        assert default["Summary"]["CrossTrainedTISavg"]["Mean"] == fresh["CrossTrainedTISavg"][0]
+        print("Default staffing after staffed requests: OK")
+        await server.Stop()
+
+    asyncio.run(Demo())
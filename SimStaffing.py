@@ -0,0 +1,405 @@
+###############################################################
+
+# Contains the StaffingOptimizer class, which searches for the
+#   per-period staffing of one operator pool of a
+#   SimCallCenter.CallCenterModel that needs the fewest
+#   operator-hours while meeting per-period service targets.
+
+# Staffing is either a count per period or, with Shifts, a
+#   number of operators on each shift pattern (a 0/1 list over
+#   the periods), the count in a period being the operators on
+#   every shift that covers it. Targets are kept on the mean
+#   over replications of per-period KPIs from PeriodRow, e.g.
+#   ("CrossTrainedPropWithin5", ">=", 0.8).
+
+# Every candidate is simulated with common random numbers:
+#   replication r of every candidate starts from the same SimRNG
+#   seeds. The search first adds operators to the shifts covering
+#   the earliest period that misses a target until all targets
+#   are met, then removes operators one at a time, keeping the
+#   feasible move that saves the most operator-hours, until no
+#   move is feasible.
+
+# Replications are reused in two ways: evaluations are memoized
+#   by staffing vector, and a candidate that differs from the
+#   current incumbent only from period j on resumes each of the
+#   incumbent's replications from its snapshot at the start of
+#   period j rather than simulating the earlier periods again.
+#   The candidates of one step are independent, so they are
+#   evaluated in parallel by a pool of worker processes, each of
+#   which builds its own model once.
+
+###############################################################
+
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import SimRNG
+from SimCallCenter import ResumeReplication
+
+# Model of the current process, built by _InitWorker
+_Worker = {}
+
+def _InitWorker(Build, BuildArgs):
+    _Worker["Model"] = Build(*BuildArgs)
+
+def _Evaluate(PoolName, Staffing, Seeds, Start, Prefixes):
+    '''
+    Simulates one staffing vector in the current process
+
+    Input:
+        PoolName: string, pool whose staffing is set
+        Staffing: list of integers, one per period
+        Seeds: list, per replication, of SimRNG.ZRNG at its start
+        Start: integer, first period that differs from the prefix
+        Prefixes: list, per replication, of the snapshots of the
+            replication being resumed, or None when Start is 0
+
+    Output:
+        KPIs: dict of PeriodRow name to NumPy array of shape
+            (replications, NPeriods)
+        Snapshots: list, per replication, of the snapshot at each
+            period boundary
+    '''
+
+    model = _Worker["Model"]
+    full = []
+    for pool in model.Pools:
+        full.append(list(Staffing) if pool.Name == PoolName else pool.NumOperators)
+    rows = []
+    Snapshots = []
+    for r, seeds in enumerate(Seeds):
+        SimRNG.ZRNG[:] = seeds
+        if Start == 0:
+            taken = []
+            model.SetStaffing(full)
+            model.RunReplication(taken)
+            periods = model.PeriodRow()
+        else:
+            # Snapshot k - 1 is taken at the start of period k
+            taken = list(Prefixes[r][:Start])
+            row, periods = ResumeReplication(Prefixes[r][Start - 1], full, taken)
+        rows.append(periods)
+        Snapshots.append(taken)
+    KPIs = {name: np.array([periods[name] for periods in rows]) for name in rows[0]}
+    return KPIs, Snapshots
+
+class StaffingOptimizer:
+    '''
+    Class of objects for optimizing the per-period staffing of
+        one operator pool by simulation
+
+    Instance attributes:
+        Build: function returning a CallCenterModel with NPeriods;
+            must be picklable (e.g. defined at module level) when
+            Workers is more than 1
+        BuildArgs: tuple, arguments of Build
+        PoolName: string, name of the pool to staff
+        Targets: list of (KPI, sense, target) tuples; KPI is a
+            PeriodRow name, sense is ">=" or "<=", and target a
+            float or a list with one float (or None for no target)
+            per period
+        NumReps: integer, replications per candidate
+        Shifts: NumPy array of shape (NPeriods, shifts), column j
+            the periods covered by shift j
+        Workers: integer, processes evaluating candidates
+        NPeriods: integer
+        PeriodLength: float
+        Evaluations: dict of staffing vector (tuple) to dict of
+            PeriodRow name to mean over replications per period
+        Simulated: integer, periods simulated by all replications,
+            a measure of the work done
+
+    Instance methods:
+        Staffing
+        Cost
+        Violation
+        Evaluate
+        Optimize
+    '''
+
+    def __init__(self, Build, PoolName, Targets, NumReps=20, Shifts=None, Workers=1,
+                 BuildArgs=()):
+        '''
+        Builds the model once to read its periods, and takes the
+            starting seeds of the replications from the current
+            SimRNG streams, which it moves on as Run would
+
+        Input:
+            Build: function, see above
+            PoolName: string
+            Targets: list of (string, string, float or list) tuples
+            NumReps: integer, positive
+            Shifts: list of lists of 0/1, one per shift pattern,
+                optional; default one pattern per period
+            Workers: integer, positive
+            BuildArgs: tuple
+        '''
+
+        self.Build = Build
+        self.BuildArgs = tuple(BuildArgs)
+        self.PoolName = PoolName
+        self.NumReps = NumReps
+        self.Workers = Workers
+
+        model = Build(*self.BuildArgs)
+        if model.NPeriods is None:
+            raise ValueError("the model must be built with NPeriods")
+        if PoolName not in [pool.Name for pool in model.Pools]:
+            raise ValueError("the model has no pool %s" % PoolName)
+        self.NPeriods = model.NPeriods
+        self.PeriodLength = model.PeriodLength
+        self._Model = model
+
+        if Shifts is None:
+            self.Shifts = np.eye(self.NPeriods, dtype=int)
+        else:
+            self.Shifts = np.array(Shifts, dtype=int).T
+            if self.Shifts.shape[0] != self.NPeriods:
+                raise ValueError("every shift needs one entry per period")
+            if (self.Shifts.sum(axis=1) == 0).any():
+                raise ValueError("every period must be covered by a shift")
+
+        self.Targets = []
+        for KPI, Sense, Target in Targets:
+            if Sense not in (">=", "<="):
+                raise ValueError("sense must be '>=' or '<='")
+            if not isinstance(Target, (list, tuple)):
+                Target = [Target] * self.NPeriods
+            Target = np.array([math.nan if t is None else t for t in Target], dtype=float)
+            self.Targets.append((KPI, Sense, Target))
+
+        # Replication r of every candidate starts from Seeds[r]
+        self._Seeds = []
+        for r in range(NumReps):
+            self._Seeds.append(list(SimRNG.ZRNG))
+            # Move every stream on by one replication's worth of draws
+            model.RunReplication()
+        self.Evaluations = {}
+        self.Simulated = 0
+        self._Snapshots = {}
+
+    def Staffing(self, Counts):
+        '''
+        Returns the staffing per period of operators on each shift
+
+        Input:
+            Counts: list of integers, one per shift
+
+        Output:
+            tuple of integers, one per period
+        '''
+
+        return tuple(int(n) for n in self.Shifts @ np.asarray(Counts, dtype=int))
+
+    def Cost(self, Counts):
+        '''
+        Returns the operator-hours of operators on each shift
+
+        Output:
+            float
+        '''
+
+        return sum(self.Staffing(Counts)) * self.PeriodLength / 60
+
+    def Violation(self, Staffing):
+        '''
+        Returns how far an evaluated staffing vector misses its
+            targets: the sum over targets and periods of the
+            shortfall relative to the target; 0.0 when feasible
+
+        Input:
+            Staffing: tuple of integers, a key of Evaluations
+
+        Output:
+            float, nonnegative
+        '''
+
+        means = self.Evaluations[Staffing]
+        total = 0.0
+        for KPI, Sense, Target in self.Targets:
+            gap = Target - means[KPI] if Sense == ">=" else means[KPI] - Target
+            gap = np.where(np.isnan(Target), 0.0, gap / np.maximum(np.abs(np.nan_to_num(Target)), 1e-9))
+            total += float(np.maximum(gap, 0.0).sum())
+        return total
+
+    def _FirstViolated(self, Staffing):
+        means = self.Evaluations[Staffing]
+        for t in range(self.NPeriods):
+            for KPI, Sense, Target in self.Targets:
+                if math.isnan(Target[t]):
+                    continue
+                if (Sense == ">=" and means[KPI][t] < Target[t]) or (
+                        Sense == "<=" and means[KPI][t] > Target[t]):
+                    return t
+        return None
+
+    def Evaluate(self, Candidates, Incumbent=None, Executor=None):
+        '''
+        Simulates every staffing vector not yet evaluated, resuming
+            from the snapshots of Incumbent where the vectors agree
+
+        Input:
+            Candidates: list of tuples of integers, one per period
+            Incumbent: tuple of integers, optional, an evaluated
+                vector whose snapshots were kept
+            Executor: concurrent.futures executor, optional; None
+                evaluates in this process
+        '''
+
+        tasks = []
+        for Staffing in Candidates:
+            if Staffing in self.Evaluations or Staffing in [task[0] for task in tasks]:
+                continue
+            Start, Prefixes = 0, None
+            if Incumbent is not None and Incumbent in self._Snapshots:
+                Start = next(t for t in range(self.NPeriods + 1)
+                    if t == self.NPeriods or Staffing[t] != Incumbent[t])
+                if Start > 0:
+                    Prefixes = self._Snapshots[Incumbent]
+            tasks.append((Staffing, Start, Prefixes))
+
+        args = [(self.PoolName, Staffing, self._Seeds, Start, Prefixes)
+            for Staffing, Start, Prefixes in tasks]
+        if Executor is None:
+            results = [_Evaluate(*arg) for arg in args]
+        else:
+            results = list(Executor.map(_Evaluate, *zip(*args))) if len(args) > 0 else []
+        for (Staffing, Start, Prefixes), (KPIs, Snapshots) in zip(tasks, results):
+            self.Evaluations[Staffing] = {name: values.mean(axis=0) for name, values in KPIs.items()}
+            self._Snapshots[Staffing] = Snapshots
+            self.Simulated += self.NumReps * (self.NPeriods - Start)
+
+    def _Keep(self, Incumbent):
+        # Only the incumbent's snapshots are resumed from
+        self._Snapshots = {Incumbent: self._Snapshots[Incumbent]}
+
+    def _Start(self):
+        '''
+        Returns shift counts covering a staffing of the offered
+            load plus one in every period
+        '''
+
+        model = self._Model
+        p = [pool.Name for pool in model.Pools].index(self.PoolName)
+        pool = model.Pools[p]
+        rates = model.ArrivalRates or [model.ArrivalRate] * self.NPeriods
+        work = sum(line.Share * line.Mean * pool.Inflation for line in model.Lines
+            if line.Name in pool.Skills)
+        need = [math.ceil(rate * work) + 1 for rate in rates]
+        Counts = np.zeros(self.Shifts.shape[1], dtype=int)
+        for t in range(self.NPeriods):
+            short = need[t] - int(self.Shifts[t] @ Counts)
+            if short > 0:
+                # The covering shift that starts last reaches furthest ahead
+                j = max(np.nonzero(self.Shifts[t])[0], key=lambda j: np.argmax(self.Shifts[:, j]))
+                Counts[j] += short
+        return Counts
+
+    def Optimize(self, Start=None, MaxSteps=200):
+        '''
+        Searches for the cheapest feasible shift counts
+
+        Input:
+            Start: list of integers, one per shift, optional
+            MaxSteps: integer, positive, limit on search steps
+
+        Output:
+            dict of Counts (list of integers per shift), Staffing
+                (tuple per period), Cost (operator-hours),
+                Feasible (boolean) and KPIs (dict of PeriodRow
+                name to mean per period)
+        '''
+
+        Counts = self._Start() if Start is None else np.array(Start, dtype=int)
+        Executor = ProcessPoolExecutor(self.Workers, initializer=_InitWorker,
+            initargs=(self.Build, self.BuildArgs)) if self.Workers > 1 else None
+        if Executor is None:
+            _InitWorker(self.Build, self.BuildArgs)
+        try:
+            Incumbent = self.Staffing(Counts)
+            self.Evaluate([Incumbent], Executor=Executor)
+            self._Keep(Incumbent)
+
+            # Repair: add operators covering the earliest missed period
+            steps = 0
+            while self._FirstViolated(Incumbent) is not None and steps < MaxSteps:
+                t = self._FirstViolated(Incumbent)
+                moves = []
+                for j in np.nonzero(self.Shifts[t])[0]:
+                    move = Counts.copy()
+                    move[j] += 1
+                    moves.append(move)
+                self.Evaluate([self.Staffing(move) for move in moves], Incumbent, Executor)
+                Counts = min(moves, key=lambda move: (self.Violation(self.Staffing(move)),
+                    self.Cost(move)))
+                Incumbent = self.Staffing(Counts)
+                self._Keep(Incumbent)
+                steps += 1
+
+            # Descent: remove the operator whose removal saves the most
+            while self._FirstViolated(Incumbent) is None and steps < MaxSteps:
+                moves = []
+                for j in np.nonzero(Counts)[0]:
+                    move = Counts.copy()
+                    move[j] -= 1
+                    moves.append(move)
+                self.Evaluate([self.Staffing(move) for move in moves], Incumbent, Executor)
+                feasible = [move for move in moves if self._FirstViolated(self.Staffing(move)) is None]
+                if len(feasible) == 0:
+                    break
+                Counts = min(feasible, key=self.Cost)
+                Incumbent = self.Staffing(Counts)
+                self._Keep(Incumbent)
+                steps += 1
+        finally:
+            if Executor is not None:
+                Executor.shutdown()
+
+        return {"Counts": [int(n) for n in Counts], "Staffing": Incumbent,
+                "Cost": self.Cost(Counts), "Feasible": self._FirstViolated(Incumbent) is None,
+                "KPIs": self.Evaluations[Incumbent]}
+
+def HourlyCrossTrained(Rates, NumCrossTrained=7, Inflation=1.1, FinMean=5, ContactMean=5):
+    '''
+    Returns the cross-trained SMP configuration with Poisson
+        arrivals at an hourly rate profile, for the demo below
+
+    Input:
+        Rates: list of floats, total calls per minute in each hour
+
+    Output:
+        CallCenterModel object
+    '''
+
+    from SimCallCenter import CallCenterModel, ProductLine, OperatorPool
+    return CallCenterModel(
+        [ProductLine("Finance", 0.59, 2, FinMean, 2),
+         ProductLine("Contact", 0.41, 3, ContactMean, 2)],
+        [OperatorPool("CrossTrained", NumCrossTrained, ["Finance", "Contact"], Inflation)],
+        RunLength=60 * len(Rates), Arrivals="mixed", ServiceLevel=5 * Inflation,
+        NPeriods=len(Rates), PeriodLength=60, ArrivalRates=Rates)
+
+if __name__ == "__main__":
+    import os
+    import time
+
+    # Busy mid-morning and late afternoon, quiet at lunch
+    Rates = [0.6, 0.9, 1.3, 1.1, 0.7, 1.0, 1.2, 0.8]
+    # Four-hour shifts starting on each of the first five hours
+    Shifts = [[1 if s <= t < s + 4 else 0 for t in range(8)] for s in range(5)]
+    Targets = [("CrossTrainedQueueTimeAvg", "<=", 0.5)]
+    for shifts, name in [(None, "hourly"), (Shifts, "4-hour shifts")]:
+        optimizer = StaffingOptimizer(HourlyCrossTrained, "CrossTrained", Targets, NumReps=20,
+            Shifts=shifts, Workers=min(4, os.cpu_count() or 1), BuildArgs=(Rates,))
+        start = time.perf_counter()
+        best = optimizer.Optimize()
+        print("%s: staffing %s, %.0f operator-hours, feasible %s (%.2f seconds)"
+            % (name, list(best["Staffing"]), best["Cost"], best["Feasible"],
+               time.perf_counter() - start))
+        print("  mean queue time by hour", np.round(best["KPIs"]["CrossTrainedQueueTimeAvg"], 3))
+        print("  %d candidates, %d of %d replication-periods simulated"
+            % (len(optimizer.Evaluations), optimizer.Simulated,
+               len(optimizer.Evaluations) * optimizer.NumReps * optimizer.NPeriods))
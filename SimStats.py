@@ -0,0 +1,477 @@
+###############################################################
+
+# Contains PeriodCTStat and PeriodDTStat, variants of
+#   SimClasses.CTStat and SimClasses.DTStat that also keep
+#   their statistics per period of length PeriodLength, so one
+#   replication yields a value per hour (or other window) as
+#   well as the whole-day value.
+
+# Both are subclasses, so they are cleared by
+#   SimFunctions.SimFunctionsInit and ClearStats like any other
+#   statistic, and their whole-day Mean is unchanged. Times at or
+#   after NPeriods * PeriodLength (e.g. calls finishing after
+#   closing) count towards the last period. SimCheckpoint saves
+#   and restores the per-period values through State and
+#   SetState, which a statistic with state beyond that of its
+#   SimClasses base class provides.
+
+# Also contains QuantileSketch, a mergeable streaming quantile
+#   estimator for nonnegative observations. The sketch counts observations in
+#   logarithmic bins of relative width 2 * RelativeAccuracy, so
+#   every quantile is returned within that relative error, its
+#   memory depends on the range of the values and not on how
+#   many are recorded, and sketches from different replications
+#   or processes merge exactly by adding counts.
+
+# Also contains UntrackedFIFOQueue and UntrackedResource, drop-in
+#   replacements for SimClasses.FIFOQueue and SimClasses.Resource
+#   that keep no statistics, for models that do not report queue
+#   lengths or busy operators: no CTStat is created or registered,
+#   and Add, Remove, Seize and Free change the state only, without
+#   a CTStat.Record on each call.
+
+###############################################################
+
+import math
+
+import numpy as np
+
+import SimClasses
+
+class PeriodCTStat(SimClasses.CTStat):
+    '''
+    Class of objects for continuous-time statistics per period
+
+    Instance attributes (in addition to those of CTStat):
+        NPeriods: integer, number of periods
+        PeriodLength: float, length of each period
+        Areas: list of floats, time-weighted area in each period
+
+    Instance methods (in addition to those of CTStat):
+        Means
+        State
+        SetState
+    '''
+
+    def __init__(self, NPeriods, PeriodLength):
+        '''
+        Input:
+            NPeriods: integer, positive
+            PeriodLength: float, positive
+        '''
+
+        self.NPeriods = NPeriods
+        self.PeriodLength = PeriodLength
+        self.Areas = [0.0] * NPeriods
+        super().__init__()
+
+    def _AddArea(self, Areas, Start, End, X):
+        '''
+        Adds X times the length of [Start, End) to Areas, split at
+            period boundaries
+        '''
+
+        if X == 0.0 or End <= Start:
+            return
+        k = min(int(Start // self.PeriodLength), self.NPeriods - 1)
+        while k < self.NPeriods - 1 and End > (k + 1) * self.PeriodLength:
+            boundary = (k + 1) * self.PeriodLength
+            Areas[k] += X * (boundary - Start)
+            Start = boundary
+            k += 1
+        Areas[k] += X * (End - Start)
+
+    def Record(self, X):
+        '''
+        Updates the whole-day and per-period areas, then the state
+            as in CTStat.Record
+
+        Input:
+            X: float, new value of variable monitored for CTStat instance
+        '''
+
+        self._AddArea(self.Areas, self.Tlast, SimClasses.Clock, self.Xlast)
+        super().Record(X)
+
+    def Means(self):
+        '''
+        Returns the time-average in each period up through the
+            current time but does not update any values; 0.0 for
+            periods not yet reached
+
+        Output:
+            NumPy array of NPeriods floats
+        '''
+
+        Areas = list(self.Areas)
+        self._AddArea(Areas, self.Tlast, SimClasses.Clock, self.Xlast)
+        starts = np.arange(self.NPeriods) * self.PeriodLength
+        ends = np.append(starts[1:], max(SimClasses.Clock, starts[-1]))
+        lengths = np.minimum(ends, SimClasses.Clock) - np.maximum(starts, self.TClear)
+        return np.where(lengths > 0.0, np.array(Areas) / np.where(lengths > 0.0, lengths, 1.0), 0.0)
+
+    def State(self):
+        '''
+        Returns the per-period state, for SimCheckpoint
+
+        Output:
+            list of floats, a copy of Areas
+        '''
+
+        return list(self.Areas)
+
+    def SetState(self, State):
+        '''
+        Restores the per-period state returned by State
+
+        Input:
+            State: list of NPeriods floats
+        '''
+
+        self.Areas = list(State)
+
+    def Clear(self):
+        '''
+        Resets the whole-day and per-period areas
+        '''
+
+        super().Clear()
+        self.Areas = [0.0] * self.NPeriods
+
+class PeriodDTStat(SimClasses.DTStat):
+    '''
+    Class of objects for discrete-time statistics per period
+
+    Instance attributes (in addition to those of DTStat):
+        NPeriods: integer, number of periods
+        PeriodLength: float, length of each period
+        Sums: list of floats, sum of observations in each period
+        SumsOfSquares: list of floats
+        Counts: list of integers, observations in each period
+
+    Instance methods (in addition to those of DTStat):
+        Means
+        StdDevs
+        Ns
+        State
+        SetState
+    '''
+
+    def __init__(self, NPeriods, PeriodLength):
+        '''
+        Input:
+            NPeriods: integer, positive
+            PeriodLength: float, positive
+        '''
+
+        self.NPeriods = NPeriods
+        self.PeriodLength = PeriodLength
+        super().__init__()
+        self.Clear()
+
+    def Record(self, X, Time=None):
+        '''
+        Updates the whole-day statistics as in DTStat.Record and
+            those of the period containing Time
+
+        Input:
+            X: float, newest observation value
+            Time: float, optional, time that decides the period,
+                e.g. a call's arrival time; default SimClasses.Clock
+        '''
+
+        super().Record(X)
+        if Time is None:
+            Time = SimClasses.Clock
+        k = min(int(Time // self.PeriodLength), self.NPeriods - 1)
+        self.Sums[k] += X
+        self.SumsOfSquares[k] += X * X
+        self.Counts[k] += 1
+
+    def Means(self):
+        '''
+        Returns the sample mean in each period; 0.0 for periods
+            without observations
+
+        Output:
+            NumPy array of NPeriods floats
+        '''
+
+        n = np.array(self.Counts, dtype=float)
+        return np.where(n > 0, np.array(self.Sums) / np.maximum(n, 1), 0.0)
+
+    def StdDevs(self):
+        '''
+        Returns the sample standard deviation in each period; 0.0
+            for periods with fewer than two observations
+
+        Output:
+            NumPy array of NPeriods floats
+        '''
+
+        n = np.array(self.Counts, dtype=float)
+        s = np.array(self.Sums)
+        var = (np.array(self.SumsOfSquares) - s * s / np.maximum(n, 1)) / np.maximum(n - 1, 1)
+        return np.where(n > 1, np.sqrt(np.maximum(var, 0.0)), 0.0)
+
+    def Ns(self):
+        '''
+        Returns the number of observations in each period
+
+        Output:
+            NumPy array of NPeriods integers
+        '''
+
+        return np.array(self.Counts)
+
+    def State(self):
+        '''
+        Returns the per-period state, for SimCheckpoint
+
+        Output:
+            tuple of copies of Sums, SumsOfSquares and Counts
+        '''
+
+        return list(self.Sums), list(self.SumsOfSquares), list(self.Counts)
+
+    def SetState(self, State):
+        '''
+        Restores the per-period state returned by State
+
+        Input:
+            State: tuple of three lists of NPeriods numbers
+        '''
+
+        Sums, SumsOfSquares, Counts = State
+        self.Sums = list(Sums)
+        self.SumsOfSquares = list(SumsOfSquares)
+        self.Counts = list(Counts)
+
+    def Clear(self):
+        '''
+        Resets the whole-day and per-period statistics
+        '''
+
+        super().Clear()
+        self.Sums = [0.0] * self.NPeriods
+        self.SumsOfSquares = [0.0] * self.NPeriods
+        self.Counts = [0] * self.NPeriods
+
+class QuantileSketch:
+    '''
+    Class of objects for mergeable streaming quantile estimates of
+        nonnegative observations
+
+    Instance attributes:
+        RelativeAccuracy: float, relative error bound of quantiles
+        Bins: dict of bin index to count
+        ZeroCount: integer, observations too small for any bin
+        Count: integer, total observations
+
+    Instance methods:
+        Add
+        Merge
+        Quantile
+        Quantiles
+        Clear
+    '''
+
+    # Observations below this count as zero (e.g. no wait)
+    MinValue = 1e-9
+
+    def __init__(self, RelativeAccuracy=0.01):
+        '''
+        Input:
+            RelativeAccuracy: float, in (0, 1)
+        '''
+
+        self.RelativeAccuracy = RelativeAccuracy
+        self._Gamma = (1 + RelativeAccuracy) / (1 - RelativeAccuracy)
+        self._LogGamma = math.log(self._Gamma)
+        self.Clear()
+
+    def Add(self, X):
+        '''
+        Counts one observation
+
+        Input:
+            X: float, nonnegative
+        '''
+
+        self.Count += 1
+        if X < self.MinValue:
+            self.ZeroCount += 1
+        else:
+            i = math.ceil(math.log(X) / self._LogGamma)
+            self.Bins[i] = self.Bins.get(i, 0) + 1
+
+    def Merge(self, Other):
+        '''
+        Adds the observations counted by Other
+
+        Input:
+            Other: QuantileSketch with the same RelativeAccuracy
+        '''
+
+        if Other.RelativeAccuracy != self.RelativeAccuracy:
+            raise ValueError("sketches must have the same RelativeAccuracy")
+        self.Count += Other.Count
+        self.ZeroCount += Other.ZeroCount
+        for i, n in Other.Bins.items():
+            self.Bins[i] = self.Bins.get(i, 0) + n
+
+    def Quantiles(self, Qs):
+        '''
+        Returns estimates of several quantiles
+
+        Input:
+            Qs: list of floats in [0, 1]
+
+        Output:
+            list of floats; NaN when nothing has been counted
+        '''
+
+        if self.Count == 0:
+            return [math.nan] * len(Qs)
+        order = sorted(range(len(Qs)), key=lambda j: Qs[j])
+        out = [0.0] * len(Qs)
+        j = 0
+        seen = self.ZeroCount
+        # Zero-valued observations come first
+        while j < len(order) and Qs[order[j]] * (self.Count - 1) < seen:
+            j += 1
+        for i in sorted(self.Bins):
+            seen += self.Bins[i]
+            while j < len(order) and Qs[order[j]] * (self.Count - 1) < seen:
+                # Midpoint of the bin (gamma^(i-1), gamma^i]
+                out[order[j]] = 2 * self._Gamma ** i / (self._Gamma + 1)
+                j += 1
+        return out
+
+    def Quantile(self, Q):
+        '''
+        Returns an estimate of one quantile
+
+        Input:
+            Q: float in [0, 1]
+
+        Output:
+            float; NaN when nothing has been counted
+        '''
+
+        return self.Quantiles([Q])[0]
+
+    def Clear(self):
+        '''
+        Forgets every observation
+        '''
+
+        self.Bins = {}
+        self.ZeroCount = 0
+        self.Count = 0
+
+class UntrackedFIFOQueue(SimClasses.FIFOQueue):
+    '''
+    Class of objects for FIFO queues without a WIP statistic;
+        WIP is None and Mean always returns 0.0
+    '''
+
+    def __init__(self):
+        '''
+        Initializes an empty queue and adds it to
+            FIFOQueue.InstanceList, without a WIP CTStat
+        '''
+
+        self.WIP = None
+        self.ThisQueue = []
+        SimClasses.FIFOQueue.InstanceList.append(self)
+
+    def Add(self, X):
+        '''
+        Adds an entity to the end of the queue
+
+        Input:
+            X: Entity object
+        '''
+
+        self.ThisQueue.append(X)
+
+    def Remove(self):
+        '''
+        Removes and returns the first entity from the queue
+
+        Output:
+            remove: Entity object
+        '''
+
+        if len(self.ThisQueue) > 0:
+            return self.ThisQueue.pop(0)
+
+    def Mean(self):
+        '''
+        Returns 0.0, as no queue statistic is kept
+
+        Output:
+            float
+        '''
+
+        return 0.0
+
+class UntrackedResource(SimClasses.Resource):
+    '''
+    Class of objects for resources without a busy-units statistic;
+        NumBusyStat is None and Mean always returns 0.0
+    '''
+
+    def __init__(self):
+        '''
+        Initializes a resource with no units and adds it to
+            Resource.InstanceList, without a NumBusyStat CTStat
+        '''
+
+        self.CurrentNumBusy = 0
+        self.NumberOfUnits = 0
+        self.NumBusyStat = None
+        SimClasses.Resource.InstanceList.append(self)
+
+    def Seize(self, Units):
+        '''
+        Seizes Units if that many are available, as in Resource.Seize
+
+        Input:
+            Units: integer, nonnegative
+
+        Output:
+            seize: Boolean
+        '''
+
+        if self.NumberOfUnits - self.CurrentNumBusy >= Units:
+            self.CurrentNumBusy += Units
+            return True
+        return False
+
+    def Free(self, Units):
+        '''
+        Frees Units if that many are busy, as in Resource.Free
+
+        Input:
+            Units: integer, nonnegative
+
+        Output:
+            free: Boolean
+        '''
+
+        if self.CurrentNumBusy >= Units:
+            self.CurrentNumBusy -= Units
+            return True
+        return False
+
+    def Mean(self):
+        '''
+        Returns 0.0, as no busy-units statistic is kept
+
+        Output:
+            float
+        '''
+
+        return 0.0
@@ -0,0 +1,185 @@
+###############################################################
+
+# Contains the TraceRecorder class, which logs every completed
+#   call as a fixed-width record in a .npy file, and functions
+#   for analysing a trace after the run.
+
+# Each record holds the replication, call id, call type,
+#   arrival time, service start time, departure time, and the
+#   pool and id of the operator that served the call. Operator
+#   ids are numbered within each pool, so an operator is
+#   identified by the (Pool, Operator) pair.
+
+# Tracing is switched on by giving SimCallCenter.CallCenterModel
+#   a recorder as its Trace: the model creates its calls with
+#   NewCall, assigns their operators itself and passes each
+#   completed call to Record, so a model that is not traced runs
+#   its handlers unchanged.
+
+###############################################################
+
+import numpy as np
+
+import SimClasses
+from SimOutput import NpyAppender
+
+TRACE_DTYPE = np.dtype([
+    ("Replication", "<i4"),
+    ("CallId", "<i8"),
+    ("CallType", "<i2"),
+    ("Arrival", "<f8"),
+    ("ServiceStart", "<f8"),
+    ("Departure", "<f8"),
+    ("Pool", "<i2"),
+    ("Operator", "<i4"),
+])
+
+class TraceRecorder:
+    '''
+    Class of objects for recording a per-call trace
+
+    Instance attributes:
+        Path: string, .npy file name
+        ChunkSize: integer, number of records buffered between writes
+        Replication: integer, current replication number
+        N: integer, number of records written or buffered
+
+    Instance methods:
+        NewReplication
+        NewCall
+        Record
+        Flush
+        Close
+    '''
+
+    def __init__(self, Path, ChunkSize=65536):
+        '''
+        Creates an empty trace file
+
+        Input:
+            Path: string, .npy file name
+            ChunkSize: integer, positive
+        '''
+
+        self.Path = Path
+        self.ChunkSize = ChunkSize
+        self.Replication = -1
+        self.N = 0
+        self._File = NpyAppender(Path, TRACE_DTYPE)
+        self._Buffer = np.empty(ChunkSize, dtype=TRACE_DTYPE)
+        self._Fill = 0
+        self._NextCallId = 0
+
+    def NewReplication(self):
+        '''
+        Starts the next replication: numbers calls from 0 again
+        '''
+
+        self.Replication += 1
+        self._NextCallId = 0
+
+    def NewCall(self):
+        '''
+        Returns a new Entity carrying a CallId
+        Use in place of SimClasses.Entity when creating calls
+
+        Output:
+            Entity object
+        '''
+
+        Call = SimClasses.Entity()
+        Call.CallId = self._NextCallId
+        self._NextCallId += 1
+        return Call
+
+    def Record(self, CallId, CallType, Arrival, ServiceStart, Departure, Pool, Operator):
+        '''
+        Adds one call to the buffer, writing the buffer when full
+
+        Input:
+            CallId: integer
+            CallType: integer
+            Arrival: float
+            ServiceStart: float
+            Departure: float
+            Pool: integer, index of the operator's pool
+            Operator: integer, operator id within the pool
+        '''
+
+        self._Buffer[self._Fill] = (self.Replication, CallId, CallType,
+            Arrival, ServiceStart, Departure, Pool, Operator)
+        self._Fill += 1
+        self.N += 1
+        if self._Fill == self.ChunkSize:
+            self.Flush()
+
+    def Flush(self):
+        '''
+        Writes the buffered records to the trace file
+        '''
+
+        if self._Fill > 0:
+            self._File.Write(self._Buffer[:self._Fill])
+            self._Fill = 0
+
+    def Close(self):
+        '''
+        Flushes the buffer and closes the trace file
+        '''
+
+        self.Flush()
+        self._File.Close()
+
+def LoadTrace(Path):
+    '''
+    Returns a trace as a read-only memory-mapped structured array
+
+    Input:
+        Path: string, .npy file name
+
+    Output:
+        NumPy structured array of TRACE_DTYPE
+    '''
+
+    return np.load(Path, mmap_mode="r")
+
+def WaitsByPeriod(trace, PeriodLength, NPeriods, CallType=None):
+    '''
+    Returns the queue times of traced calls grouped by the
+        period in which the call arrived
+
+    Input:
+        trace: structured array, from LoadTrace
+        PeriodLength: float, positive
+        NPeriods: integer, positive
+        CallType: integer, optional, keep only calls of this type
+
+    Output:
+        list of NPeriods NumPy arrays
+    '''
+
+    if CallType is not None:
+        trace = trace[trace["CallType"] == CallType]
+    waits = trace["ServiceStart"] - trace["Arrival"]
+    period = np.minimum((trace["Arrival"] // PeriodLength).astype(int), NPeriods - 1)
+    order = np.argsort(period, kind="stable")
+    bounds = np.searchsorted(period[order], np.arange(NPeriods + 1))
+    return [waits[order[bounds[k]:bounds[k + 1]]] for k in range(NPeriods)]
+
+def WaitHistogramByPeriod(trace, PeriodLength, NPeriods, Bins, CallType=None):
+    '''
+    Returns counts of traced queue times per arrival period and bin
+
+    Input:
+        trace: structured array, from LoadTrace
+        PeriodLength: float, positive
+        NPeriods: integer, positive
+        Bins: increasing sequence of bin edges
+        CallType: integer, optional, keep only calls of this type
+
+    Output:
+        NumPy array of shape (NPeriods, len(Bins) - 1)
+    '''
+
+    return np.array([np.histogram(w, bins=Bins)[0]
+        for w in WaitsByPeriod(trace, PeriodLength, NPeriods, CallType)])
@@ -1,14 +1,11 @@
 #PythonSim and Python package imports
 import pandas as pd
 import numpy as np
-import math
-import SimClasses
-import SimFunctions
 import SimRNG
+import SimCallCenter
 
 # Initialize simulation
 ZRNG = SimRNG.InitializeRNSeed()
-Calendar = SimClasses.EventCalendar()
 
 # Call service center is open from 8am-4pm (8 hours)
 # 60 minutes in an hour ("period")
@@ -29,79 +26,9 @@ NumContactOperators = 3
 # Number of simulation replications
 NumReps = 10
 
-# Statistics trackers
-FinanceTIS = SimClasses.DTStat()
-FinanceWithin5 = SimClasses.DTStat()
-ContactTIS = SimClasses.DTStat()
-ContactWithin5 = SimClasses.DTStat()
-FinanceOperator = SimClasses.Resource()
-FinanceOperatorQueue = SimClasses.FIFOQueue()
-ContactOperator = SimClasses.Resource()
-ContactOperatorQueue = SimClasses.FIFOQueue()
-
-# Statistics lists for output
-FinanceTISavg = []
-FinancePropWithin5 = []
-ContactTISavg = []
-ContactPropWithin5 = []
-FinanceOperatorBusyAvg = []
-FinanceOperatorQueueAvg = []
-ContactOperatorBusyAvg = []
-ContactOperatorQueueAvg = []
-EndingTime = []
-
-def Finance_Arrival():
-    '''Handles arrival of financial tracking calls to the financial operators.'''
-    InterarrivalTime = 1 / (1 * 0.59)  # 59% of calls are financial
-    if SimClasses.Clock + InterarrivalTime > RunLength:
-        return
-    SimFunctions.Schedule(Calendar, "Finance_Arrival", InterarrivalTime)
-
-    Call = SimClasses.Entity()
-    if FinanceOperator.CurrentNumBusy < FinanceOperator.NumberOfUnits:
-        FinanceOperator.Seize(1)
-        SimFunctions.SchedulePlus(Calendar, "FinanceEndOfService", SimRNG.Erlang(2, FinMean, 2), Call)
-    else:
-        FinanceOperatorQueue.Add(Call)
-
-def Contact_Arrival():
-    '''Handles arrival of contact management calls to the contact operators.'''
-    # InterarrivalTime = 1 / 1 * 0.41  # 41% of calls are contact management
-    cInterarrivalTime = 1 / (1 * 0.41)  # 41% of calls are contact management
-    if SimClasses.Clock + cInterarrivalTime > RunLength:
-        return
-    SimFunctions.Schedule(Calendar, "Contact_Arrival", cInterarrivalTime)
-
-    Call = SimClasses.Entity()
-    if ContactOperator.CurrentNumBusy < ContactOperator.NumberOfUnits:
-        ContactOperator.Seize(1)
-        SimFunctions.SchedulePlus(Calendar, "ContactEndOfService", SimRNG.Erlang(3, ContactMean, 3), Call)
-    else:
-        ContactOperatorQueue.Add(Call)
-
-def FinanceEndOfService(DepartingCall):
-    '''Called when a financial call finishes service.'''
-    TIS = SimClasses.Clock - DepartingCall.CreateTime
-    FinanceTIS.Record(TIS)
-    FinanceWithin5.Record((TIS < 5))
-
-    if FinanceOperatorQueue.NumQueue() > 0 and FinanceOperator.NumberOfUnits >= FinanceOperator.CurrentNumBusy:
-        NextCall = FinanceOperatorQueue.Remove()
-        SimFunctions.SchedulePlus(Calendar, "FinanceEndOfService", SimRNG.Erlang(2, FinMean, 2), NextCall)
-    else:
-        FinanceOperator.Free(1)
-
-def ContactEndOfService(DepartingCall):
-    '''Called when a contact management call finishes service.'''
-    TIS = SimClasses.Clock - DepartingCall.CreateTime
-    ContactTIS.Record(TIS)
-    ContactWithin5.Record((TIS < 5))
-
-    if ContactOperatorQueue.NumQueue() > 0 and ContactOperator.NumberOfUnits >= ContactOperator.CurrentNumBusy:
-        NextCall = ContactOperatorQueue.Remove()
-        SimFunctions.SchedulePlus(Calendar, "ContactEndOfService", SimRNG.Erlang(3, ContactMean, 3), NextCall)
-    else:
-        ContactOperator.Free(1)
+# Existing configuration: one specialist pool per service line
+Model = SimCallCenter.ExistingSystem(NumFinanceOperators, NumContactOperators,
+    FinMean, ContactMean, RunLength)
 
 # Define initial settings and desired relative error
 target_relative_error = 0.05
@@ -115,56 +42,18 @@ current_reps = initial_reps
 relative_errors_met = False
 
 while not relative_errors_met and current_reps <= max_reps:
-    FinanceTISavg = []
-    FinancePropWithin5 = []
-    ContactTISavg = []
-    ContactPropWithin5 = []
-    FinanceOperatorQueueAvg = []
-    ContactOperatorQueueAvg = []
-
     # Run simulation for current number of replications
-    for reps in range(current_reps):
-        # Initialize simulation settings
-        SimFunctions.SimFunctionsInit(Calendar)
-        FinanceOperator.SetUnits(NumFinanceOperators)
-        ContactOperator.SetUnits(NumContactOperators)
-        SimFunctions.Schedule(Calendar, "Finance_Arrival", 1 / (1 * 0.59))
-        SimFunctions.Schedule(Calendar, "Contact_Arrival", 1 / (1* 0.41))
-
-        # Main simulation loop
-        while Calendar.N() > 0:
-            NextEvent = Calendar.Remove()
-            SimClasses.Clock = NextEvent.EventTime
-
-            if SimClasses.Clock >= RunLength:
-                break
-
-            if NextEvent.EventType == "Finance_Arrival":
-                Finance_Arrival()
-            elif NextEvent.EventType == "Contact_Arrival":
-                Contact_Arrival()
-            elif NextEvent.EventType == "FinanceEndOfService":
-                FinanceEndOfService(NextEvent.WhichObject)
-            elif NextEvent.EventType == "ContactEndOfService":
-                ContactEndOfService(NextEvent.WhichObject)
-
-        # Store statistics for this replication
-        FinanceTISavg.append(FinanceTIS.Mean())
-        FinancePropWithin5.append(FinanceWithin5.Mean())
-        ContactTISavg.append(ContactTIS.Mean())
-        ContactPropWithin5.append(ContactWithin5.Mean())
-        FinanceOperatorQueueAvg.append(FinanceOperatorQueue.Mean())
-        ContactOperatorQueueAvg.append(ContactOperatorQueue.Mean())
+    Results = Model.Run(current_reps)
 
     # Convert to DataFrame for easier analysis
-    results = pd.DataFrame({
-        "FinanceTISavg": FinanceTISavg,
-        "FinancePropWithin5": FinancePropWithin5,
-        "ContactTISavg": ContactTISavg,
-        "ContactPropWithin5": ContactPropWithin5,
-        "FinanceOperatorQueueAvg": FinanceOperatorQueueAvg,
-        "ContactOperatorQueueAvg": ContactOperatorQueueAvg,
-    })
+    results = pd.DataFrame({name: Results[name] for name in [
+        "FinanceTISavg",
+        "FinancePropWithin5",
+        "ContactTISavg",
+        "ContactPropWithin5",
+        "FinanceOperatorQueueAvg",
+        "ContactOperatorQueueAvg",
+    ]})
     
     all_results.append(results)
 
@@ -1,14 +1,11 @@
 #PythonSim and Python package imports
 import pandas as pd
 import numpy as np
-import math
-import SimClasses
-import SimFunctions
 import SimRNG
+import SimCallCenter
 
 # Initialize simulation
 ZRNG = SimRNG.InitializeRNSeed()
-Calendar = SimClasses.EventCalendar()
 
 # Call service center is open from 8am-4pm (8 hours)
 # 60 minutes in an hour ("period")
@@ -17,65 +14,13 @@ NPeriods = 8
 PeriodLength = 60
 ARate = 1
 
-# Mean and variance parameters for
-# normal distribution for service time
-# for both financial tracking and contact management
-FinMean = 5 * 1.1  # Increased by 10% for cross-trained operators
-ContactMean = 5 * 1.1  # Increased by 10% for cross-trained operators
 RunLength = 480  # Total average customers calling to the support center
 
 # Specify the initial estimate of cross-trained operators needed
 NumCrossTrained = 8  # Initial guess, can adjust based on results
 
-# Simulation statistics trackers for the unified (cross-trained) system
-CrossTrainedTIS = SimClasses.DTStat()
-CrossTrainedWithin5 = SimClasses.DTStat()
-CrossTrainedOperator = SimClasses.Resource()
-CrossTrainedOperatorQueue = SimClasses.FIFOQueue()
-
-# Statistics lists
-CrossTrainedTISavg = []
-CrossTrainedPropWithin5 = []
-CrossTrainedOperatorBusyAvg = []
-CrossTrainedOperatorQueueAvg = []
-EndingTime = []
-
-def CrossTrained_Arrival():
-    '''Handles arrival of both financial and contact management calls to a cross-trained operator.'''
-    InterarrivalTime = 1 / 1  # 60 calls per hour
-    if SimClasses.Clock + InterarrivalTime > RunLength:
-        return
-    SimFunctions.Schedule(Calendar, "CrossTrained_Arrival", InterarrivalTime)
-
-    # Determine call type based on historical probabilities
-    if np.random.rand() < 0.59:  # Financial call
-        ServiceTime = SimRNG.Erlang(2, FinMean, 2)
-    else:  # Contact management call
-        ServiceTime = SimRNG.Erlang(3, ContactMean, 2)
-
-    Call = SimClasses.Entity()
-    if CrossTrainedOperator.CurrentNumBusy < CrossTrainedOperator.NumberOfUnits:
-        CrossTrainedOperator.Seize(1)
-        SimFunctions.SchedulePlus(Calendar, "CrossTrainedEndOfService", ServiceTime, Call)
-    else:
-        CrossTrainedOperatorQueue.Add(Call)
-
-def CrossTrainedEndOfService(DepartingCall):
-    '''Called when a call finishes service in the cross-trained system.'''
-    TIS = SimClasses.Clock - DepartingCall.CreateTime
-    CrossTrainedTIS.Record(TIS)
-    CrossTrainedWithin5.Record((TIS < 5.5))  # Adjusted to account for 10% longer time
-
-    if CrossTrainedOperatorQueue.NumQueue() > 0 and CrossTrainedOperator.NumberOfUnits >= CrossTrainedOperator.CurrentNumBusy:
-        NextCall = CrossTrainedOperatorQueue.Remove()
-        if np.random.rand() < 0.59:
-            ServiceTime = SimRNG.Erlang(2, FinMean, 2)
-        else:
-            ServiceTime = SimRNG.Erlang(3, ContactMean, 2)
-        SimFunctions.SchedulePlus(Calendar, "CrossTrainedEndOfService", ServiceTime, NextCall)
-    else:
-        CrossTrainedOperator.Free(1)
-
+# Cross-trained configuration: one pool serving both lines
+Model = SimCallCenter.CrossTrainedSystem(NumCrossTrained, 1.1, RunLength=RunLength)
 
 # Set initial parameters
 relative_error_threshold = 0.05  # 5% relative error
@@ -97,26 +42,11 @@ def calculate_relative_error(data):
 # Main loop to add replications until relative error is within the threshold
 for reps in range(max_reps):
     # Run single replication
-    SimFunctions.SimFunctionsInit(Calendar)
-    CrossTrainedOperator.SetUnits(NumCrossTrained)
-    SimFunctions.Schedule(Calendar, "CrossTrained_Arrival", 1 / 1)
-
-    # Main simulation loop
-    while Calendar.N() > 0:
-        NextEvent = Calendar.Remove()
-        SimClasses.Clock = NextEvent.EventTime
-
-        if SimClasses.Clock >= RunLength:
-                break
-
-        if NextEvent.EventType == "CrossTrained_Arrival":
-            CrossTrained_Arrival()
-        elif NextEvent.EventType == "CrossTrainedEndOfService":
-            CrossTrainedEndOfService(NextEvent.WhichObject)
+    Row = dict(zip(Model.Columns, Model.RunReplication()))
 
     # Store replication statistics
-    CrossTrainedTISavg.append(CrossTrainedTIS.Mean())
-    CrossTrainedPropWithin5.append(CrossTrainedWithin5.Mean())
+    CrossTrainedTISavg.append(Row["CrossTrainedTISavg"])
+    CrossTrainedPropWithin5.append(Row["CrossTrainedPropWithin5"])
 
     # Check relative error every 10 replications
     if (reps + 1) % 10 == 0:
@@ -1,14 +1,19 @@
 #PythonSim and Python package imports
-import pandas as pd
-import numpy as np
-import math
 import SimClasses
 import SimFunctions
 import SimRNG
+import SimCache
+import SimOutput
+import SimTrace
+import SimLockstep
+import SimQueueKernel
+import SimArrivals
+import SimStats
+import SimRouting
+import SimCallCenter
 
 # Initialize simulation
 ZRNG = SimRNG.InitializeRNSeed()
-Calendar = SimClasses.EventCalendar()
 
 # Call service center is open from 8am-4pm (8 hours)
 # 60 minutes in an hour ("period")
@@ -22,6 +27,21 @@ FinMean = 5
 ContactMean = 5
 RunLength = 480  # Total time for the call center to run in minutes
 
+# Optional arrival rates in calls per hour, one per period (e.g.
+# [ARate] * NPeriods), for non-stationary Poisson arrivals generated
+# by SimArrivals; None keeps the fixed interarrival times
+ArrivalRates = None
+
+# Draws of each arrival stream reserved per period: the streams of
+# the two lines are spaced for NumReps days of NPeriods periods
+PeriodSpacing = 256
+
+# "calendar" schedules each arrival as an event; "trace" generates
+# each replication's arrival times up front and merges them with the
+# event calendar through an ArrivalCursor, so only end-of-service
+# events go on the calendar
+ArrivalSource = "calendar"
+
 # Specify staffing for each service line
 NumFinanceOperators = 4
 NumContactOperators = 3
@@ -29,148 +49,101 @@ NumContactOperators = 3
 # Number of simulation replications
 NumReps = 480
 
-# Statistics trackers
-FinanceTIS = SimClasses.DTStat()
-FinanceWithin5 = SimClasses.DTStat()
-ContactTIS = SimClasses.DTStat()
-ContactWithin5 = SimClasses.DTStat()
-FinanceOperator = SimClasses.Resource()
-FinanceOperatorQueue = SimClasses.FIFOQueue()
-ContactOperator = SimClasses.Resource()
-ContactOperatorQueue = SimClasses.FIFOQueue()
-FinanceQueueTime = SimClasses.DTStat()
-ContactQueueTime = SimClasses.DTStat()
-
-# Statistics lists for output
-FinanceTISavg = []
-FinancePropWithin5 = []
-ContactTISavg = []
-ContactPropWithin5 = []
-FinanceOperatorBusyAvg = []
-FinanceOperatorQueueAvg = []
-ContactOperatorBusyAvg = []
-ContactOperatorQueueAvg = []
-FinanceQueueTimeAvg = []
-ContactQueueTimeAvg = []
-EndingTime = []
-
-# Modify the Finance_Arrival function to record entry time in the queue
-def Finance_Arrival():
-    '''Handles arrival of financial tracking calls to the financial operators.'''
-    InterarrivalTime = 1 / (1 * 0.59)  # 59% of calls are financial
-    if SimClasses.Clock + InterarrivalTime > RunLength:
-        return
-    SimFunctions.Schedule(Calendar, "Finance_Arrival", InterarrivalTime)
-
-    Call = SimClasses.Entity()
-    if FinanceOperator.CurrentNumBusy < FinanceOperator.NumberOfUnits:
-        FinanceOperator.Seize(1)
-        SimFunctions.SchedulePlus(Calendar, "FinanceEndOfService", SimRNG.Erlang(2, FinMean, 2), Call)
-    else:
-        Call.EntryTime = SimClasses.Clock  # Record the time call enters the queue
-        FinanceOperatorQueue.Add(Call)
-
-# Modify the FinanceEndOfService function to record time spent in queue
-def FinanceEndOfService(DepartingCall):
-    '''Called when a financial call finishes service.'''
-    TIS = SimClasses.Clock - DepartingCall.CreateTime
-    FinanceTIS.Record(TIS)
-    FinanceWithin5.Record((TIS < 5))
-
-    if FinanceOperatorQueue.NumQueue() > 0 and FinanceOperator.NumberOfUnits >= FinanceOperator.CurrentNumBusy:
-        NextCall = FinanceOperatorQueue.Remove()
-        QueueTime = SimClasses.Clock - NextCall.EntryTime  # Calculate queue time
-        FinanceQueueTime.Record(QueueTime)  # Record time spent in queue
-        SimFunctions.SchedulePlus(Calendar, "FinanceEndOfService", SimRNG.Erlang(2, FinMean, 2), NextCall)
-    else:
-        FinanceOperator.Free(1)
-
-# Modify the Contact_Arrival function to record entry time in the queue
-def Contact_Arrival():
-    '''Handles arrival of contact management calls to the contact operators.'''
-    cInterarrivalTime = 1 / (1 * 0.41)  # 41% of calls are contact management
-    if SimClasses.Clock + cInterarrivalTime > RunLength:
-        return
-    SimFunctions.Schedule(Calendar, "Contact_Arrival", cInterarrivalTime)
-
-    Call = SimClasses.Entity()
-    if ContactOperator.CurrentNumBusy < ContactOperator.NumberOfUnits:
-        ContactOperator.Seize(1)
-        SimFunctions.SchedulePlus(Calendar, "ContactEndOfService", SimRNG.Erlang(3, ContactMean, 3), Call)
-    else:
-        Call.EntryTime = SimClasses.Clock  # Record the time call enters the queue
-        ContactOperatorQueue.Add(Call)
-
-# Modify the ContactEndOfService function to record time spent in queue
-def ContactEndOfService(DepartingCall):
-    '''Called when a contact management call finishes service.'''
-    TIS = SimClasses.Clock - DepartingCall.CreateTime
-    ContactTIS.Record(TIS)
-    ContactWithin5.Record((TIS < 5))
-
-    if ContactOperatorQueue.NumQueue() > 0 and ContactOperator.NumberOfUnits >= ContactOperator.CurrentNumBusy:
-        NextCall = ContactOperatorQueue.Remove()
-        QueueTime = SimClasses.Clock - NextCall.EntryTime  # Calculate queue time
-        ContactQueueTime.Record(QueueTime)  # Record time spent in queue
-        SimFunctions.SchedulePlus(Calendar, "ContactEndOfService", SimRNG.Erlang(3, ContactMean, 3), NextCall)
-    else:
-        ContactOperator.Free(1)
- 
-# Run simulation for each replication
-for reps in range(0,NumReps):
-    # Initialize
-    SimFunctions.SimFunctionsInit(Calendar)
-    FinanceOperator.SetUnits(NumFinanceOperators)
-    ContactOperator.SetUnits(NumContactOperators)
-    SimFunctions.Schedule(Calendar, "Finance_Arrival", 1 / (1 * 0.59))
-    SimFunctions.Schedule(Calendar, "Contact_Arrival", 1 / (1 * 0.41))
-
-    # Main simulation loop
-    while Calendar.N() > 0:
-        NextEvent = Calendar.Remove()
-        SimClasses.Clock = NextEvent.EventTime
-
-        if SimClasses.Clock >= RunLength:
-                break
-
-        if NextEvent.EventType == "Finance_Arrival":
-            Finance_Arrival()
-        elif NextEvent.EventType == "Contact_Arrival":
-            Contact_Arrival()
-        elif NextEvent.EventType == "FinanceEndOfService":
-            FinanceEndOfService(NextEvent.WhichObject)
-        elif NextEvent.EventType == "ContactEndOfService":
-            ContactEndOfService(NextEvent.WhichObject)
-
-    # Store statistics for this replication
-    FinanceTISavg.append(FinanceTIS.Mean())
-    FinanceOperatorQueueAvg.append(FinanceOperatorQueue.Mean())
-    # FinancePropWithin5.append(FinanceWithin5.Mean())
-    ContactTISavg.append(ContactTIS.Mean())
-    ContactOperatorQueueAvg.append(ContactOperatorQueue.Mean())
-    # ContactPropWithin5.append(ContactWithin5.Mean())
-    FinanceOperatorBusyAvg.append(FinanceOperator.Mean())
-    ContactOperatorBusyAvg.append(ContactOperator.Mean())
-    EndingTime.append(SimClasses.Clock)
-    FinanceQueueTimeAvg.append(FinanceQueueTime.Mean())
-    ContactQueueTimeAvg.append(ContactQueueTime.Mean())
+# "scalar" runs the event-calendar model (SimCallCenter);
+# "lockstep" advances all replications together in NumPy arrays
+# (SimLockstep), which matches the scalar results in distribution but not draw for draw;
+# "kw" computes FIFO waits by the Kiefer-Wolfowitz recursion
+# (SimQueueKernel), reproducing the scalar replications
+Engine = "scalar"
+
+# Seed of the numpy.random.Generator that draws service times for
+# the lockstep and kw engines, the first SimRNG stream seed, so that
+# reruns repeat
+Seed = ZRNG[0]
+
+# Quantiles of time in system and queue time added as columns,
+# e.g. [0.90, 0.95] adds FinanceTISp90, ..., ContactQueueTimep95
+Quantiles = []
+
+# Replication results are cached on disk, keyed on the model code,
+# the parameters and the SimRNG stream seeds
+UseCache = True
+CacheDir = ".simcache"
+CacheMaxBytes = 256 * 1024 * 1024
+
+# Optional per-call trace file; None runs the model untraced
+TracePath = None
+Trace = None if TracePath is None else SimTrace.TraceRecorder(TracePath)
+
+# Existing configuration: one specialist pool per service line, with
+# Poisson arrivals from stream 4 on when ArrivalRates is set
+Options = {"Quantiles": Quantiles, "ArrivalSource": ArrivalSource, "Trace": Trace}
+if ArrivalRates is not None:
+    Options.update(NPeriods=NPeriods, PeriodLength=PeriodLength,
+        ArrivalRates=[r / 60 for r in ArrivalRates], PeriodSpacing=PeriodSpacing, ArrivalReps=NumReps)
+Model = SimCallCenter.ExistingSystem(NumFinanceOperators, NumContactOperators,
+    FinMean, ContactMean, RunLength, **Options)
+Streams = Model.Streams
+
+# Output columns, one row per replication
+Columns = [name for name in Model.Columns if not name.endswith("PropWithin5")]
+
+def RunReplication():
+    '''Runs one replication and returns its output row in Columns order.'''
+    Row = dict(zip(Model.Columns, Model.RunReplication()))
+    return [Row[name] for name in Columns]
+
+# Run simulation for each replication, streaming rows to column files
+Sink = SimOutput.ResultSink("current_system_output", Columns)
+if Engine != "scalar" and (ArrivalRates is not None or ArrivalSource != "calendar" or Quantiles):
+    raise ValueError("ArrivalRates, ArrivalSource and Quantiles require the scalar engine")
+if Engine == "lockstep":
+    Results = SimLockstep.RunExisting(NumReps, NumFinanceOperators, NumContactOperators,
+        FinMean, ContactMean, RunLength, Seed, Model.ServiceLevel)
+    for Row in zip(*[Results[name] for name in Columns]):
+        Sink.Append(Row)
+elif Engine == "kw":
+    Results = SimQueueKernel.RunExisting(NumReps, NumFinanceOperators, NumContactOperators,
+        FinMean, ContactMean, RunLength, Model.ServiceLevel)
+    for Row in zip(*[Results[name] for name in Columns]):
+        Sink.Append(Row)
+elif UseCache and Trace is None:
+    # Reuse cached replications
+    Parameters = {
+        "NPeriods": NPeriods,
+        "PeriodLength": PeriodLength,
+        "ARate": ARate,
+        "FinMean": FinMean,
+        "ContactMean": ContactMean,
+        "RunLength": RunLength,
+        "ArrivalRates": ArrivalRates,
+        "PeriodSpacing": PeriodSpacing,
+        "ArrivalSource": ArrivalSource,
+        "Quantiles": Quantiles,
+        "NumFinanceOperators": NumFinanceOperators,
+        "NumContactOperators": NumContactOperators,
+    }
+    Cache = SimCache.ReplicationCache(CacheDir, CacheMaxBytes)
+    Code = [SimClasses, SimFunctions, SimRNG, SimArrivals, SimStats, SimRouting, SimCallCenter,
+        RunReplication]
+    Key = Cache.Key(Code, Parameters, Streams)
+    for Row in SimCache.RunCached(Cache, Key, NumReps, Columns, Streams, Parameters, RunReplication):
+        Sink.Append(Row)
+else:
+    for reps in range(NumReps):
+        Sink.Append(RunReplication())
+Sink.Close()
+if Trace is not None:
+    Trace.Close()
 
 # Output results to a CSV
-output = pd.DataFrame({
-    "FinanceTISavg": FinanceTISavg,
-    "FinanceOperatorQueueAvg": FinanceOperatorQueueAvg,
-    "FinanceOperatorBusyAvg": FinanceOperatorBusyAvg,
-    "ContactTISavg": ContactTISavg,
-    "ContactOperatorQueueAvg": ContactOperatorQueueAvg,
-    "ContactOperatorBusyAvg": ContactOperatorBusyAvg,
-    # "FinancePropWithin5": FinancePropWithin5,
-    # "ContactPropWithin5": ContactPropWithin5,
-    "FinanceQueueTimeAvg": FinanceQueueTimeAvg,
-    "ContactQueueTimeAvg": ContactQueueTimeAvg,
-    "EndingTime": EndingTime
-})
-output.to_csv("current_system_output.csv", sep=",")
+output = SimOutput.ResultReader("current_system_output")
+output.ToCSV("current_system_output.csv")
+Means = output.Means()
+HalfWidths = output.HalfWidths()
 print("Means")
-print(output.mean())
+for name in Columns:
+    print(f"{name:<28}{Means[name]:>12.6f}")
 print("95% CI Half-Width")
-print(1.96 * np.sqrt(output.var(ddof=0) / len(output)))
\ No newline at end of file
+for name in Columns:
+    print(f"{name:<28}{HalfWidths[name]:>12.6f}")
@@ -1,14 +1,12 @@
 #PythonSim and Python package imports
-import pandas as pd
-import numpy as np
-import math
-import SimClasses
-import SimFunctions
 import SimRNG
+import SimOutput
+import SimLockstep
+import SimQueueKernel
+import SimCallCenter
 
 # Initialize simulation
 ZRNG = SimRNG.InitializeRNSeed()
-Calendar = SimClasses.EventCalendar()
 
 # Call service center is open from 8am-4pm (8 hours)
 # 60 minutes in an hour ("period")
@@ -20,115 +18,73 @@ ARate = 1
 # Mean and variance parameters for
 # normal distribution for service time
 # for both financial tracking and contact management
-FinMean = 5 * 1.1  # Increased by 10% for cross-trained operators
-ContactMean = 5 * 1.1  # Increased by 10% for cross-trained operators
+FinMean = 5
+ContactMean = 5
+Inflation = 1.1  # Cross-trained operators take 10% longer per call
 RunLength = 480  # Total average customers calling to the support center
 
+# "calendar" schedules each arrival as an event; "trace" generates
+# each replication's arrival times up front and takes arrivals from
+# an ArrivalCursor, so only end-of-service events go on the calendar
+ArrivalSource = "calendar"
+
 # Specify the initial estimate of cross-trained operators needed
 NumCrossTrained = 7  # Initial guess, can adjust based on results
 
 # Number of simulation replications
 NumReps = 480
 
-# Simulation statistics trackers for the unified (cross-trained) system
-CrossTrainedTIS = SimClasses.DTStat()
-CrossTrainedWithin5 = SimClasses.DTStat()
-CrossTrainedOperator = SimClasses.Resource()
-CrossTrainedOperatorQueue = SimClasses.FIFOQueue()
-
-# Statistics lists
-CrossTrainedTISavg = []
-CrossTrainedPropWithin5 = []
-CrossTrainedOperatorBusyAvg = []
-CrossTrainedOperatorQueueAvg = []
-CrossTrainedQueueTimeAvg= []
-EndingTime = []
-
-# Add this to initialize a new statistic tracker for queue time
-CrossTrainedQueueTime = SimClasses.DTStat()
-
-def CrossTrained_Arrival():
-    '''Handles arrival of both financial and contact management calls to a cross-trained operator.'''
-    InterarrivalTime = 1 / 1  # 60 calls per hour
-    if SimClasses.Clock + InterarrivalTime > RunLength:
-        return
-    SimFunctions.Schedule(Calendar, "CrossTrained_Arrival", InterarrivalTime)
-
-    # Determine call type based on historical probabilities
-    if np.random.rand() < 0.59:  # Financial call
-        ServiceTime = SimRNG.Erlang(2, FinMean, 2)
-    else:  # Contact management call
-        ServiceTime = SimRNG.Erlang(3, ContactMean, 2)
-
-    Call = SimClasses.Entity()
-    if CrossTrainedOperator.CurrentNumBusy < CrossTrainedOperator.NumberOfUnits:
-        CrossTrainedOperator.Seize(1)
-        SimFunctions.SchedulePlus(Calendar, "CrossTrainedEndOfService", ServiceTime, Call)
-    else:
-        Call.EntryTime = SimClasses.Clock  # Record the time the call enters the queue
-        CrossTrainedOperatorQueue.Add(Call)
-
-def CrossTrainedEndOfService(DepartingCall):
-    '''Called when a call finishes service in the cross-trained system.'''
-    TIS = SimClasses.Clock - DepartingCall.CreateTime
-    CrossTrainedTIS.Record(TIS)
-    CrossTrainedWithin5.Record((TIS < 5.5))  # Adjusted to account for 10% longer time
-
-    if CrossTrainedOperatorQueue.NumQueue() > 0 and CrossTrainedOperator.NumberOfUnits >= CrossTrainedOperator.CurrentNumBusy:
-        NextCall = CrossTrainedOperatorQueue.Remove()
-        
-        # Calculate the time spent in the queue
-        QueueTime = SimClasses.Clock - NextCall.EntryTime
-        CrossTrainedQueueTime.Record(QueueTime)  # Record the queue time
-        
-        # Determine service time for the next call
-        if np.random.rand() < 0.59:
-            ServiceTime = SimRNG.Erlang(2, FinMean, 2)
-        else:
-            ServiceTime = SimRNG.Erlang(3, ContactMean, 2)
-        SimFunctions.SchedulePlus(Calendar, "CrossTrainedEndOfService", ServiceTime, NextCall)
-    else:
-        CrossTrainedOperator.Free(1)
-
-# Running the simulation for each replication
-for reps in range(NumReps):
-    # Initialization
-    SimFunctions.SimFunctionsInit(Calendar)
-    CrossTrainedOperator.SetUnits(NumCrossTrained)
-    SimFunctions.Schedule(Calendar, "CrossTrained_Arrival", 1 / 1)
-
-    # Main simulation loop
-    while Calendar.N() > 0:
-        NextEvent = Calendar.Remove()
-        SimClasses.Clock = NextEvent.EventTime
-
-        if SimClasses.Clock >= RunLength:
-                break
-
-        if NextEvent.EventType == "CrossTrained_Arrival":
-            CrossTrained_Arrival()
-        elif NextEvent.EventType == "CrossTrainedEndOfService":
-            CrossTrainedEndOfService(NextEvent.WhichObject)
-
-    # Store statistics after each replication
-    CrossTrainedTISavg.append(CrossTrainedTIS.Mean())
-    CrossTrainedOperatorQueueAvg.append(CrossTrainedOperatorQueue.Mean())
-    # CrossTrainedPropWithin5.append(CrossTrainedWithin5.Mean())
-    CrossTrainedOperatorBusyAvg.append(CrossTrainedOperator.Mean())
-    EndingTime.append(SimClasses.Clock)
-    CrossTrainedQueueTimeAvg.append(CrossTrainedQueueTime.Mean())  # Record average queue time for this replication
+# "scalar" runs the event-calendar model (SimCallCenter);
+# "lockstep" advances all replications together in NumPy arrays
+# (SimLockstep), which matches the scalar results in distribution
+# but not draw for draw; "kw" computes FIFO waits by the Kiefer-Wolfowitz recursion
+# (SimQueueKernel)
+Engine = "scalar"
+
+# Seed of the numpy.random.Generator that draws service times for
+# the lockstep and kw engines, the first SimRNG stream seed, so that
+# reruns repeat
+Seed = ZRNG[0]
+
+# Quantiles of time in system and queue time added as columns,
+# e.g. [0.90, 0.95] adds CrossTrainedTISp90, ..., CrossTrainedQueueTimep95
+Quantiles = []
+
+# Cross-trained configuration: one pool serving both lines
+Model = SimCallCenter.CrossTrainedSystem(NumCrossTrained, Inflation, FinMean, ContactMean,
+    RunLength, Quantiles=Quantiles, ArrivalSource=ArrivalSource)
+
+# Output columns, one row per replication
+Columns = [name for name in Model.Columns if not name.endswith("PropWithin5")]
+
+# Running the simulation for each replication, streaming rows to column files
+Sink = SimOutput.ResultSink("cross_trained_output", Columns)
+if Engine != "scalar" and (ArrivalSource != "calendar" or Quantiles):
+    raise ValueError("ArrivalSource and Quantiles require the scalar engine")
+if Engine == "lockstep":
+    Results = SimLockstep.RunCrossTrained(NumReps, NumCrossTrained, FinMean * Inflation,
+        ContactMean * Inflation, RunLength, Seed, Model.ServiceLevel)
+    for Row in zip(*[Results[name] for name in Columns]):
+        Sink.Append(Row)
+elif Engine == "kw":
+    Results = SimQueueKernel.RunCrossTrained(NumReps, NumCrossTrained, FinMean * Inflation,
+        ContactMean * Inflation, RunLength, Seed, Model.ServiceLevel)
+    for Row in zip(*[Results[name] for name in Columns]):
+        Sink.Append(Row)
+else:
+    for reps in range(NumReps):
+        Row = dict(zip(Model.Columns, Model.RunReplication()))
+        Sink.Append([Row[name] for name in Columns])
+Sink.Close()
 
 # Output results to a CSV
-output = pd.DataFrame({
-    "CrossTrainedTISavg": CrossTrainedTISavg,
-    "CrossTrainedOperatorQueueAvg": CrossTrainedOperatorQueueAvg,
-    "CrossTrainedOperatorBusyAvg": CrossTrainedOperatorBusyAvg,
-    # "CrossTrainedPropWithin5": CrossTrainedPropWithin5,
-    "CrossTrainedQueueTimeAvg": CrossTrainedQueueTimeAvg,  # Add average queue time to output
-    "EndingTime": EndingTime
-})
-output.to_csv("cross_trained_output.csv", sep=",")
+output = SimOutput.ResultReader("cross_trained_output")
+output.ToCSV("cross_trained_output.csv")
+Means = output.Means()
+HalfWidths = output.HalfWidths()
 print("Means")
-print(output.mean())
+for name in Columns:
+    print(f"{name:<32}{Means[name]:>12.6f}")
 print("95% CI Half-Width")
-print(1.96 * np.sqrt(output.var(ddof=0) / len(output)))
+for name in Columns:
+    print(f"{name:<32}{HalfWidths[name]:>12.6f}")
@@ -0,0 +1,331 @@
+###############################################################
+
+# Command-line entry point for running SMP call-center
+#   scenarios without editing a script:
+
+#       python -m smp run scenarios.toml
+#       python -m smp run scenarios.toml --only existing --reps 20
+#       python -m smp run scenarios.toml --workers 4 --csv out --json summary.json
+#       python -m smp serve --port 8765 --workers 4
+#       python -m smp forecast forecast_state.json scenarios.toml existing
+
+# serve answers scenario requests over local HTTP (SimServer);
+#   forecast runs short replications of a scenario from the state
+#   of the live system in a JSON file (SimForecast).
+
+# A scenario file is TOML. An optional [defaults] table holds
+#   keys shared by every scenario, and each [[scenario]] table
+#   describes one configuration:
+
+#       name        string, output name
+#       system      "existing", "crosstrained" or "partial"
+#       staffing    list of operators per pool, as SetStaffing
+#                   (default: the system's own)
+#       rate        total calls per minute (default 1.0)
+#       rates       calls per minute in each period, for Poisson
+#                   arrivals; period_length gives the period
+#       means       table of mean service time per line, e.g.
+#                   {Finance = 5, Contact = 5}
+#       reps        number of replications (default 100)
+#       run_length  minutes per replication (default 480)
+#       statistics  "full", "kpi-only" or "none"
+#       quantiles   list, e.g. [0.9, 0.95]
+#       options     table of further arguments of the system's
+#                   SimCallCenter factory, e.g. {Inflation = 1.2}
+
+# Every scenario starts from the initial SimRNG seeds, so
+#   scenarios are compared under common random numbers and a
+#   scenario gives the same numbers whichever worker runs it.
+#   All scenarios run in one process, or in one pool of worker
+#   processes that keep the models they have built, so
+#   scenarios that differ only in staffing or rate reuse them.
+#   The simulation modules are imported only when a run starts,
+#   and pandas only when CSV output is asked for.
+
+###############################################################
+
+import argparse
+import json
+import math
+import os
+import time
+
+SYSTEMS = {"existing": "ExistingSystem", "crosstrained": "CrossTrainedSystem",
+           "partial": "PartialCrossTrainedSystem"}
+
+KEYS = {"name", "system", "staffing", "rate", "rates", "period_length", "means", "reps",
+        "run_length", "statistics", "quantiles", "options"}
+
+# Models built by this process, by structure
+_Models = {}
+MAX_MODELS = 8
+
+def ScenarioSpec(table, defaults=None, name="scenario"):
+    '''
+    Returns a scenario with every key filled in and checked
+
+    Input:
+        table: dict of scenario keys, e.g. one [[scenario]] table
+        defaults: dict of keys used where table has none
+        name: string, name if neither gives one
+
+    Output:
+        dict
+    '''
+
+    spec = {"name": name, "system": "existing", "rate": 1.0,
+            "reps": 100, "run_length": 480, "statistics": "full", "quantiles": [],
+            "means": {}, "options": {}, "period_length": 60}
+    spec.update(defaults or {})
+    spec.update(table)
+    unknown = set(spec) - KEYS
+    if unknown:
+        raise ValueError("scenario %s has unknown keys: %s" % (spec["name"], ", ".join(sorted(unknown))))
+    if spec["system"] not in SYSTEMS:
+        raise ValueError("scenario %s: system must be one of %s" % (spec["name"], ", ".join(SYSTEMS)))
+    return spec
+
+def LoadScenarios(Path):
+    '''
+    Reads a scenario file
+
+    Input:
+        Path: string, TOML file name
+
+    Output:
+        list of dicts, one per scenario, defaults filled in
+    '''
+
+    try:
+        import tomllib
+    except ImportError:
+        # Python before 3.11
+        import tomli as tomllib
+    with open(Path, "rb") as f:
+        document = tomllib.load(f)
+    defaults = document.get("defaults", {})
+    scenarios = [ScenarioSpec(table, defaults, "scenario-%d" % (i + 1))
+        for i, table in enumerate(document.get("scenario", []))]
+    names = [spec["name"] for spec in scenarios]
+    if len(set(names)) != len(names):
+        raise ValueError("scenario names must be unique")
+    return scenarios
+
+def _Structure(spec):
+    # What decides the model's construction; staffing and a
+    #   constant rate are set on a built model
+    return json.dumps([spec["system"], spec["means"], spec["run_length"], spec["statistics"],
+        spec["quantiles"], spec["options"], spec.get("rates"), spec["period_length"]], sort_keys=True)
+
+def BuildModel(spec):
+    '''
+    Returns the model of a scenario with the scenario's staffing,
+        reusing one this process built for a scenario of the same
+        structure; a scenario without staffing gets the staffing
+        the model was built with
+
+    Input:
+        spec: dict, from LoadScenarios
+
+    Output:
+        CallCenterModel object
+    '''
+
+    key = _Structure(spec)
+    if key not in _Models:
+        if len(_Models) == MAX_MODELS:
+            # The oldest goes, and is freed with its statistics
+            _Models.pop(next(iter(_Models)))
+        _Models[key] = _Build(spec)
+    model, default = _Models[key]
+    staffing = spec.get("staffing")
+    model.SetStaffing(default if staffing is None else staffing)
+    return model
+
+def _Build(spec):
+    # A new model, and the staffing its factory gave it
+    import SimCallCenter
+
+    kwargs = dict(spec["options"])
+    if "Finance" in spec["means"]:
+        kwargs["FinMean"] = spec["means"]["Finance"]
+    if "Contact" in spec["means"]:
+        kwargs["ContactMean"] = spec["means"]["Contact"]
+    if spec["quantiles"]:
+        kwargs["Quantiles"] = spec["quantiles"]
+    if spec.get("rates") is not None:
+        kwargs.update(NPeriods=len(spec["rates"]), PeriodLength=spec["period_length"],
+            ArrivalRates=spec["rates"])
+    model = getattr(SimCallCenter, SYSTEMS[spec["system"]])(RunLength=spec["run_length"],
+        Statistics=spec["statistics"], **kwargs)
+    return model, [pool.NumOperators for pool in model.Pools]
+
+def RunScenario(spec):
+    '''
+    Runs one scenario from the initial SimRNG seeds
+
+    Input:
+        spec: dict, from LoadScenarios
+
+    Output:
+        dict of output column to list of floats over replications,
+            and Seconds, the wall time of the run
+    '''
+
+    import SimRNG
+
+    start = time.perf_counter()
+    model = BuildModel(spec)
+    model.ArrivalRate = spec["rate"]
+    SimRNG.ZRNG[:] = SimRNG.InitializeRNSeed()
+    results = model.Run(spec["reps"])
+    out = {name: values.tolist() for name, values in results.items() if values.ndim == 1}
+    out["Seconds"] = time.perf_counter() - start
+    return out
+
+def ForecastModel(spec):
+    '''
+    Returns a new model of a scenario for SimForecast, with the
+        scenario's rate and staffing and no statistics; it is not
+        shared with BuildModel or other forecasts
+
+    Input:
+        spec: dict, from LoadScenarios
+
+    Output:
+        CallCenterModel object
+    '''
+
+    model, default = _Build(dict(spec, statistics="none", quantiles=[]))
+    if spec.get("staffing") is not None:
+        model.SetStaffing(spec["staffing"])
+    model.ArrivalRate = spec["rate"]
+    return model
+
+def Summarize(results, z=1.96):
+    '''
+    Returns the mean and confidence-interval half-width of every
+        output column
+
+    Input:
+        results: dict, from RunScenario
+        z: float, normal quantile of the interval
+
+    Output:
+        dict of column to (mean, half-width)
+    '''
+
+    summary = {}
+    for name, values in results.items():
+        if name == "Seconds":
+            continue
+        n = len(values)
+        mean = sum(values) / n
+        var = sum((x - mean) ** 2 for x in values) / (n - 1) if n > 1 else 0.0
+        summary[name] = (mean, z * math.sqrt(var / n))
+    return summary
+
+def Run(args):
+    scenarios = LoadScenarios(args.file)
+    if args.only:
+        scenarios = [spec for spec in scenarios if any(word in spec["name"] for word in args.only)]
+    if args.reps is not None:
+        for spec in scenarios:
+            spec["reps"] = args.reps
+    workers = min(args.workers or os.cpu_count() or 1, len(scenarios))
+
+    start = time.perf_counter()
+    if workers <= 1:
+        outputs = map(RunScenario, scenarios)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(workers)
+        futures = [pool.submit(RunScenario, spec) for spec in scenarios]
+        outputs = (future.result() for future in futures)
+
+    report = {}
+    for spec, results in zip(scenarios, outputs):
+        summary = Summarize(results)
+        report[spec["name"]] = {name: {"Mean": mean, "HalfWidth": hw} for name, (mean, hw) in summary.items()}
+        print("%s: %d replications, %.2f s" % (spec["name"], spec["reps"], results["Seconds"]))
+        for name, (mean, hw) in summary.items():
+            print("  %-28s %12.4f +/- %.4f" % (name, mean, hw))
+        if args.csv:
+            import pandas as pd
+            os.makedirs(args.csv, exist_ok=True)
+            frame = pd.DataFrame({name: values for name, values in results.items() if name != "Seconds"})
+            frame.to_csv(os.path.join(args.csv, spec["name"] + ".csv"))
+    if workers > 1:
+        pool.shutdown()
+    print("%d scenarios in %.2f s" % (len(scenarios), time.perf_counter() - start))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=1)
+
+def Forecast(args):
+    import SimForecast
+
+    scenarios = [spec for spec in LoadScenarios(args.file) if spec["name"] == args.scenario]
+    if len(scenarios) == 0:
+        raise SystemExit("no scenario named %s in %s" % (args.scenario, args.file))
+    forecaster = SimForecast.Forecaster(ForecastModel, (scenarios[0],), Workers=args.workers or os.cpu_count() or 1)
+    try:
+        result = forecaster.Forecast(args.state, args.horizon, args.reps, args.buckets)
+    finally:
+        forecaster.Close()
+    print("%s from minute %g: %d replications of %g minutes in %.2f s" % (args.scenario, result["Clock"],
+        result["Replications"], result["Horizon"], result["Seconds"]))
+    for name, buckets in result["Lines"].items():
+        for b in buckets:
+            if b["MeanWait"] is not None:
+                print("  %-12s arriving from %6.1f: %5.1f calls, wait %.2f +/- %.2f, p90 %.2f"
+                    % (name, b["Start"], b["Calls"], b["MeanWait"], b["HalfWidth"] or 0, b["p90"]))
+    for call in result["OnHold"]:
+        print("  on hold %-12s %5.1f min so far: total wait %.2f, p90 %.2f"
+            % (call["Line"], call["Waited"], call["MeanWait"], call["p90"]))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=1)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m smp", description="Run SMP call-center scenarios")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="run the scenarios of a TOML file")
+    run.add_argument("file", help="scenario file")
+    run.add_argument("--only", nargs="*", default=[], help="run scenarios whose name contains a word")
+    run.add_argument("--reps", type=int, help="replications per scenario, overriding the file")
+    run.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    run.add_argument("--csv", metavar="DIR", help="write each scenario's replications to DIR/name.csv")
+    run.add_argument("--json", metavar="PATH", help="write the summary as JSON")
+    serve = commands.add_parser("serve", help="answer scenario requests over local HTTP")
+    serve.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    serve.add_argument("--port", type=int, default=8765, help="port to listen on")
+    serve.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead")
+    serve.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    serve.add_argument("--batch", type=int, default=10, help="replications per batch")
+    forecast = commands.add_parser("forecast", help="forecast queue times from the state of the live system")
+    forecast.add_argument("state", help="JSON state file, see SimForecast")
+    forecast.add_argument("file", help="scenario file")
+    forecast.add_argument("scenario", help="name of the scenario describing the system")
+    forecast.add_argument("--horizon", type=float, default=60, help="minutes ahead (default 60)")
+    forecast.add_argument("--reps", type=int, default=2000, help="replications (default 2000)")
+    forecast.add_argument("--buckets", type=int, default=4, help="parts of the horizon reported")
+    forecast.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    forecast.add_argument("--json", metavar="PATH", help="write the forecast as JSON")
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        Run(args)
+    elif args.command == "serve":
+        import asyncio
+        import SimServer
+        try:
+            asyncio.run(SimServer.Serve(args.host, args.port, args.unix, args.workers or os.cpu_count() or 1,
+                args.batch))
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "forecast":
+        Forecast(args)
+
+if __name__ == "__main__":
+    main()